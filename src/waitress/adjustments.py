@@ -14,6 +14,7 @@
 """Adjustments are tunable parameters."""
 
 import getopt
+import os
 import pkgutil
 import socket
 import warnings
@@ -82,6 +83,14 @@ def str_iftruthy(s):
     return str(s) if s else None
 
 
+def ascallable(value):
+    """Return ``value`` if it is callable (or ``None``), otherwise resolve it
+    as a ``module:name`` string to the object it names."""
+    if value is None or callable(value):
+        return value
+    return pkgutil.resolve_name(value)
+
+
 def as_socket_list(sockets):
     """Checks if the elements in the list are of type socket and
     removes them if not."""
@@ -134,13 +143,32 @@ class Adjustments:
         ("send_bytes", int),
         ("outbuf_overflow", int),
         ("outbuf_high_watermark", int),
+        ("response_buffer_size", int),
+        ("file_wrapper_read_ahead", asbool),
         ("inbuf_overflow", int),
+        ("inbuf_spill_async", asbool),
+        ("inbuf_spill_high_watermark", int),
+        ("inbuf_mmap", asbool),
+        ("buffer_spill", str),
+        ("buffer_pool_size", int),
+        ("buffer_memory_limit", int),
         ("connection_limit", int),
         ("cleanup_interval", int),
         ("channel_timeout", int),
+        ("park_idle_channels", asbool),
+        ("keepalive_timeout", int),
+        ("max_requests_per_connection", int),
+        ("evict_idle_channels", asbool),
+        ("request_header_timeout", int),
+        ("min_request_body_rate", int),
+        ("min_response_rate", int),
+        ("min_rate_period", int),
         ("log_socket_errors", asbool),
         ("max_request_header_size", int),
         ("max_request_body_size", int),
+        ("stream_request_body", asbool),
+        ("defer_continue", asbool),
+        ("admission_hook", ascallable),
         ("expose_tracebacks", asbool),
         ("ident", str_iftruthy),
         ("asyncore_loop_timeout", int),
@@ -231,11 +259,48 @@ class Adjustments:
     # in bytes.
     outbuf_high_watermark = 16777216
 
+    # The app_iter may run ahead of the client by up to this many bytes of
+    # pending output, which overflow to tempfiles, so that the task is done
+    # before a slow client has read the response. 0 to only use
+    # outbuf_high_watermark.
+    response_buffer_size = 0
+
+    # Read the file of a wsgi.file_wrapper response ahead of sending it on a
+    # helper thread, rather than reading it from the main loop.
+    file_wrapper_read_ahead = False
+
     # A tempfile should be created if the pending input is larger than
     # inbuf_overflow, which is measured in bytes. The default is 512K.  This
     # is conservative.
     inbuf_overflow = 524288
 
+    # Once a request body overflows to a tempfile, hand the writes to the
+    # tempfile off to a background thread instead of performing them on the
+    # main loop thread.
+    inbuf_spill_async = False
+
+    # Stop reading request bodies that are being spilled while the background
+    # spill writer has more than this many bytes waiting to be written.
+    inbuf_spill_high_watermark = 4194304
+
+    # Hand the application a memory mapped wsgi.input for request bodies that
+    # overflowed to a tempfile.
+    inbuf_mmap = False
+
+    # Where the tempfiles of buffers that overflowed are created: "memfd" for
+    # anonymous in-memory files (Linux only), a directory (for example one on
+    # a tmpfs), or the empty string for the default temporary directory.
+    buffer_spill = ""
+
+    # The number of truncated tempfiles that are kept around to be reused by
+    # buffers that overflow later on, 0 disables reusing tempfiles.
+    buffer_pool_size = 0
+
+    # The number of bytes that all request and response buffers together may
+    # hold in memory before buffers start overflowing to their tempfile early,
+    # 0 means no limit.
+    buffer_memory_limit = 0
+
     # Stop creating new channels if too many are already active (integer).
     # Each channel consumes at least one file descriptor, and, depending on
     # the input and output body sizes, potentially up to three.  The default
@@ -253,6 +318,35 @@ class Adjustments:
     # Maximum seconds to leave an inactive connection open.
     channel_timeout = 120
 
+    # Boolean: replace connections that were inactive for a whole
+    # cleanup_interval with a small placeholder until data arrives again.
+    park_idle_channels = False
+
+    # Maximum seconds to leave a connection open between requests, 0 to only
+    # use channel_timeout.
+    keepalive_timeout = 0
+
+    # The number of requests after which a connection is closed, 0 for no
+    # limit.
+    max_requests_per_connection = 0
+
+    # Boolean: once connection_limit is reached, close the connection that
+    # has been idle the longest to make room for a new one.
+    evict_idle_channels = False
+
+    # Maximum seconds a client may take to send the headers of a request, 0
+    # to only use channel_timeout.
+    request_header_timeout = 0
+
+    # Minimum bytes per second at which clients must send request bodies and
+    # read responses, 0 for no minimum.
+    min_request_body_rate = 0
+    min_response_rate = 0
+
+    # Seconds over which the rates of request bodies and responses are
+    # measured.
+    min_rate_period = 5
+
     # Boolean: turn off to not log premature client disconnects.
     log_socket_errors = True
 
@@ -262,6 +356,19 @@ class Adjustments:
     # maximum number of bytes in request body (1GB default)
     max_request_body_size = 1073741824
 
+    # Hand a request to the application as soon as its headers have been
+    # received, with wsgi.input reading the body while it is still arriving.
+    stream_request_body = False
+
+    # Only send "100 Continue" to a client that sent "Expect: 100-continue"
+    # once the application starts reading wsgi.input, streaming the body.
+    defer_continue = False
+
+    # Called on the main loop thread with the method, path and headers of
+    # each request once its headers are in, before the body is received. It
+    # may return a waitress.utilities.Error to reject the request with.
+    admission_hook = None
+
     # expose tracebacks of uncaught exceptions
     expose_tracebacks = False
 
@@ -456,6 +563,15 @@ class Adjustments:
             )
             self.trusted_proxy_headers = {"x-forwarded-proto"}
 
+        if self.buffer_spill == "memfd":
+            if not hasattr(os, "memfd_create"):  # pragma: no cover
+                raise ValueError("buffer_spill=memfd is not supported on this platform")
+        elif self.buffer_spill and not os.path.isdir(self.buffer_spill):
+            raise ValueError(
+                "buffer_spill must be memfd or an existing directory, got %r"
+                % self.buffer_spill
+            )
+
         self.listen = wanted_sockets
 
         self.check_sockets(self.sockets)
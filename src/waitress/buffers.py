@@ -13,7 +13,14 @@
 ##############################################################################
 """Buffers"""
 
+from collections import deque
 from io import BytesIO
+import mmap
+import os
+import threading
+
+from .compat import pread, pwrite
+from .utilities import logger
 
 # copy_bytes controls the size of temp. strings for shuffling data around.
 COPY_BYTES = 1 << 18  # 256K
@@ -96,6 +103,7 @@ class FileBasedBuffer:
             if not data:
                 break
             nf.write(data)
+        nf.seek(0)
         self.file = nf
 
     def getfile(self):
@@ -108,13 +116,616 @@ class FileBasedBuffer:
 
 
 class TempfileBasedBuffer(FileBasedBuffer):
-    def __init__(self, from_buffer=None):
-        FileBasedBuffer.__init__(self, self.newfile(), from_buffer)
+    """
+    Keeps track of its own read and write offsets and uses positional reads
+    and writes, so that neither appending nor reading has to seek. Once all
+    of the data has been read the file is truncated rather than copied.
+    """
+
+    read_pos = 0
+    write_pos = 0
+    spill = ""  # see spill_file()
+    pool = None  # a BufferPool to take files from and give them back to
+    reader = None  # the MmapReader handed out by getmmap()
+
+    def __init__(self, from_buffer=None, spill="", pool=None):
+        self.spill = spill
+        self.pool = pool
+        self.file = self.newfile()
+        if from_buffer is not None:
+            # Only the data that has not been read yet is copied
+            from_file = from_buffer.getfile()
+            read_pos = from_file.tell()
+            while True:
+                data = from_file.read(COPY_BYTES)
+                if not data:
+                    break
+                self._write(data)
+            from_file.seek(read_pos)
+            self.remain = self.write_pos
+
+    def _write(self, data):
+        file = self.file
+        offset = self.write_pos
+        data = memoryview(data)
+        while data:
+            written = pwrite(file, data, offset)
+            offset += written
+            data = data[written:]
+        self.write_pos = offset
+
+    def append(self, s):
+        self._write(s)
+        self.remain = self.remain + len(s)
+
+    def get(self, numbytes=-1, skip=False):
+        if numbytes < 0 or numbytes > self.remain:
+            numbytes = self.remain
+        if numbytes <= 0:
+            return b""
+        res = pread(self.file, numbytes, self.read_pos)
+        if skip:
+            self.read_pos += len(res)
+            self.remain -= len(res)
+        return res
+
+    def skip(self, numbytes, allow_prune=0):
+        if self.remain < numbytes:
+            raise ValueError(
+                "Can't skip %d bytes in buffer of %d bytes" % (numbytes, self.remain)
+            )
+        self.read_pos += numbytes
+        self.remain = self.remain - numbytes
+        if allow_prune and not self.remain:
+            self.prune()
+
+    def prune(self):
+        if self.remain == 0:
+            # Everything that was written has been read, give the space back
+            # without having to copy anything.
+            if self.write_pos:
+                self.file.truncate(0)
+            self.read_pos = self.write_pos = 0
+            return
+        if self.read_pos == 0:
+            # Nothing to prune.
+            return
+        file = self.file
+        read_pos = self.read_pos
+        end = self.write_pos
+        self.file = self.newfile()
+        self.read_pos = self.write_pos = 0
+        while read_pos < end:
+            data = pread(file, min(COPY_BYTES, end - read_pos), read_pos)
+            self._write(data)
+            read_pos += len(data)
+        self.closefile(file)
+
+    def getfile(self):
+        file = self.file
+        # the file object's read buffer doesn't know about our writes
+        file.flush()
+        file.seek(self.read_pos)
+        return file
 
     def newfile(self):
-        from tempfile import TemporaryFile
+        if self.pool is not None:
+            return self.pool.acquire(self.spill)
+        return spill_file(self.spill)
+
+    def closefile(self, file):
+        if self.pool is not None:
+            self.pool.release(self.spill, file)
+        else:
+            file.close()
+
+    def getmmap(self):
+        """Return a MmapReader over the data that has not been read yet."""
+        if self.reader is None:
+            self.reader = MmapReader(self.file, self.read_pos, self.write_pos)
+        return self.reader
+
+    def close(self):
+        reader = self.reader
+        if reader is not None and not reader.close():
+            # The application still holds on to a view of the mapping. The
+            # pool would truncate the file, after which accessing the view
+            # crashes the process, so don't give the file back to it.
+            self.pool = None
+        if self.file is not None:
+            self.closefile(self.file)
+        self.remain = 0
+
+
+def spill_file(spill=""):
+    """
+    Create the anonymous file that a buffer overflows to. ``spill`` is
+    either ``memfd`` to use an in-memory file created with
+    ``os.memfd_create``, the directory to create the file in (for example
+    one on a tmpfs), or the empty string for the default temporary directory.
+    """
+    if spill == "memfd":
+        fd = os.memfd_create("waitress-buffer", os.MFD_CLOEXEC)
+        return open(fd, "w+b")
+
+    # TemporaryFile uses O_TMPFILE on Linux, so the file is never visible in
+    # the directory and no name has to be generated for it.
+    from tempfile import TemporaryFile
+
+    return TemporaryFile("w+b", dir=spill or None)
+
+
+class BufferPool:
+    """
+    Keeps the file descriptors of closed spill files around, truncated, so
+    that buffers overflowing later on can reuse them instead of creating a
+    new file each time. At most ``size`` descriptors are kept per spill
+    location, a size of 0 disables pooling.
+
+    A released file object is always closed, the pool holds on to a
+    duplicate of its descriptor. Whoever still has a reference to it (an
+    application holding on to ``wsgi.input``) can therefore never see the
+    data of the buffer that reuses the descriptor.
+    """
+
+    def __init__(self, size=0):
+        self.size = size
+        self.lock = threading.Lock()
+        self.fds = {}  # spill -> list of pooled file descriptors
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self, spill=""):
+        """Return an empty file for ``spill``, see spill_file()."""
+        with self.lock:
+            fds = self.fds.get(spill)
+            if fds:
+                self.hits += 1
+                return open(fds.pop(), "w+b")
+            self.misses += 1
+        return spill_file(spill)
+
+    def release(self, spill, file):
+        """Close ``file``, keeping its descriptor if the pool has room."""
+        if file.closed:
+            return
+        fd = None
+        if len(self.fds.get(spill, ())) < self.size:
+            try:
+                fd = os.dup(file.fileno())
+                os.ftruncate(fd, 0)
+                os.lseek(fd, 0, os.SEEK_SET)
+            except OSError:
+                if fd is not None:
+                    os.close(fd)
+                    fd = None
+        file.close()
+        if fd is not None:
+            with self.lock:
+                fds = self.fds.setdefault(spill, [])
+                if len(fds) < self.size:
+                    fds.append(fd)
+                    return
+            os.close(fd)
+
+    def resize(self, size):
+        """Change the size of the pool, closing descriptors that no longer
+        fit."""
+        closing = []
+        with self.lock:
+            self.size = size
+            for fds in self.fds.values():
+                while len(fds) > size:
+                    closing.append(fds.pop())
+        for fd in closing:
+            os.close(fd)
+
+    def clear(self):
+        self.resize(0)
+
+    def stats(self):
+        """Return the pool's hit and miss counts, its hit rate and the number
+        of descriptors it currently holds."""
+        with self.lock:
+            hits = self.hits
+            misses = self.misses
+            pooled = sum(len(fds) for fds in self.fds.values())
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+            "pooled": pooled,
+        }
+
+
+# Shared by every OverflowableBuffer, see the buffer_pool_size adjustment.
+buffer_pool = BufferPool()
+
+
+class MemoryBudget:
+    """
+    Keeps track of the number of bytes that OverflowableBuffers hold in
+    memory across the whole process. Once more than ``limit`` bytes are in
+    use (if ``limit`` is non-zero), buffers overflow to their tempfile as soon
+    as they grow past the bytes-based stage instead of waiting until they
+    reach their own overflow size.
+    """
+
+    def __init__(self, limit=0):
+        self.limit = limit
+        self.used = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def add(self, nbytes):
+        """Account for ``nbytes`` more (or, if negative, fewer) bytes held in
+        memory and return whether the budget is exceeded."""
+        with self.lock:
+            used = self.used = self.used + nbytes
+            if used > self.peak:
+                self.peak = used
+        return 0 < self.limit < used
+
+    @property
+    def exceeded(self):
+        return 0 < self.limit < self.used
+
+    def stats(self):
+        """Return the bytes currently held in memory, the most ever held at
+        once and the limit."""
+        with self.lock:
+            return {"used": self.used, "peak": self.peak, "limit": self.limit}
+
+
+# Shared by every OverflowableBuffer, see the buffer_memory_limit adjustment.
+memory_budget = MemoryBudget()
+
+
+class SpillWriter:
+    """
+    Performs the file I/O of spilled buffers on a dedicated thread, so that
+    the thread appending to a buffer (the main loop, for request bodies) never
+    waits on the disk.
+    """
+
+    logger = logger
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cv = threading.Condition(self.lock)
+        self.queue = deque()
+        self.pending = 0  # bytes submitted but not yet written
+        self.writing = False  # a write taken off the queue is in progress
+        self.waiters = set()
+        self.closing = set()  # discarded buffers to close after their write
+        self.thread = None
+
+    def start(self):
+        t = threading.Thread(target=self.run, name="waitress-spill-writer")
+        t.daemon = True
+        t.start()
+        self.thread = t
+
+    def submit(self, buf, data):
+        with self.lock:
+            if self.thread is None:
+                self.start()
+            buf.pending_writes += 1
+            self.pending += len(data)
+            self.queue.append((buf, data))
+            self.cv.notify_all()
+
+    def wait(self, buf):
+        """Block until all of the writes submitted for ``buf`` are done."""
+        with self.lock:
+            while buf.pending_writes:
+                self.cv.wait()
+
+    def discard(self, buf):
+        """Drop the queued writes for ``buf``. Returns True if a write for it
+        is in progress, in which case the writer thread closes ``buf`` once
+        that is done rather than making the caller wait for the disk."""
+        with self.lock:
+            queue = deque()
+            for item in self.queue:
+                if item[0] is buf:
+                    buf.pending_writes -= 1
+                    self.pending -= len(item[1])
+                else:
+                    queue.append(item)
+            self.queue = queue
+            if buf.pending_writes:
+                self.closing.add(buf)
+                return True
+            return False
+
+    def notify_when_drained(self, callback):
+        """Call ``callback`` (from the writer thread) once the queue empties
+        and the last write is done."""
+        with self.lock:
+            if self.queue or self.writing:
+                self.waiters.add(callback)
+                return
+        callback()
+
+    def run(self):
+        while True:
+            with self.lock:
+                while not self.queue:
+                    self.cv.wait()
+                buf, data = self.queue.popleft()
+                self.writing = True
+            try:
+                buf.write(data)
+            except Exception as e:
+                self.logger.exception("Unexpected error when spilling a buffer")
+                buf.write_error = e
+            with self.lock:
+                self.writing = False
+                buf.pending_writes -= 1
+                self.pending -= len(data)
+                close = buf in self.closing
+                self.closing.discard(buf)
+                waiters = ()
+                if not self.queue:
+                    waiters, self.waiters = self.waiters, set()
+                self.cv.notify_all()
+            if close:
+                try:
+                    buf.close()
+                except Exception:
+                    self.logger.exception("Unexpected error when closing a buffer")
+            for callback in waiters:
+                callback()
+
+
+# Shared by every buffer created with spilling in the background enabled.
+spill_writer = SpillWriter()
+
+
+class SpilledTempfileBasedBuffer(TempfileBasedBuffer):
+    """
+    A TempfileBasedBuffer whose file is created and appended to by a
+    SpillWriter. Only the thread that appends may use it while data is still
+    arriving; reading waits for all outstanding writes.
+    """
+
+    file = None
+    pending_writes = 0
+    write_error = None
+
+    def __init__(self, writer, from_buffer=None, spill="", pool=None):
+        self.writer = writer
+        self.spill = spill
+        self.pool = pool
+        data = b""
+        if from_buffer is not None:
+            data = from_buffer.get()
+            self.remain = len(data)
+        # The first write creates the file
+        writer.submit(self, data)
+
+    def write(self, data):
+        # called by the writer thread
+        if self.file is None:
+            self.file = self.newfile()
+        if data:
+            self._write(data)
+
+    def _sync(self):
+        self.writer.wait(self)
+        if self.write_error is not None:
+            raise self.write_error
+
+    def append(self, s):
+        if self.write_error is not None:
+            raise self.write_error
+        self.remain = self.remain + len(s)
+        self.writer.submit(self, s)
+
+    def get(self, numbytes=-1, skip=False):
+        self._sync()
+        return TempfileBasedBuffer.get(self, numbytes, skip)
+
+    def skip(self, numbytes, allow_prune=0):
+        self._sync()
+        TempfileBasedBuffer.skip(self, numbytes, allow_prune)
+
+    def prune(self):
+        self._sync()
+        TempfileBasedBuffer.prune(self)
+
+    def getfile(self):
+        self._sync()
+        return TempfileBasedBuffer.getfile(self)
+
+    def getmmap(self):
+        self._sync()
+        return TempfileBasedBuffer.getmmap(self)
+
+    def close(self):
+        if self.writer.discard(self):
+            # Closed by the writer thread once its write is done
+            self.remain = 0
+            return
+        TempfileBasedBuffer.close(self)
+
+
+class EmptyInput:
+    """
+    The ``wsgi.input`` of requests without a body. It has no state, closing
+    it does nothing and it is always at its end, so one instance is shared
+    by all of them rather than creating a new ``BytesIO`` for each.
+    """
+
+    closed = False
+
+    def __len__(self):
+        return 0
+
+    def __iter__(self):
+        return iter(())
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        return b""
+
+    read1 = readline = read
+
+    def readinto(self, buffer):
+        return 0
+
+    def readlines(self, hint=-1):
+        return []
+
+    def seek(self, offset, whence=0):
+        return 0
+
+    def tell(self):
+        return 0
 
-        return TemporaryFile("w+b")
+    def getvalue(self):
+        return b""
+
+    def close(self):
+        pass
+
+
+empty_input = EmptyInput()
+
+
+class MmapReader:
+    """
+    A read-only file-like object over a request body that overflowed to a
+    tempfile, which memory maps the file instead of reading it. Reads are
+    copies out of the mapping rather than system calls, ``readinto`` copies
+    into the caller's buffer directly, and ``getbuffer`` returns a
+    memoryview of the whole body that can be sliced and searched in place.
+    """
+
+    closed = False
+
+    def __init__(self, file, start, end):
+        # mmap offsets have to be multiples of the allocation granularity,
+        # so we map the file from its beginning
+        self.mmap = mmap.mmap(file.fileno(), end, access=mmap.ACCESS_READ)
+        self.start = self.pos = start
+        self.end = end
+        self.views = []
+
+    def __len__(self):
+        return self.end - self.start
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def _check(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+
+    def _stop(self, size):
+        # The offset that a read of up to size bytes stops at
+        end = self.end
+        if size is not None and 0 <= size < end - self.pos:
+            end = self.pos + size
+        return end
+
+    def read(self, size=-1):
+        self._check()
+        pos = self.pos
+        end = self._stop(size)
+        self.pos = end
+        return self.mmap[pos:end]
+
+    read1 = read
+
+    def readinto(self, b):
+        self._check()
+        view = memoryview(b).cast("B")
+        pos = self.pos
+        end = self._stop(len(view))
+        n = end - pos
+        view[:n] = self.mmap[pos:end]
+        self.pos = end
+        return n
+
+    def readline(self, size=-1):
+        self._check()
+        pos = self.pos
+        end = self._stop(size)
+        newline = self.mmap.find(b"\n", pos, end)
+        if newline >= 0:
+            end = newline + 1
+        self.pos = end
+        return self.mmap[pos:end]
+
+    def readlines(self, hint=-1):
+        lines = []
+        total = 0
+        for line in self:
+            lines.append(line)
+            total += len(line)
+            if 0 < hint <= total:
+                break
+        return lines
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self._check()
+        if whence == os.SEEK_CUR:
+            offset += self.pos - self.start
+        elif whence == os.SEEK_END:
+            offset += self.end - self.start
+        if offset < 0:
+            raise ValueError("negative seek position %d" % offset)
+        self.pos = min(self.start + offset, self.end)
+        return self.pos - self.start
+
+    def tell(self):
+        self._check()
+        return self.pos - self.start
+
+    def getbuffer(self):
+        """Return a memoryview of the whole body."""
+        self._check()
+        view = memoryview(self.mmap)[self.start : self.end]
+        self.views.append(view)
+        return view
+
+    def close(self):
+        """
+        Unmap the file. Returns False if that was not possible because views
+        of the mapping made from the ones returned by getbuffer() are still
+        around, in which case it is unmapped once they are gone.
+        """
+        if self.closed:
+            return True
+        self.closed = True
+        for view in self.views:
+            view.release()
+        self.views = []
+        try:
+            self.mmap.close()
+        except BufferError:
+            return False
+        return True
 
 
 class BytesIOBasedBuffer(FileBasedBuffer):
@@ -194,6 +805,362 @@ class ReadOnlyFileBasedBuffer(FileBasedBuffer):
         raise NotImplementedError
 
 
+def can_read_ahead(filewrapper):
+    """Return True if the file of a ReadOnlyFileBasedBuffer can be sent using
+    a ReadAheadFileBasedBuffer."""
+    if not hasattr(os, "pread") or not _is_seekable(filewrapper.file):
+        return False
+    try:
+        filewrapper.file.fileno()
+    except (AttributeError, OSError, ValueError):
+        # io.UnsupportedOperation is a subclass of both OSError and ValueError
+        return False
+    return True
+
+
+class ReadAheadWorker:
+    """
+    Reads the blocks of ReadAheadFileBasedBuffers on a dedicated thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cv = threading.Condition(self.lock)
+        self.queue = deque()
+        self.thread = None
+
+    def start(self):
+        t = threading.Thread(target=self.run, name="waitress-read-ahead")
+        t.daemon = True
+        t.start()
+        self.thread = t
+
+    def submit(self, buf):
+        with self.lock:
+            if self.thread is None:
+                self.start()
+            self.queue.append(buf)
+            self.cv.notify()
+
+    def run(self):
+        while True:
+            with self.lock:
+                while not self.queue:
+                    self.cv.wait()
+                buf = self.queue.popleft()
+            buf.fill()
+
+
+# Shared by every ReadAheadFileBasedBuffer
+read_ahead_worker = ReadAheadWorker()
+
+
+class ReadAheadFileBasedBuffer:
+    """
+    Sends the file of a ReadOnlyFileBasedBuffer (a wsgi.file_wrapper) from
+    blocks that a ReadAheadWorker has already read into memory, so that the
+    main loop never blocks reading the file. Until the next block is
+    available ``get`` returns nothing and ``ready`` is False; ``wakeup`` is
+    called once it arrives.
+    """
+
+    block_size = COPY_BYTES
+    depth = 2  # number of blocks to keep read ahead
+    error = None
+    closed = False
+    reading = False
+    pos = 0  # position in the first block
+
+    def __init__(self, filewrapper, wakeup, worker=None):
+        self.filewrapper = filewrapper
+        self.wakeup = wakeup
+        self.worker = worker if worker is not None else read_ahead_worker
+        self.lock = threading.Lock()
+        self.blocks = deque()
+        self.fd = filewrapper.file.fileno()
+        # We use pread, so the position of the file is never changed
+        self.offset = filewrapper.file.tell()
+        self.remain = self.unread = filewrapper.remain
+
+        if hasattr(os, "posix_fadvise"):
+            try:
+                os.posix_fadvise(
+                    self.fd, self.offset, self.remain, os.POSIX_FADV_SEQUENTIAL
+                )
+            except OSError:  # pragma: no cover
+                pass
+
+        with self.lock:
+            self._schedule()
+
+    def __len__(self):
+        return self.remain
+
+    def __bool__(self):
+        return True
+
+    @property
+    def ready(self):
+        return not self.remain or bool(self.blocks) or self.error is not None
+
+    def _schedule(self):
+        # must be called with the lock held
+        if (
+            not self.reading
+            and not self.closed
+            and self.error is None
+            and self.unread > 0
+            and len(self.blocks) < self.depth
+        ):
+            self.reading = True
+            self.worker.submit(self)
+
+    def fill(self):
+        # called by the worker thread
+        while True:
+            with self.lock:
+                if (
+                    self.closed
+                    or self.error is not None
+                    or self.unread == 0
+                    or len(self.blocks) >= self.depth
+                ):
+                    self.reading = False
+                    if self.closed:
+                        self.filewrapper.close()
+                    return
+                offset = self.offset
+                size = min(self.block_size, self.unread)
+            try:
+                data = os.pread(self.fd, size, offset)
+                if not data:
+                    raise ValueError("File is shorter than the response")
+            except Exception as e:
+                with self.lock:
+                    self.error = e
+                self.wakeup()
+                continue
+            with self.lock:
+                was_ready = bool(self.blocks)
+                self.blocks.append(memoryview(data))
+                self.offset += len(data)
+                self.unread -= len(data)
+            if not was_ready:
+                self.wakeup()
+
+    def get(self, numbytes=-1, skip=False):
+        with self.lock:
+            if self.error is not None:
+                raise self.error
+            if not self.blocks:
+                return b""
+            pos = self.pos
+            if numbytes < 0:
+                res = self.blocks[0][pos:]
+            else:
+                res = self.blocks[0][pos : pos + numbytes]
+        if skip:
+            self.skip(len(res))
+        return res
+
+    def skip(self, numbytes, allow_prune=False):
+        if self.remain < numbytes:
+            raise ValueError(
+                "Can't skip %d bytes in buffer of %d bytes" % (numbytes, self.remain)
+            )
+        with self.lock:
+            self.remain -= numbytes
+            blocks = self.blocks
+            while numbytes:
+                left = len(blocks[0]) - self.pos
+                if numbytes < left:
+                    self.pos += numbytes
+                    break
+                numbytes -= left
+                blocks.popleft()
+                self.pos = 0
+            self._schedule()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.blocks.clear()
+            self.remain = 0
+            if self.reading:
+                # The worker closes the file once it is done with it
+                return
+        self.filewrapper.close()
+
+
+class StreamingBodyBuffer:
+    """
+    Hands a request body from the main loop, which appends to it as the body
+    arrives, to the application, which reads it as ``wsgi.input`` while it
+    is still being received. At most about ``high_watermark`` bytes are held
+    at a time; past that the channel stops reading until the application
+    has caught up.
+    """
+
+    finished = False  # set once the whole body has been appended
+    closed = False
+    error = None  # raised by the reading methods if set
+    wakeup = None  # called once there is room again, see backlogged()
+    on_read = None  # called the first time the application reads
+
+    def __init__(self, high_watermark):
+        self.high_watermark = high_watermark
+        self.lock = threading.Lock()
+        self.cv = threading.Condition(self.lock)
+        self.chunks = deque()
+        self.size = 0  # the number of bytes held
+        self.received = 0  # the number of bytes appended overall
+
+    def __len__(self):
+        return self.received
+
+    # Called from the main loop
+
+    def append(self, s):
+        with self.lock:
+            self.received += len(s)
+            if self.closed:
+                # nobody is going to read it anymore
+                return
+            self.chunks.append(bytes(s))
+            self.size += len(s)
+            self.cv.notify_all()
+
+    def finish(self):
+        with self.lock:
+            self.finished = True
+            self.cv.notify_all()
+
+    def fail(self, error):
+        """Make reading raise ``error`` once the data held has been read."""
+        with self.lock:
+            self.error = error
+            self.cv.notify_all()
+
+    def backlogged(self, wakeup):
+        """
+        Return whether the buffer is full. If it is, ``wakeup`` is called once
+        the reader has made room again.
+        """
+        with self.lock:
+            if self.closed or self.size < self.high_watermark:
+                return False
+            self.wakeup = wakeup
+            return True
+
+    def getfile(self):
+        return self
+
+    # Called by the application
+
+    def _read_some(self, size, newline=False):
+        # Wait for data and take up to size bytes of it (everything if size
+        # is negative), stopping after the first newline if asked to. Returns
+        # b"" at the end of the body.
+        if self.on_read is not None:
+            on_read, self.on_read = self.on_read, None
+            on_read()
+
+        wakeup = None
+        with self.lock:
+            while not self.chunks:
+                if self.error is not None:
+                    raise self.error
+                if self.closed:
+                    raise ValueError("I/O operation on closed file.")
+                if self.finished:
+                    return b""
+                self.cv.wait()
+            chunks = self.chunks
+            data = []
+            while chunks and size:
+                chunk = chunks[0]
+                n = len(chunk)
+                if newline:
+                    end = chunk.find(b"\n")
+                    if end >= 0:
+                        n = end + 1
+                if 0 < size < n:
+                    n = size
+                if n == len(chunk):
+                    chunks.popleft()
+                else:
+                    chunks[0] = chunk[n:]
+                    chunk = chunk[:n]
+                data.append(chunk)
+                self.size -= n
+                size -= n
+                if newline and chunk.endswith(b"\n"):
+                    break
+            if self.wakeup is not None and self.size < self.high_watermark:
+                wakeup, self.wakeup = self.wakeup, None
+        if wakeup is not None:
+            wakeup()
+        return b"".join(data)
+
+    def read(self, size=-1):
+        if size is None:
+            size = -1
+        data = []
+        while size:
+            chunk = self._read_some(size)
+            if not chunk:
+                break
+            data.append(chunk)
+            if size > 0:
+                size -= len(chunk)
+        return b"".join(data)
+
+    def readline(self, size=-1):
+        if size is None:
+            size = -1
+        data = []
+        while size:
+            chunk = self._read_some(size, True)
+            if not chunk:
+                break
+            data.append(chunk)
+            if chunk.endswith(b"\n"):
+                break
+            if size > 0:
+                size -= len(chunk)
+        return b"".join(data)
+
+    def readlines(self, hint=-1):
+        lines = []
+        total = 0
+        for line in self:
+            lines.append(line)
+            total += len(line)
+            if 0 < hint <= total:
+                break
+        return lines
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.chunks.clear()
+            self.size = 0
+            wakeup, self.wakeup = self.wakeup, None
+            self.cv.notify_all()
+        if wakeup is not None:
+            # the main loop can drain the rest of the body now
+            wakeup()
+
+
 class OverflowableBuffer:
     """
     This buffer implementation has four stages:
@@ -202,15 +1169,28 @@ class OverflowableBuffer:
     - BytesIO-based buffer
     - Temporary file storage
     The first two stages are fastest for simple transfers.
+
+    The bytes-based buffer is a list of the appended chunks, which are only
+    joined when the data is needed as one bytes object.
     """
 
     overflowed = False
     buf = None
-    strbuf = b""  # Bytes-based buffer.
+    strbuf_len = 0  # The number of bytes in the bytes-based buffer.
+    in_memory = 0  # the number of bytes accounted for in the MemoryBudget
 
-    def __init__(self, overflow):
+    def __init__(self, overflow, spill_writer=None, spill="", pool=None, budget=None):
         # overflow is the maximum to be stored in a StringIO buffer.
         self.overflow = overflow
+        # if set, the SpillWriter that performs the writes once overflowed
+        self.spill_writer = spill_writer
+        # where the tempfile gets created, see spill_file()
+        self.spill = spill
+        # if set, the BufferPool that tempfiles are taken from
+        self.pool = pool
+        # if set, the MemoryBudget that our in-memory data is accounted in
+        self.budget = budget
+        self.chunks = []  # Bytes-based buffer.
 
     def __len__(self):
         buf = self.buf
@@ -219,21 +1199,58 @@ class OverflowableBuffer:
             # OverflowError on Python 2
             return buf.__len__()
         else:
-            return self.strbuf.__len__()
+            return self.strbuf_len
 
     def __bool__(self):
         # use self.__len__ rather than len(self) FBO of not getting
         # OverflowError on Python 2
         return self.__len__() > 0
 
+    @property
+    def strbuf(self):
+        """The data of the bytes-based buffer as one bytes object."""
+        chunks = self.chunks
+        if len(chunks) > 1:
+            self.chunks = chunks = [b"".join(chunks)]
+        return chunks[0] if chunks else b""
+
+    @strbuf.setter
+    def strbuf(self, s):
+        self.chunks = [s] if s else []
+        self.strbuf_len = len(s)
+
+    @property
+    def spilling(self):
+        """Whether the tempfile is being written by the spill writer."""
+        return isinstance(self.buf, SpilledTempfileBasedBuffer)
+
+    def _account(self):
+        """
+        Update the number of bytes accounted for in the budget and return
+        whether the budget is exceeded.
+        """
+        budget = self.budget
+        if budget is None:
+            return False
+        buf = self.buf
+        if buf is None:
+            size = self.strbuf_len
+        elif self.overflowed:
+            size = 0
+        else:
+            # data that has been read stays in the BytesIO until pruned
+            size = buf.file.tell() + buf.remain
+        nbytes = size - self.in_memory
+        self.in_memory = size
+        return budget.add(nbytes)
+
     def _create_buffer(self):
-        strbuf = self.strbuf
-        if len(strbuf) >= self.overflow:
+        if self.strbuf_len >= self.overflow:
             self._set_large_buffer()
         else:
             self._set_small_buffer()
         buf = self.buf
-        if strbuf:
+        if self.strbuf_len:
             buf.append(self.strbuf)
             self.strbuf = b""
         return buf
@@ -250,7 +1267,12 @@ class OverflowableBuffer:
 
     def _set_large_buffer(self):
         oldbuf = self.buf
-        self.buf = TempfileBasedBuffer(oldbuf)
+        if self.spill_writer is not None:
+            self.buf = SpilledTempfileBasedBuffer(
+                self.spill_writer, oldbuf, self.spill, self.pool
+            )
+        else:
+            self.buf = TempfileBasedBuffer(oldbuf, self.spill, self.pool)
 
         # Attempt to close the old buffer
         if hasattr(oldbuf, "close"):
@@ -261,9 +1283,14 @@ class OverflowableBuffer:
     def append(self, s):
         buf = self.buf
         if buf is None:
-            strbuf = self.strbuf
-            if len(strbuf) + len(s) < STRBUF_LIMIT:
-                self.strbuf = strbuf + s
+            strbuf_len = self.strbuf_len + len(s)
+            if strbuf_len < STRBUF_LIMIT:
+                if s.__class__ is not bytes:
+                    # we keep a reference, so it must not change under us
+                    s = bytes(s)
+                self.chunks.append(s)
+                self.strbuf_len = strbuf_len
+                self._account()
                 return
             buf = self._create_buffer()
         buf.append(s)
@@ -271,26 +1298,28 @@ class OverflowableBuffer:
         # OverflowError on Python 2
         sz = buf.__len__()
         if not self.overflowed:
-            if sz >= self.overflow:
+            # Overflow early if the process is holding too much in memory
+            if sz >= self.overflow or self._account():
                 self._set_large_buffer()
+                self._account()
 
     def get(self, numbytes=-1, skip=False):
         buf = self.buf
         if buf is None:
-            strbuf = self.strbuf
             if not skip:
-                return strbuf
+                return self.strbuf
             buf = self._create_buffer()
         return buf.get(numbytes, skip)
 
     def skip(self, numbytes, allow_prune=False):
         buf = self.buf
         if buf is None:
-            if allow_prune and numbytes == len(self.strbuf):
+            if allow_prune and numbytes == self.strbuf_len:
                 # We could slice instead of converting to
                 # a buffer, but that would eat up memory in
                 # large transfers.
                 self.strbuf = b""
+                self._account()
                 return
             buf = self._create_buffer()
         buf.skip(numbytes, allow_prune)
@@ -303,15 +1332,17 @@ class OverflowableBuffer:
         buf = self.buf
         if buf is None:
             self.strbuf = b""
+            self._account()
             return
         buf.prune()
         if self.overflowed:
             # use buf.__len__ rather than len(buf) FBO of not getting
             # OverflowError on Python 2
             sz = buf.__len__()
-            if sz < self.overflow:
+            if sz < self.overflow and not (self.budget and self.budget.exceeded):
                 # Revert to a faster buffer.
                 self._set_small_buffer()
+        self._account()
 
     def getfile(self):
         buf = self.buf
@@ -319,7 +1350,19 @@ class OverflowableBuffer:
             buf = self._create_buffer()
         return buf.getfile()
 
+    def getmmap(self):
+        """
+        Return a MmapReader over the data if it has overflowed to a tempfile,
+        None if it is held in memory.
+        """
+        if not self.overflowed or not self.buf.__len__():
+            return None
+        return self.buf.getmmap()
+
     def close(self):
         buf = self.buf
         if buf is not None:
             buf.close()
+        if self.in_memory:
+            self.budget.add(-self.in_memory)
+            self.in_memory = 0
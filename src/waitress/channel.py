@@ -13,16 +13,27 @@
 ##############################################################################
 import socket
 import threading
-import time
 import traceback
 
-from waitress.buffers import OverflowableBuffer, ReadOnlyFileBasedBuffer
-from waitress.parser import HTTPRequestParser
+from waitress.buffers import (
+    OverflowableBuffer,
+    ReadAheadFileBasedBuffer,
+    ReadOnlyFileBasedBuffer,
+    buffer_pool,
+    can_read_ahead,
+    memory_budget,
+    spill_writer,
+)
+from waitress.parser import HTTPRequestParser, RequestBodyError
 from waitress.task import ErrorTask, WSGITask
-from waitress.utilities import InternalServerError
+from waitress.utilities import InternalServerError, clock, logger
 
 from . import wasyncore
 
+# Held while creating the outbuf_lock of a channel, so the main loop and a
+# task can't both create one
+outbuf_lock_created = threading.Lock()
+
 
 class ClientDisconnected(Exception):
     """Raised when attempting to write to a closed socket."""
@@ -42,12 +53,19 @@ class HTTPChannel(wasyncore.dispatcher):
 
     # A request that has not been received yet completely is stored here
     request = None
-    last_activity = 0  # Time of last activity
+    last_activity = 0  # clock.monotonic of the last activity
     will_close = False  # set to True to close the socket.
     close_when_flushed = False  # set to True to close the socket when flushed
     sent_continue = False  # used as a latch after sending 100 continue
     total_outbufs_len = 0  # total bytes ready to send
     current_outbuf_count = 0  # total bytes written to current outbuf
+    environ_template = None  # WSGI environ keys shared by every request
+    _outbuf_lock = None  # see outbuf_lock
+    request_count = 0  # the number of requests dispatched so far
+    bytes_received = 0  # total bytes received from the client
+    bytes_sent = 0  # total bytes sent to the client
+    read_mark = None  # see check_deadlines
+    send_mark = None  # see check_deadlines
 
     #
     # ASYNCHRONOUS METHODS (including __init__)
@@ -56,21 +74,148 @@ class HTTPChannel(wasyncore.dispatcher):
     def __init__(self, server, sock, addr, adj, map=None):
         self.server = server
         self.adj = adj
-        self.outbufs = [OverflowableBuffer(adj.outbuf_overflow)]
-        self.creation_time = self.last_activity = time.time()
+        self.outbufs = [self.new_outbuf()]
+        self.creation_time = self.last_activity = clock.monotonic
         self.sendbuf_len = sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
 
         # requests_lock used to push/pop requests and modify the request that is
         # currently being created
         self.requests_lock = threading.Lock()
-        # outbuf_lock used to access any outbuf (expected to use an RLock)
-        self.outbuf_lock = threading.Condition()
 
         wasyncore.dispatcher.__init__(self, sock, map=map)
         self.connected = True
         self.addr = addr
         self.requests = []
 
+    @property
+    def outbuf_lock(self):
+        """
+        The Condition used to access any outbuf (expected to use an RLock).
+
+        It is only created once it is needed, and let go of by ``compact``
+        while the channel is idle, as it takes up more memory than the rest
+        of an idle channel.
+        """
+        lock = self._outbuf_lock
+
+        if lock is None:
+            with outbuf_lock_created:
+                lock = self._outbuf_lock
+
+                if lock is None:
+                    lock = self._outbuf_lock = threading.Condition()
+
+        return lock
+
+    @outbuf_lock.setter
+    def outbuf_lock(self, lock):
+        self._outbuf_lock = lock
+
+    @property
+    def idle(self):
+        """
+        True if no request is being received or serviced, and there is
+        nothing waiting to be sent.
+        """
+        return not (
+            self.requests
+            or self.request is not None
+            or self.total_outbufs_len
+            or self.will_close
+            or self.close_when_flushed
+        )
+
+    def compact(self):
+        """
+        Let go of the state that is only needed while requests are being
+        received or serviced, if there are none. Called by the server's
+        maintenance on the main thread; the state is created again for the
+        next request.
+        """
+        with self.requests_lock:
+            if not self.idle:
+                return
+
+            # No task can be using the lock, as it only runs while its
+            # request is in self.requests
+            self._outbuf_lock = None
+            self.environ_template = None
+
+    def park(self):
+        """
+        Replace the channel in the socket map by a ``ParkedChannel`` if there
+        are no requests being received or serviced and nothing waiting to be
+        sent, and return it. Called by the server's maintenance on the main
+        thread.
+        """
+        with self.requests_lock:
+            if not self.idle or not self.connected:
+                return None
+
+            for outbuf in self.outbufs:
+                outbuf.close()
+            self.outbufs = []
+
+            return ParkedChannel(self)
+
+    def check_deadlines(self, now):
+        """
+        Return ``"request_header"``, ``"request_body"`` or ``"response"`` if
+        the client is taking too long to send the headers of a request, or
+        is sending its body or reading a response too slowly, otherwise None.
+        Called by the server once a second on the main thread.
+
+        The transfer that is in progress is marked with the time and byte
+        count at which it was first seen, and the rates are measured over
+        periods of adj.min_rate_period seconds from there. A request only
+        counts while the channel is reading from the client, and a response
+        while data is waiting to be sent.
+        """
+        if self.will_close:
+            return None
+
+        adj = self.adj
+        request = self.request
+
+        if request is not None and not request.completed and self.readable():
+            headers_finished = request.headers_finished
+            mark = self.read_mark
+
+            if mark is None or mark[0] is not request or mark[1] != headers_finished:
+                self.read_mark = (request, headers_finished, now, self.bytes_received)
+            elif not headers_finished:
+                if 0 < adj.request_header_timeout <= now - mark[2]:
+                    return "request_header"
+            elif adj.min_request_body_rate and now - mark[2] >= adj.min_rate_period:
+                nbytes = self.bytes_received - mark[3]
+                if nbytes < (now - mark[2]) * adj.min_request_body_rate:
+                    return "request_body"
+                self.read_mark = (request, True, now, self.bytes_received)
+        elif self.read_mark is not None:
+            self.read_mark = None
+
+        if self.total_outbufs_len:
+            mark = self.send_mark
+
+            if mark is None:
+                self.send_mark = (now, self.bytes_sent)
+            elif adj.min_response_rate and now - mark[0] >= adj.min_rate_period:
+                if self.bytes_sent - mark[1] < (now - mark[0]) * adj.min_response_rate:
+                    return "response"
+                self.send_mark = (now, self.bytes_sent)
+        elif self.send_mark is not None:
+            self.send_mark = None
+
+        return None
+
+    def new_outbuf(self):
+        return OverflowableBuffer(
+            self.adj.outbuf_overflow,
+            spill=self.adj.buffer_spill,
+            pool=buffer_pool,
+            budget=memory_budget,
+        )
+
     def check_client_disconnected(self):
         """
         This method is inserted into the environment of any created task so it
@@ -85,7 +230,12 @@ class HTTPChannel(wasyncore.dispatcher):
         # the channel (possibly by our server maintenance logic), run
         # handle_write
 
-        return self.total_outbufs_len > 0 or self.will_close or self.close_when_flushed
+        if self.will_close or self.close_when_flushed:
+            return True
+
+        # a ReadAheadFileBasedBuffer that has nothing in memory yet pulls the
+        # trigger once it does, there is nothing to send until then
+        return self.total_outbufs_len > 0 and getattr(self.outbufs[0], "ready", True)
 
     def handle_write(self):
         # Precondition: there's data in the out buffer to be sent, or
@@ -138,6 +288,19 @@ class HTTPChannel(wasyncore.dispatcher):
         return (False, False)
 
     def readable(self):
+        request = self.request
+
+        if request is not None and request.dispatched:
+            # The body of a request that has been handed to the application
+            # already is being received, which we keep doing unless the
+            # application falls behind reading it.
+            return not (
+                self.will_close
+                or self.close_when_flushed
+                or request.completed
+                or request.get_body_stream().backlogged(self.server.pull_trigger)
+            )
+
         # We might want to read more requests. We can only do this if:
         # 1. We're not already about to close the connection.
         # 2. We're not waiting to flush remaining data before closing the
@@ -145,14 +308,35 @@ class HTTPChannel(wasyncore.dispatcher):
         # 3. There are not too many tasks already queued (if lookahead is enabled)
         # 4. There's no data in the output buffer that needs to be sent
         #    before we potentially create a new task.
+        # 5. The spill writer isn't too far behind writing request bodies
+        #    to disk (if spilling in the background is enabled).
 
         return not (
             self.will_close
             or self.close_when_flushed
             or len(self.requests) > self.adj.channel_request_lookahead
             or self.total_outbufs_len
+            or (self.adj.inbuf_spill_async and self.spill_backlogged())
         )
 
+    def spill_backlogged(self):
+        request = self.request
+
+        # Only channels that add to the backlog wait for it, the others keep
+        # reading requests
+        if (
+            request is None
+            or spill_writer.pending <= self.adj.inbuf_spill_high_watermark
+            or not request.spilling
+        ):
+            return False
+
+        # Wake up the main loop once the writer has caught up so that we
+        # start reading again without waiting for the select() timeout.
+        spill_writer.notify_when_drained(self.server.pull_trigger)
+
+        return True
+
     def handle_read(self):
         try:
             data = self.recv(self.adj.recv_bytes)
@@ -164,7 +348,8 @@ class HTTPChannel(wasyncore.dispatcher):
             return
 
         if data:
-            self.last_activity = time.time()
+            self.last_activity = clock.monotonic
+            self.bytes_received += len(data)
             self.received(data)
         else:
             # Client disconnected.
@@ -210,7 +395,16 @@ class HTTPChannel(wasyncore.dispatcher):
             while data:
                 if self.request is None:
                     self.request = self.parser_class(self.adj)
+                headers_finished = self.request.headers_finished
                 n = self.request.received(data)
+                rejected = False
+
+                if (
+                    self.adj.admission_hook is not None
+                    and self.request.headers_finished
+                    and not headers_finished
+                ):
+                    rejected = self.admit(self.request)
 
                 # if there are requests queued, we can not send the continue
                 # header yet since the responses need to be kept in order
@@ -220,6 +414,8 @@ class HTTPChannel(wasyncore.dispatcher):
                     and self.request.headers_finished
                     and not self.requests
                     and not self.sent_continue
+                    and not self.request.continue_deferred
+                    and not rejected
                 ):
                     self.send_continue()
 
@@ -227,16 +423,37 @@ class HTTPChannel(wasyncore.dispatcher):
                     # The request (with the body) is ready to use.
                     self.sent_continue = False
 
-                    if not self.request.empty:
-                        self.requests.append(self.request)
-
-                        if len(self.requests) == 1:
-                            # self.requests was empty before so the main thread
-                            # is in charge of starting the task. Otherwise,
-                            # service() will add a new task after each request
-                            # has been processed
-                            self.server.add_task(self)
-                    self.request = None
+                    if self.request.dispatched:
+                        if self.request.error:
+                            # The streamed body was invalid, we can not make
+                            # sense of anything that follows it. service()
+                            # closes the connection once it is done, unless
+                            # the application already returned without
+                            # reading all of the body.
+                            if self.request not in self.requests:
+                                self.request = None
+                                self.close_when_flushed = True
+                            break
+                    elif not self.request.empty:
+                        self.dispatch(self.request)
+                    request, self.request = self.request, None
+
+                    if rejected:
+                        # The connection is closed once the error is sent,
+                        # don't read the body as the next request
+                        break
+
+                    if request.dispatched and request.connection_close:
+                        # Nothing that follows will be serviced
+                        break
+                elif (
+                    self.request.streaming
+                    and self.request.headers_finished
+                    and not self.request.dispatched
+                ):
+                    # The application reads the body while it is being
+                    # received, so it can start on the request right away.
+                    self.dispatch(self.request)
 
                 if n >= len(data):
                     break
@@ -244,6 +461,51 @@ class HTTPChannel(wasyncore.dispatcher):
 
         return True
 
+    def admit(self, request):
+        """
+        Pass a request whose headers have just been received to the
+        admission_hook, and turn it into the error response the hook returns,
+        if any. Returns True if the request was rejected.
+        """
+
+        if request.error is not None or request.empty:
+            return False
+
+        try:
+            error = self.adj.admission_hook(
+                request.command, request.path, request.headers
+            )
+        except Exception:
+            self.logger.exception("Exception in admission_hook for %s" % request.path)
+            error = InternalServerError(
+                "The server encountered an unexpected internal server error"
+            )
+
+        if error is None:
+            return False
+
+        request.error = error
+        request.completed = True
+
+        return True
+
+    def dispatch(self, request):
+        request.dispatched = True
+        self.request_count += 1
+        limit = self.adj.max_requests_per_connection
+
+        if limit and self.request_count >= limit:
+            # The connection is closed once the response has been sent
+            request.connection_close = True
+        self.requests.append(request)
+
+        if len(self.requests) == 1:
+            # self.requests was empty before so the main thread
+            # is in charge of starting the task. Otherwise,
+            # service() will add a new task after each request
+            # has been processed
+            self.server.add_task(self)
+
     def _flush_some_if_lockable(self, do_close=True):
         # Since our task may be appending to the outbuf, we try to acquire
         # the lock, but we don't block if we can't.
@@ -300,7 +562,8 @@ class HTTPChannel(wasyncore.dispatcher):
                 break
 
         if sent:
-            self.last_activity = time.time()
+            self.last_activity = clock.monotonic
+            self.bytes_sent += sent
 
             return True
 
@@ -318,6 +581,16 @@ class HTTPChannel(wasyncore.dispatcher):
             self.total_outbufs_len = 0
             self.connected = False
             self.outbuf_lock.notify()
+        request = self.request
+        if request is not None:
+            # Release the body buffer of a request that was never completed
+            self.request = None
+            if request.dispatched:
+                # The application is reading its body as it arrives
+                request.get_body_stream().fail(
+                    ClientDisconnected("Client disconnected while sending the body")
+                )
+            request.close()
         wasyncore.dispatcher.close(self)
 
     def add_channel(self, map=None):
@@ -362,15 +635,19 @@ class HTTPChannel(wasyncore.dispatcher):
 
                 if isinstance(data, ReadOnlyFileBasedBuffer):
                     # they used wsgi.file_wrapper
+                    if self.adj.file_wrapper_read_ahead and can_read_ahead(data):
+                        # read the file on a helper thread rather than having
+                        # the main loop block on it while flushing
+                        data = ReadAheadFileBasedBuffer(data, self.server.pull_trigger)
                     self.outbufs.append(data)
-                    nextbuf = OverflowableBuffer(self.adj.outbuf_overflow)
+                    nextbuf = self.new_outbuf()
                     self.outbufs.append(nextbuf)
                     self.current_outbuf_count = 0
                 else:
                     if self.current_outbuf_count >= self.adj.outbuf_high_watermark:
                         # rotate to a new buffer if the current buffer has hit
                         # the watermark to avoid it growing unbounded
-                        nextbuf = OverflowableBuffer(self.adj.outbuf_overflow)
+                        nextbuf = self.new_outbuf()
                         self.outbufs.append(nextbuf)
                         self.current_outbuf_count = 0
                     self.outbufs[-1].append(data)
@@ -394,9 +671,15 @@ class HTTPChannel(wasyncore.dispatcher):
         return 0
 
     def _flush_outbufs_below_high_watermark(self):
+        # with response buffering the task only waits for the client once
+        # more than response_buffer_size bytes are pending
+        high_watermark = self.adj.outbuf_high_watermark
+        if self.adj.response_buffer_size > high_watermark:
+            high_watermark = self.adj.response_buffer_size
+
         # check first to avoid locking if possible
 
-        if self.total_outbufs_len > self.adj.outbuf_high_watermark:
+        if self.total_outbufs_len > high_watermark:
             with self.outbuf_lock:
                 _, exception = self._flush_exception(self._flush_some, do_close=False)
 
@@ -409,10 +692,7 @@ class HTTPChannel(wasyncore.dispatcher):
 
                     return
 
-                while (
-                    self.connected
-                    and self.total_outbufs_len > self.adj.outbuf_high_watermark
-                ):
+                while self.connected and self.total_outbufs_len > high_watermark:
                     self.server.pull_trigger()
                     self.outbuf_lock.wait()
 
@@ -435,6 +715,16 @@ class HTTPChannel(wasyncore.dispatcher):
         except ClientDisconnected:
             self.logger.info("Client disconnected while serving %s" % task.request.path)
             task.close_on_finish = True
+        except RequestBodyError:
+            # The rest of a streamed request body was invalid, respond with
+            # the error found by the parser if we still can.
+            if not task.wrote_header:
+                task = self.error_task_class(self, request)
+                try:
+                    task.service()
+                except ClientDisconnected:
+                    pass
+            task.close_on_finish = True
         except Exception:
             self.logger.exception("Exception while serving %s" % task.request.path)
 
@@ -485,9 +775,11 @@ class HTTPChannel(wasyncore.dispatcher):
             # next request to create a new outbuf to avoid sharing
             # outbufs across requests which can cause outbufs to
             # not be deallocated regularly when a connection is open
-            # for a long time
+            # for a long time. An outbuf that still keeps its data as a
+            # list of bytes lets go of it as it is sent, so it is kept for
+            # the next request.
 
-            if self.current_outbuf_count > 0:
+            if self.current_outbuf_count > 0 and self.outbufs[-1].buf is not None:
                 self.current_outbuf_count = self.adj.outbuf_high_watermark
 
             request.close()
@@ -496,28 +788,150 @@ class HTTPChannel(wasyncore.dispatcher):
             with self.requests_lock:
                 self.requests.pop(0)
 
-                if self.connected and self.requests:
-                    self.server.add_task(self)
-                elif (
-                    self.connected
-                    and self.request is not None
-                    and self.request.expect_continue
-                    and self.request.headers_finished
-                    and not self.sent_continue
-                ):
-                    # A request waits for a signal to continue, but we could
-                    # not send it until now because requests were being
-                    # processed and the output needs to be kept in order
-                    self.send_continue()
+                if request is self.request and request.completed:
+                    # The streamed body of the request turned out to be
+                    # invalid after the application was done with it
+                    self.request = None
+                    self.close_when_flushed = True
+                elif self.connected:
+                    if self.requests:
+                        self.server.add_task(self)
+
+                    if (
+                        self.request is not None
+                        and self.request.expect_continue
+                        and self.request.headers_finished
+                        and not self.sent_continue
+                        and not self.request.continue_deferred
+                        and (not self.requests or self.requests[0] is self.request)
+                    ):
+                        # A request waits for a signal to continue, but we
+                        # could not send it until now because requests were
+                        # being processed and the output needs to be kept in
+                        # order. A streamed request may already be next.
+                        self.send_continue()
 
         if self.connected:
             self.server.pull_trigger()
 
-        self.last_activity = time.time()
+        self.last_activity = clock.monotonic
 
     def cancel(self):
         """Cancels all pending / active requests"""
         self.will_close = True
         self.connected = False
-        self.last_activity = time.time()
+        self.last_activity = clock.monotonic
         self.requests = []
+
+
+class ParkedChannel:
+    """
+    Stands in for an idle ``HTTPChannel`` in the socket map, holding on to
+    little more than its socket. Once the client sends data, a new channel
+    is created for the socket, which takes over from here.
+    """
+
+    __slots__ = (
+        "server",
+        "socket",
+        "addr",
+        "adj",
+        "map",
+        "last_activity",
+        "request_count",
+        "will_close",
+        "channel",
+        "_fileno",
+    )
+
+    accepting = False
+    # for the server's maintenance
+    requests = ()
+    request = None
+    total_outbufs_len = 0
+    close_when_flushed = False
+
+    def __init__(self, channel):
+        self.server = channel.server
+        self.socket = channel.socket
+        self.addr = channel.addr
+        self.adj = channel.adj
+        self.map = channel._map
+        self.last_activity = channel.last_activity
+        self.request_count = channel.request_count
+        self.will_close = False  # set by the server's maintenance
+        self.channel = None
+        self._fileno = fd = channel._fileno
+        self.map[fd] = self
+        self.server.active_channels[fd] = self
+
+    @property
+    def idle(self):
+        return not self.will_close
+
+    @property
+    def connected(self):
+        if self.channel is not None:
+            return self.channel.connected
+        return self.map.get(self._fileno) is self
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        # Closes the connection in handle_write_event once timed out
+        return self.will_close
+
+    def park(self):
+        return None
+
+    def compact(self):
+        pass
+
+    def check_deadlines(self, now):
+        return None
+
+    def unpark(self):
+        """Return the channel that took over the socket, creating it."""
+        channel = self.channel
+
+        if channel is None:
+            server = self.server
+            channel = self.channel = server.channel_class(
+                server, self.socket, self.addr, self.adj, self.map
+            )
+            # max_requests_per_connection counts for the whole connection
+            channel.request_count = self.request_count
+
+        return channel
+
+    def handle_read_event(self):
+        self.unpark().handle_read_event()
+
+    def handle_expt_event(self):
+        self.unpark().handle_expt_event()
+
+    def handle_write_event(self):
+        self.handle_close()
+
+    def handle_close(self):
+        if self.channel is not None:
+            self.channel.handle_close()
+
+            return
+
+        fd = self._fileno
+
+        if self.map.get(fd) is self:
+            del self.map[fd]
+
+        if self.server.active_channels.get(fd) is self:
+            del self.server.active_channels[fd]
+
+        self.socket.close()
+
+    def handle_error(self):
+        logger.exception("Exception in a parked channel, closing it")
+        self.handle_close()
+
+    close = handle_close
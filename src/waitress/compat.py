@@ -1,3 +1,4 @@
+import os
 import platform
 
 # Fix for issue reported in https://github.com/Pylons/waitress/issues/138,
@@ -27,3 +28,22 @@ else:  # pragma: no cover
             RuntimeWarning,
         )
         HAS_IPV6 = False
+
+if hasattr(os, "pread") and hasattr(os, "pwrite"):
+
+    def pread(file, size, offset):
+        return os.pread(file.fileno(), size, offset)
+
+    def pwrite(file, data, offset):
+        return os.pwrite(file.fileno(), data, offset)
+
+else:  # pragma: no cover
+    # Windows doesn't have positional I/O, emulate it by seeking first
+
+    def pread(file, size, offset):
+        file.seek(offset)
+        return file.read(size)
+
+    def pwrite(file, data, offset):
+        file.seek(offset)
+        return file.write(data)
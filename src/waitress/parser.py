@@ -17,14 +17,22 @@ This server uses asyncore to accept connections and do initial
 processing but threads to do work.
 """
 
-from io import BytesIO
+from collections import OrderedDict
 import re
+import threading
 from urllib import parse
 from urllib.parse import unquote_to_bytes
 
-from waitress.buffers import OverflowableBuffer
+from waitress.buffers import (
+    OverflowableBuffer,
+    StreamingBodyBuffer,
+    buffer_pool,
+    empty_input,
+    memory_budget,
+    spill_writer,
+)
 from waitress.receiver import ChunkedReceiver, FixedStreamReceiver
-from waitress.rfc7230 import HEADER_FIELD_RE, ONLY_DIGIT_RE
+from waitress.rfc7230 import FIELD_VALUE_CHARS, ONLY_DIGIT_RE, TOKEN_CHARS
 from waitress.utilities import (
     BadRequest,
     RequestEntityTooLarge,
@@ -36,6 +44,157 @@ from waitress.utilities import (
 # A list of HEADERS that must not be duplicated per RFC 9112
 SINGLETON_FIELDS = frozenset({"HOST", "CONTENT_LENGTH", "CONTENT_TYPE"})
 
+# Turns a field-name into the key used in HTTPRequestParser.headers
+HEADER_KEY_TABLE = bytes.maketrans(
+    b"abcdefghijklmnopqrstuvwxyz-", b"ABCDEFGHIJKLMNOPQRSTUVWXYZ_"
+)
+
+# The headers that are not prefixed with HTTP_ in the WSGI environ
+ENVIRON_KEYS = {
+    "CONTENT_LENGTH": "CONTENT_LENGTH",
+    "CONTENT_TYPE": "CONTENT_TYPE",
+}
+
+# The headers whose values are interned by HeaderNames, as the same few values
+# are sent over and over again.
+INTERNED_VALUE_KEYS = frozenset(
+    {
+        "ACCEPT",
+        "ACCEPT_ENCODING",
+        "ACCEPT_LANGUAGE",
+        "CACHE_CONTROL",
+        "CONNECTION",
+        "CONTENT_TYPE",
+        "PRAGMA",
+        "SEC_FETCH_DEST",
+        "SEC_FETCH_MODE",
+        "SEC_FETCH_SITE",
+        "UPGRADE_INSECURE_REQUESTS",
+        "X_FORWARDED_PROTO",
+    }
+)
+
+
+class HeaderNames:
+    """
+    A bounded table of the header field-names seen so far, which maps each
+    raw name to its key in ``HTTPRequestParser.headers`` and that key to the
+    key of the WSGI environ, so the same names sent with every request are
+    not normalized again and again. The values of the headers in
+    ``INTERNED_VALUE_KEYS`` are interned too.
+
+    Each table is emptied once it holds ``size`` entries, so a client making
+    up header names can't grow it, and the names in use make their way back
+    in afterwards. It is shared by the main loop, which parses headers, and
+    the task threads, which build the environ.
+    """
+
+    def __init__(self, size=512):
+        self.size = size
+        self.lock = threading.Lock()
+        self.keys = {}
+        self.environ_keys = {}
+        self.values = {}
+
+    def _add(self, table, name, value):
+        with self.lock:
+            if len(table) >= self.size:
+                table.clear()
+            table[name] = value
+
+    def key(self, name):
+        """Return the key of the raw field-name ``name``."""
+        key = self.keys.get(name)
+        if key is None:
+            key = name.translate(HEADER_KEY_TABLE).decode("latin-1")
+            self._add(self.keys, name, key)
+        return key
+
+    def environ_key(self, key):
+        """Return the environ key of the header ``key``."""
+        environ_key = self.environ_keys.get(key)
+        if environ_key is None:
+            environ_key = ENVIRON_KEYS.get(key) or "HTTP_" + key
+            self._add(self.environ_keys, key, environ_key)
+        return environ_key
+
+    def value(self, key, value):
+        """Return the raw ``value`` of the header ``key`` decoded."""
+        if key not in INTERNED_VALUE_KEYS:
+            return value.decode("latin-1")
+        decoded = self.values.get(value)
+        if decoded is None:
+            decoded = value.decode("latin-1")
+            self._add(self.values, value, decoded)
+        return decoded
+
+    def clear(self):
+        with self.lock:
+            self.keys.clear()
+            self.environ_keys.clear()
+            self.values.clear()
+
+
+header_names = HeaderNames()
+
+
+class RequestLines:
+    """
+    A least recently used cache of parsed request lines, keyed by the raw
+    request line, as a server tends to see the same few hundred of them
+    (health checks, polling endpoints, assets) over and over.
+
+    Only request lines of at most ``max_length`` bytes are kept, and at most
+    ``size`` of them. A request line that fails to parse raises every time
+    it is seen, it is never cached. ``hits`` and ``misses`` count the
+    lookups.
+    """
+
+    def __init__(self, size=1024, max_length=1024):
+        self.size = size
+        self.max_length = max_length
+        self.lock = threading.Lock()
+        self.lines = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def parse(self, first_line):
+        """
+        Return the ``(command, request_uri, version, proxy_scheme,
+        proxy_netloc, path, query, fragment)`` of ``first_line``, see
+        ``parse_first_line``.
+        """
+        lines = self.lines
+
+        with self.lock:
+            parsed = lines.get(first_line)
+
+            if parsed is not None:
+                lines.move_to_end(first_line)
+                self.hits += 1
+
+                return parsed
+            self.misses += 1
+
+        parsed = parse_first_line(first_line)
+
+        if len(first_line) <= self.max_length:
+            with self.lock:
+                lines[first_line] = parsed
+
+                while len(lines) > self.size:
+                    lines.popitem(last=False)
+
+        return parsed
+
+    def clear(self):
+        with self.lock:
+            self.lines.clear()
+            self.hits = self.misses = 0
+
+
+request_lines = RequestLines()
+
 
 def unquote_bytes_to_wsgi(bytestring):
     return unquote_to_bytes(bytestring).decode("latin-1")
@@ -49,6 +208,11 @@ class TransferEncodingNotImplemented(Exception):
     pass
 
 
+class RequestBodyError(Exception):
+    """Raised when reading a streamed request body turns out to be invalid
+    or too large."""
+
+
 class HTTPRequestParser:
     """A structure that collects the HTTP request.
 
@@ -60,7 +224,7 @@ class HTTPRequestParser:
     empty = False  # Set if no request was made.
     expect_continue = False  # client sent "Expect: 100-continue" header
     headers_finished = False  # True when headers have been read
-    header_plus = b""
+    header_tail = b""  # the last few bytes of header_chunks
     chunked = False
     content_length = 0
     header_bytes_received = 0
@@ -69,6 +233,9 @@ class HTTPRequestParser:
     version = "1.0"
     error = None
     connection_close = False
+    streaming = False  # True if the body is streamed to the application
+    dispatched = False  # set by the channel once queued to be serviced
+    continue_deferred = False  # 100 Continue is sent once the app reads
 
     # Other attributes: first_line, header, headers, command, uri, version,
     # path, query, fragment
@@ -81,6 +248,28 @@ class HTTPRequestParser:
         # with dashes turned into underscores.
         self.headers = {}
         self.adj = adj
+        # The fragments of the header received so far, only joined once the
+        # end of the header has been found.
+        self.header_chunks = []
+
+    @property
+    def header_plus(self):
+        """The part of the header that was received so far."""
+        return b"".join(self.header_chunks)
+
+    def _find_header_end(self, data):
+        """
+        Return the offset in ``data`` just past the double newline that ends
+        the header, or -1. Only ``data`` and the last few bytes received
+        before it are searched, rather than the whole header again.
+        """
+        tail = self.header_tail
+        if tail:
+            # the double newline might start in what was received before
+            pos = (tail + data[:3]).find(b"\r\n\r\n")
+            if pos >= 0:
+                return pos + 4 - len(tail)
+        return find_double_newline(data)
 
     def received(self, data):
         """
@@ -99,16 +288,14 @@ class HTTPRequestParser:
             # In header.
             max_header = self.adj.max_request_header_size
 
-            s = self.header_plus + data
-            index = find_double_newline(s)
-            consumed = 0
+            index = self._find_header_end(data)
 
             if index >= 0:
                 # If the headers have ended, and we also have part of the body
                 # message in data we still want to validate we aren't going
                 # over our limit for received headers.
-                self.header_bytes_received = index
-                consumed = datalen - (len(s) - index)
+                self.header_bytes_received += index
+                consumed = index
             else:
                 self.header_bytes_received += datalen
                 consumed = datalen
@@ -128,7 +315,11 @@ class HTTPRequestParser:
 
             if index >= 0:
                 # Header finished.
-                header_plus = s[:index]
+                header_chunks = self.header_chunks
+                header_chunks.append(data[:index])
+                header_plus = b"".join(header_chunks)
+                self.header_chunks = []
+                self.header_tail = b""
 
                 # Remove preceding blank lines. This is suggested by
                 # https://tools.ietf.org/html/rfc7230#section-3.5 to support
@@ -169,7 +360,11 @@ class HTTPRequestParser:
                 return consumed
 
             # Header not finished yet.
-            self.header_plus = s
+            self.header_chunks.append(data)
+            if datalen >= 3:
+                self.header_tail = data[-3:]
+            else:
+                self.header_tail = (self.header_tail + data)[-3:]
 
             return datalen
         else:
@@ -190,7 +385,7 @@ class HTTPRequestParser:
                 # The request (with the body) is ready to use.
                 self.completed = True
 
-                if self.chunked:
+                if self.chunked and not self.streaming:
                     # We've converted the chunked transfer encoding request
                     # body into a normal request body, so we know its content
                     # length; set the header here.  We already popped the
@@ -199,6 +394,15 @@ class HTTPRequestParser:
                     # request with a valid content-length.
                     self.headers["CONTENT_LENGTH"] = str(br.__len__())
 
+            if self.streaming and self.completed:
+                # Let the application know that there is no more to come
+                buf = br.getbuf()
+
+                if self.error is None:
+                    buf.finish()
+                else:
+                    buf.fail(RequestBodyError(self.error.body))
+
             return consumed
 
     def parse_header(self, header_plus):
@@ -219,18 +423,11 @@ class HTTPRequestParser:
 
         self.first_line = first_line  # for testing
 
-        lines = get_header_lines(header)
-
         headers = self.headers
+        keys = header_names.keys
+        values = header_names.values
 
-        for line in lines:
-            header = HEADER_FIELD_RE.match(line)
-
-            if not header:
-                raise ParsingError("Invalid header")
-
-            key, value = header.group("name", "value")
-
+        for key, value in get_header_fields(header):
             if b"_" in key:
                 # TODO(xistence): Should we drop this request instead?
 
@@ -239,7 +436,10 @@ class HTTPRequestParser:
             # Only strip off whitespace that is considered valid whitespace by
             # RFC7230, don't strip the rest
             value = value.strip(b" \t")
-            key1 = key.upper().replace(b"-", b"_").decode("latin-1")
+            key1 = keys.get(key)
+
+            if key1 is None:
+                key1 = header_names.key(key)
 
             # Reject duplicate 'Host' headers as per RFC 9112 section 3.2
             if key1 in SINGLETON_FIELDS and key1 in headers:
@@ -252,27 +452,26 @@ class HTTPRequestParser:
             try:
                 headers[key1] += (b", " + value).decode("latin-1")
             except KeyError:
-                headers[key1] = value.decode("latin-1")
-
-        # command, uri, version will be bytes
-        command, uri, version = crack_first_line(first_line)
-        if command == uri == version == b"":
-            raise ParsingError("Start line is invalid")
-
-        # self.request_uri is like nginx's request_uri:
-        # "full original request URI (with arguments)"
-        self.request_uri = uri.decode("latin-1")
-        version = version.decode("latin-1")
-        command = command.decode("latin-1")
-        self.command = command
-        self.version = version
+                decoded = values.get(value)
+
+                if decoded is None:
+                    decoded = header_names.value(key1, value)
+                headers[key1] = decoded
+
         (
+            command,
+            # self.request_uri is like nginx's request_uri:
+            # "full original request URI (with arguments)"
+            self.request_uri,
+            version,
             self.proxy_scheme,
             self.proxy_netloc,
             self.path,
             self.query,
             self.fragment,
-        ) = split_uri(uri)
+        ) = request_lines.parse(first_line)
+        self.command = command
+        self.version = version
         self.url_scheme = self.adj.url_scheme
         connection = headers.get("CONNECTION", "")
 
@@ -322,8 +521,6 @@ class HTTPRequestParser:
                     )
 
                 self.chunked = True
-                buf = OverflowableBuffer(self.adj.inbuf_overflow)
-                self.body_rcv = ChunkedReceiver(buf)
 
                 # RFC9112 states that we need to close the connection if the
                 # Transfer-Encoding is set, AND a Content-Length is provided.
@@ -342,7 +539,10 @@ class HTTPRequestParser:
             if connection.lower() == "close":
                 self.connection_close = True
 
-        if not self.chunked:
+        if self.chunked:
+            buf = self._make_body_buffer()
+            self.body_rcv = ChunkedReceiver(buf)
+        else:
             cl = headers.get("CONTENT_LENGTH", "0")
 
             if not ONLY_DIGIT_RE.match(cl.encode("latin-1")):
@@ -352,16 +552,59 @@ class HTTPRequestParser:
             self.content_length = cl
 
             if cl > 0:
-                buf = OverflowableBuffer(self.adj.inbuf_overflow)
+                buf = self._make_body_buffer()
                 self.body_rcv = FixedStreamReceiver(cl, buf)
 
+    def _make_body_buffer(self):
+        if self.adj.defer_continue and self.expect_continue:
+            # The client is only asked for the body once the application
+            # reads it, which means it has to be streamed.
+            self.continue_deferred = True
+
+        if self.adj.stream_request_body or self.continue_deferred:
+            # The application gets to read the body as it arrives, we only
+            # hold on to so much of it.
+            self.streaming = True
+
+            return StreamingBodyBuffer(self.adj.inbuf_overflow)
+
+        writer = None
+
+        if self.adj.inbuf_spill_async:
+            # Let the spill writer thread do the disk I/O once the body
+            # overflows, as we are being called from the main loop.
+            writer = spill_writer
+
+        return OverflowableBuffer(
+            self.adj.inbuf_overflow,
+            writer,
+            self.adj.buffer_spill,
+            buffer_pool,
+            memory_budget,
+        )
+
     def get_body_stream(self):
         body_rcv = self.body_rcv
 
         if body_rcv is not None:
+            if self.adj.inbuf_mmap and not self.streaming:
+                reader = body_rcv.getbuf().getmmap()
+
+                if reader is not None:
+                    return reader
+
             return body_rcv.getfile()
         else:
-            return BytesIO()
+            return empty_input
+
+    @property
+    def spilling(self):
+        """Whether the body is being written to disk by the spill writer."""
+        body_rcv = self.body_rcv
+
+        return (
+            body_rcv is not None and not self.streaming and body_rcv.getbuf().spilling
+        )
 
     def close(self):
         body_rcv = self.body_rcv
@@ -433,6 +676,48 @@ def get_header_lines(header):
     return r
 
 
+def get_header_fields(header):
+    """
+    Splits the header into a list of ``(name, value)`` pairs, putting
+    multi-line headers together. The value still has its surrounding
+    whitespace.
+
+    This checks the header the same way as ``get_header_lines`` followed by
+    matching each line against ``HEADER_FIELD_RE`` would, but validates the
+    line endings of the whole header at once and checks the characters of
+    names and values with ``bytes.translate`` rather than a regex.
+    """
+    if not (header.count(b"\r\n") == header.count(b"\r") == header.count(b"\n")):
+        # There is a bare CR or LF somewhere, let get_header_lines find the
+        # line for the error message.
+        get_header_lines(header)
+
+    fields = []
+
+    for line in header.split(b"\r\n"):
+        if not line:
+            continue
+
+        if line[0] in b" \t":
+            if not fields:
+                # https://corte.si/posts/code/pathod/pythonservers/index.html
+                raise ParsingError('Malformed header line "%s"' % str(line, "latin-1"))
+            name, value = fields.pop()
+            value += line
+        else:
+            name, sep, value = line.partition(b":")
+
+            if not sep or not name or name.translate(None, TOKEN_CHARS):
+                raise ParsingError("Invalid header")
+
+        if value.translate(None, FIELD_VALUE_CHARS):
+            raise ParsingError("Invalid header")
+
+        fields.append((name, value))
+
+    return fields
+
+
 first_line_re = re.compile(
     rb"(?P<method>[!#$%&'*+\-.^_`|~0-9A-Za-z]+) "
     rb"(?P<uri>(?:[^ :?#]+://[^ ?#/]*(?:[0-9]{1,5})?)?[^ ]+)"
@@ -464,3 +749,23 @@ def crack_first_line(line):
         raise ParsingError('Malformed HTTP method "%s"' % str(method, "latin-1"))
 
     return method, uri, version
+
+
+def parse_first_line(line):
+    """
+    Parse the request line ``line``, returning its decoded ``(command,
+    request_uri, version, proxy_scheme, proxy_netloc, path, query,
+    fragment)``.
+    """
+    # command, uri, version will be bytes
+    command, uri, version = crack_first_line(line)
+
+    if command == uri == version == b"":
+        raise ParsingError("Start line is invalid")
+
+    return (
+        command.decode("latin-1"),
+        uri.decode("latin-1"),
+        version.decode("latin-1"),
+        *split_uri(uri),
+    )
@@ -14,7 +14,9 @@
 """Data Chunk Receiver"""
 
 from waitress.rfc7230 import CHUNK_EXT_RE, ONLY_HEXDIG_RE
-from waitress.utilities import BadRequest, find_double_newline
+from waitress.utilities import BadRequest
+
+HEXDIGITS = b"0123456789abcdefABCDEF"
 
 
 class FixedStreamReceiver:
@@ -61,7 +63,6 @@ class FixedStreamReceiver:
 class ChunkedReceiver:
     chunk_remainder = 0
     validate_chunk_end = False
-    control_line = b""
     chunk_end = b""
     all_chunks_received = False
     trailer = b""
@@ -73,65 +74,145 @@ class ChunkedReceiver:
 
     def __init__(self, buf):
         self.buf = buf
+        # The fragments of the control line or trailer received so far, kept
+        # as a list so that they are only joined once the line is complete.
+        self.pending = []
+        self.pending_len = 0
+        self.pending_tail = b""  # the last few bytes of the pending data
 
     def __len__(self):
         return self.buf.__len__()
 
+    @property
+    def control_line(self):
+        """The part of the current control line that was received so far."""
+        if self.all_chunks_received:
+            return b""
+        return b"".join(self.pending)
+
+    def _hold(self, data):
+        """Add ``data`` to the pending control line or trailer."""
+        self.pending.append(data)
+        self.pending_len += len(data)
+        if len(data) >= 3:
+            self.pending_tail = data[-3:]
+        else:
+            self.pending_tail = (self.pending_tail + data)[-3:]
+
+    def _scan(self, s, sep, start=0):
+        """
+        Look for ``sep`` in the pending data followed by ``s[start:]``, only
+        searching the newly received data and the end of the pending data.
+        Returns the offset in ``s`` just past ``sep``, or -1 after adding
+        ``s[start:]`` to the pending data if it was not found.
+        """
+        overlap = len(sep) - 1
+        tail = self.pending_tail[-overlap:]
+        if tail:
+            # sep might start in the pending data
+            pos = (tail + s[start : start + overlap]).find(sep)
+            if pos >= 0:
+                return start + pos + len(sep) - len(tail)
+        pos = s.find(sep, start)
+        if pos >= 0:
+            return pos + len(sep)
+        self._hold(s[start:])
+        return -1
+
+    def _take_pending(self, s):
+        """Return the pending data followed by ``s`` and forget about it."""
+        pending = self.pending
+        if pending:
+            pending.append(s)
+            s = b"".join(pending)
+            self.pending = []
+            self.pending_len = 0
+            self.pending_tail = b""
+        return s
+
     def received(self, s):
         # Returns the number of bytes consumed.
 
         if self.completed:
             return 0
-        orig_size = len(s)
-
-        while s:
+        size = len(s)
+        rm = self.chunk_remainder
+
+        if rm >= size > 0:
+            # All of s is chunk data.
+            self.buf.append(s)
+            self.chunk_remainder = rm - size
+
+            if self.chunk_remainder == 0:
+                self.validate_chunk_end = True
+
+            return size
+        consumed = size
+        # Rather than slicing off what has been processed, we keep track of
+        # our position in s, and the chunk data found in it is appended to
+        # the buffer all at once.
+        pos = 0
+        data = memoryview(s)
+        body = []
+
+        while pos < size:
             rm = self.chunk_remainder
 
             if rm > 0:
                 # Receive the remainder of a chunk.
-                to_write = s[:rm]
-                self.buf.append(to_write)
-                written = len(to_write)
-                s = s[written:]
+                end = pos + rm
 
-                self.chunk_remainder -= written
+                if end > size:
+                    end = size
+                body.append(data[pos:end])
+                self.chunk_remainder = rm - (end - pos)
+                pos = end
 
                 if self.chunk_remainder == 0:
                     self.validate_chunk_end = True
             elif self.validate_chunk_end:
-                s = self.chunk_end + s
+                chunk_end = self.chunk_end
 
-                pos = s.find(b"\r\n")
+                if not chunk_end and s.startswith(b"\r\n", pos):
+                    # Chop off the terminating CR LF from the chunk
+                    pos += 2
+                    self.validate_chunk_end = False
+                    continue
+                needed = 2 - len(chunk_end)
+                terminator = chunk_end + s[pos : pos + needed]
 
-                if pos < 0 and len(s) < 2:
-                    self.chunk_end = s
-                    s = b""
+                if len(terminator) < 2:
+                    self.chunk_end = terminator
+                    pos = size
                 else:
                     self.chunk_end = b""
 
-                    if pos == 0:
-                        # Chop off the terminating CR LF from the chunk
-                        s = s[2:]
+                    if terminator == b"\r\n":
+                        pos += needed
                     else:
                         self.error = BadRequest("Chunk not properly terminated")
                         self.all_chunks_received = True
 
+                        if chunk_end:
+                            # Parsed as the start of the trailer from here on
+                            self._hold(chunk_end)
+
                     # Always exit this loop
                     self.validate_chunk_end = False
             elif not self.all_chunks_received:
                 # Receive a control line.
-                s = self.control_line + s
-                pos = s.find(b"\r\n")
+                end = self._scan(s, b"\r\n", pos)
 
-                if pos < 0:
+                if end < 0:
                     # Control line not finished.
-                    self.control_line = s
-                    s = b""
+                    pos = size
                 else:
                     # Control line finished.
-                    line = s[:pos]
-                    s = s[pos + 2 :]
-                    self.control_line = b""
+                    if self.pending:
+                        line = self._take_pending(s[pos:end])[:-2]
+                    else:
+                        line = s[pos : end - 2]
+                    pos = end
 
                     if line:
                         # Begin a new chunk.
@@ -149,11 +230,14 @@ class ChunkedReceiver:
 
                             line = line[:semi]
 
-                        if not ONLY_HEXDIG_RE.match(line):
-                            self.error = BadRequest("Invalid chunk size")
-                            self.all_chunks_received = True
+                        # Only fall back to the regular expression if the
+                        # much cheaper strip() can't tell the size is valid.
+                        if not line or line.strip(HEXDIGITS):
+                            if not ONLY_HEXDIG_RE.match(line):
+                                self.error = BadRequest("Invalid chunk size")
+                                self.all_chunks_received = True
 
-                            break
+                                break
 
                         # Can not fail due to matching against the regular
                         # expression above
@@ -168,27 +252,32 @@ class ChunkedReceiver:
                     # else expect a control line.
             else:
                 # Receive the trailer.
-                trailer = self.trailer + s
+                needed = 2 - self.pending_len
 
-                if trailer.startswith(b"\r\n"):
+                if needed > 0 and self.pending_tail + s[pos : pos + needed] == b"\r\n":
                     # No trailer.
                     self.completed = True
+                    self._take_pending(b"")
+                    consumed = pos + needed
 
-                    return orig_size - (len(trailer) - 2)
-                pos = find_double_newline(trailer)
+                    break
+                end = self._scan(s, b"\r\n\r\n", pos)
 
-                if pos < 0:
+                if end < 0:
                     # Trailer not finished.
-                    self.trailer = trailer
-                    s = b""
+                    pos = size
                 else:
                     # Finished the trailer.
                     self.completed = True
-                    self.trailer = trailer[:pos]
+                    self.trailer = self._take_pending(s[pos:end])
+                    consumed = end
+
+                    break
 
-                    return orig_size - (len(trailer) - pos)
+        if body:
+            self.buf.append(b"".join(body))
 
-        return orig_size
+        return consumed
 
     def getfile(self):
         return self.buf.getfile()
@@ -215,10 +215,49 @@ Tuning options:
         and will resume once enough data is written to the socket to fall below
         this threshold. Default is 16777216 (16MB).
 
+    --response-buffer-size=INT
+        The number of bytes of pending output the app_iter may run ahead of
+        the client, buffered in temporary files, so that the thread is done
+        with a response before a slow client has read it. Default is 0, which
+        only applies '--outbuf-high-watermark'.
+
+    --[no-]file-wrapper-read-ahead
+        Read the file of a wsgi.file_wrapper response on a helper thread ahead
+        of sending it, instead of reading it from the main loop. Default is
+        False.
+
     --inbuf-overflow=INT
         A temporary file should be created if the pending input is larger
         than this. Default is 524288 (512KB).
 
+    --[no-]inbuf-spill-async
+        Write the temporary file of an overflowed request body from a
+        background thread instead of the main loop. Default is False.
+
+    --inbuf-spill-high-watermark=INT
+        Stop reading request bodies that are being written to disk while the
+        background thread has more than this many bytes waiting to be
+        written. Default is 4194304 (4MB).
+
+    --[no-]inbuf-mmap
+        Memory map request bodies that overflowed to a temporary file and
+        pass them to the application as a memory mapped wsgi.input. Default
+        is False.
+
+    --buffer-spill=STR
+        Where the temporary files of overflowed buffers are created: the path
+        of a directory (e.g. on a tmpfs), or 'memfd' for anonymous in-memory
+        files (Linux only). Default is the system's temporary directory.
+
+    --buffer-pool-size=INT
+        The number of truncated temporary files that are kept to be reused by
+        buffers that overflow later on. Default is 0 (disabled).
+
+    --buffer-memory-limit=INT
+        The number of bytes all buffers together may hold in memory before
+        they start overflowing to temporary files early. Default is 0 (no
+        limit).
+
     --connection-limit=INT
         Stop creating new channels if too many are already active.
         Default is 100.
@@ -232,6 +271,39 @@ Tuning options:
         Default is 120. 'Inactive' is defined as 'has received no data
         from the client and has sent no data to the client'.
 
+    --[no-]park-idle-channels
+        Replace the channels of connections that were inactive for a whole
+        cleanup interval with a small placeholder until the client sends the
+        next request. Default is False.
+
+    --keepalive-timeout=INT
+        Maximum number of seconds to leave a connection open between
+        requests. Default is 0, which only applies '--channel-timeout'.
+
+    --max-requests-per-connection=INT
+        Close connections once they have sent this many requests. Default is
+        0 (no limit).
+
+    --[no-]evict-idle-channels
+        Once the connection limit is reached, close the connection that has
+        been idle the longest to make room for a new one. Default is False.
+
+    --request-header-timeout=INT
+        Maximum number of seconds a client may take to send the headers of a
+        request. Default is 0, which only applies '--channel-timeout'.
+
+    --min-request-body-rate=INT
+        Minimum rate, in bytes per second, at which clients must send request
+        bodies. Default is 0 (no minimum).
+
+    --min-response-rate=INT
+        Minimum rate, in bytes per second, at which clients must read
+        responses. Default is 0 (no minimum).
+
+    --min-rate-period=INT
+        Number of seconds over which the minimum rates are measured. Default
+        is 5.
+
     --channel-request-lookahead=INT
         Sets the amount of requests we can continue to read from the socket,
         while we are processing current requests. The default value won't allow
@@ -255,6 +327,20 @@ Tuning options:
     --max-request-body-size=INT
         Maximum size of request body. Default is 1073741824 (1GB).
 
+    --[no-]stream-request-body
+        Start the application once the request headers have been received
+        and let it read the body from wsgi.input while it is still arriving.
+        Default is False.
+
+    --[no-]defer-continue
+        Only send "100 Continue" to a client expecting it once the
+        application starts reading the request body. Default is False.
+
+    --admission-hook=MODULE:NAME
+        A callable that is passed the method, path and headers of each
+        request before its body is received, and may return an error from
+        waitress.utilities to reject the request with.
+
     --[no-]expose-tracebacks
         Toggle whether to expose tracebacks of unhandled exceptions to the
         client. Off by default.
@@ -12,17 +12,19 @@
 #
 ##############################################################################
 
+from functools import partial
+from operator import attrgetter
 import os
 import os.path
 import socket
-import time
 
 from waitress import trigger
 from waitress.adjustments import Adjustments
+from waitress.buffers import buffer_pool, memory_budget
 from waitress.channel import HTTPChannel
 from waitress.compat import IPPROTO_IPV6, IPV6_V6ONLY
 from waitress.task import ThreadedTaskDispatcher
-from waitress.utilities import cleanup_unix_socket
+from waitress.utilities import cleanup_unix_socket, clock
 
 from . import wasyncore
 from .proxy_headers import proxy_headers_middleware
@@ -182,6 +184,10 @@ class BaseWSGIServer(wasyncore.dispatcher):
     socketmod = socket  # test shim
     asyncore = wasyncore  # test shim
     in_connection_overflow = False
+    next_eviction_scan = 0
+    evicted_channel = None  # closed from the trigger to make room
+    next_deadline_check = 0
+    environ_template = None  # WSGI environ keys shared by every channel
 
     def __init__(
         self,
@@ -225,6 +231,8 @@ class BaseWSGIServer(wasyncore.dispatcher):
         self.socktype = sockinfo[1]
         self.application = application
         self.adj = adj
+        buffer_pool.resize(adj.buffer_pool_size)
+        memory_budget.limit = adj.buffer_memory_limit
         self.trigger = trigger.trigger(map)
         if dispatcher is None:
             dispatcher = ThreadedTaskDispatcher()
@@ -245,6 +253,8 @@ class BaseWSGIServer(wasyncore.dispatcher):
         self.effective_host, self.effective_port = self.getsockname()
         self.server_name = adj.server_name
         self.active_channels = {}
+        # The number of connections closed by check_deadlines, by reason
+        self.timeouts = {"request_header": 0, "request_body": 0, "response": 0}
         if _start:
             self.accept_connections()
 
@@ -262,12 +272,24 @@ class BaseWSGIServer(wasyncore.dispatcher):
         self.task_dispatcher.add_task(task)
 
     def readable(self):
-        now = time.time()
+        now = clock.monotonic
         if now >= self.next_channel_cleanup:
             self.next_channel_cleanup = now + self.adj.cleanup_interval
             self.maintenance(now)
 
+        if now >= self.next_deadline_check:
+            self.next_deadline_check = now + 1
+            self.check_deadlines(now)
+
         if self.accepting:
+            if (
+                self.adj.evict_idle_channels
+                and now >= self.next_eviction_scan
+                and len(self._map) >= self.adj.connection_limit
+            ):
+                # handle_accept makes room for new connections
+                return True
+
             if (
                 not self.in_connection_overflow
                 and len(self._map) >= self.adj.connection_limit
@@ -299,6 +321,15 @@ class BaseWSGIServer(wasyncore.dispatcher):
         pass
 
     def handle_accept(self):
+        if self.adj.evict_idle_channels and len(self._map) >= self.adj.connection_limit:
+            if not self.evict_idle_channel():
+                # Every connection is busy, leave the new one waiting in the
+                # backlog and don't look again for a while
+                self.next_eviction_scan = clock.monotonic + 1
+            # Otherwise the new connection is accepted once the evicted
+            # channel is closed and there is room for it
+            return
+
         try:
             v = self.accept()
             if v is None:
@@ -341,14 +372,96 @@ class BaseWSGIServer(wasyncore.dispatcher):
 
     def maintenance(self, now):
         """
-        Closes channels that have not had any activity in a while.
+        Closes channels that have not had any activity in a while, and
+        compacts or parks the ones that are idle.
 
-        The timeout is configured through adj.channel_timeout (seconds).
+        The timeout is configured through adj.channel_timeout (seconds), and
+        adj.keepalive_timeout (seconds) for channels between requests.
         """
         cutoff = now - self.adj.channel_timeout
-        for channel in self.active_channels.values():
+        keepalive_timeout = self.adj.keepalive_timeout
+        keepalive_cutoff = now - keepalive_timeout
+        park_cutoff = now - self.adj.cleanup_interval
+        for channel in list(self.active_channels.values()):
             if (not channel.requests) and channel.last_activity < cutoff:
                 channel.will_close = True
+            elif (
+                keepalive_timeout
+                and channel.last_activity < keepalive_cutoff
+                and channel.idle
+            ):
+                channel.will_close = True
+            elif not channel.requests:
+                if (
+                    self.adj.park_idle_channels
+                    and channel.last_activity < park_cutoff
+                    and channel.park() is not None
+                ):
+                    continue
+                # Idle channels don't need to hold on to their locks
+                channel.compact()
+
+    def check_deadlines(self, now):
+        """
+        Closes channels whose client is too slow to send a request or to
+        read a response, see adj.request_header_timeout,
+        adj.min_request_body_rate and adj.min_response_rate, and counts them
+        in self.timeouts.
+        """
+        adj = self.adj
+        if not (
+            adj.request_header_timeout
+            or adj.min_request_body_rate
+            or adj.min_response_rate
+        ):
+            return
+
+        expired = []
+        for channel in list(self.active_channels.values()):
+            reason = channel.check_deadlines(now)
+            if reason is not None:
+                self.timeouts[reason] += 1
+                channel.will_close = True
+                expired.append(channel)
+
+        if expired:
+            # The socket of a client that doesn't read never becomes writable
+            # for will_close to be acted upon. Closing the channels right
+            # away would pull their sockets out from under the select() they
+            # are about to be passed to, so they are closed from the trigger.
+            self.trigger.pull_trigger(partial(self.close_channels, expired))
+
+    def close_channels(self, channels):
+        for channel in channels:
+            if channel.connected:
+                channel.handle_close()
+
+    def evict_idle_channel(self):
+        """
+        Closes the keep-alive channel that has been idle the longest, to make
+        room for a new connection. Returns False if every channel is busy.
+        Channels that have yet to receive their first request are left alone,
+        they belong to clients that just connected.
+
+        As in check_deadlines, the channel is closed from the trigger. Until
+        then no other channel is evicted.
+        """
+        evicted = self.evicted_channel
+        if evicted is not None and evicted.connected:
+            return True
+        self.evicted_channel = None
+
+        idle = [
+            channel
+            for channel in self.active_channels.values()
+            if channel.idle and channel.request_count
+        ]
+        if not idle:
+            return False
+        evicted = self.evicted_channel = min(idle, key=attrgetter("last_activity"))
+        evicted.will_close = True
+        self.trigger.pull_trigger(partial(self.close_channels, [evicted]))
+        return True
 
     def print_listen(self, format_str):  # pragma: no cover
         self.log_info(format_str.format(self.effective_host, self.effective_port))
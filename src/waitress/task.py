@@ -13,17 +13,16 @@
 ##############################################################################
 
 from collections import deque
+from itertools import chain
+from operator import itemgetter
+import re
 import sys
 import threading
 import time
 
-from .buffers import ReadOnlyFileBasedBuffer
-from .utilities import build_http_date, logger, queue_logger
-
-rename_headers = {  # or keep them without the HTTP_ prefix added
-    "CONTENT_LENGTH": "CONTENT_LENGTH",
-    "CONTENT_TYPE": "CONTENT_TYPE",
-}
+from .buffers import MmapReader, ReadOnlyFileBasedBuffer
+from .parser import header_names
+from .utilities import build_http_date, clock, logger, queue_logger
 
 hop_by_hop = frozenset(
     (
@@ -38,6 +37,28 @@ hop_by_hop = frozenset(
     )
 )
 
+CRLF_RE = re.compile(r"[\r\n]")
+
+# The capitalized form of the response header names seen so far, emptied once
+# it holds HEADER_NAMES_SIZE of them so an application making up header names
+# can't grow it.
+HEADER_NAMES_SIZE = 512
+header_names_capitalized = {}
+
+
+def capitalize_header_name(name):
+    """Return ``name`` with each of its dash separated words capitalized."""
+    capitalized = header_names_capitalized.get(name)
+
+    if capitalized is None:
+        capitalized = "-".join([x.capitalize() for x in name.split("-")])
+
+        if len(header_names_capitalized) >= HEADER_NAMES_SIZE:
+            header_names_capitalized.clear()
+        header_names_capitalized[name] = capitalized
+
+    return capitalized
+
 
 class ThreadedTaskDispatcher:
     """A Task Dispatcher that creates a thread for each task."""
@@ -191,17 +212,35 @@ class Task:
                 self.response_headers.append(("Connection", "close"))
         self.close_on_finish = True
 
+    def send_continue(self):
+        """
+        Ask the client for the body of a request whose 100 Continue was
+        deferred, once the application starts reading it.
+        """
+        self.request.continue_deferred = False
+
+        if not self.wrote_header:
+            self.channel.write_soon(b"HTTP/1.1 100 Continue\r\n\r\n")
+
     def build_response_header(self):
         version = self.version
         # Figure out whether the connection should be closed.
         connection = self.request.headers.get("CONNECTION", "").lower()
+
+        if self.request.continue_deferred and not self.request.completed:
+            # The client is still waiting to be asked for the body, which we
+            # will never do, so the connection can not be used any further.
+            self.set_close_on_finish()
+
+        if self.request.connection_close:
+            self.set_close_on_finish()
         response_headers = []
         content_length_header = None
         date_header = None
         server_header = None
 
         for headername, headerval in self.response_headers:
-            headername = "-".join([x.capitalize() for x in headername.split("-")])
+            headername = capitalize_header_name(headername)
 
             if headername == "Content-Length":
                 if self.has_body:
@@ -272,13 +311,10 @@ class Task:
 
         first_line = f"HTTP/{self.version} {self.status}"
         # NB: sorting headers needs to preserve same-named-header order
-        # as per RFC 2616 section 4.2; thus the key=lambda x: x[0] here;
+        # as per RFC 2616 section 4.2; thus the key=itemgetter(0) here;
         # rely on stable sort to keep relative position of same-named headers
-        next_lines = [
-            "%s: %s" % hv for hv in sorted(self.response_headers, key=lambda x: x[0])
-        ]
-        lines = [first_line] + next_lines
-        res = "%s\r\n\r\n" % "\r\n".join(lines)
+        next_lines = map(": ".join, sorted(self.response_headers, key=itemgetter(0)))
+        res = "\r\n".join([first_line, *next_lines, "\r\n"])
 
         return res.encode("latin-1")
 
@@ -293,7 +329,7 @@ class Task:
         self.response_headers = response_headers
 
     def start(self):
-        self.start_time = time.time()
+        self.start_time = clock.time
 
     def execute(self):
         raise NotImplementedError  # pragma: no cover
@@ -400,6 +436,13 @@ class WSGITask(Task):
 
             self.status = status
 
+            # Look for a CR or LF in all of the header names and values at once,
+            # they are only checked one by one below if there is one.
+            try:
+                unsafe = CRLF_RE.search("".join(chain.from_iterable(headers)))
+            except TypeError:
+                unsafe = True
+
             # Prepare the headers for output
             for k, v in headers:
                 if not isinstance(k, str):
@@ -411,14 +454,15 @@ class WSGITask(Task):
                         f"Header value {v!r} is not a string in {(k, v)!r}"
                     )
 
-                if "\n" in v or "\r" in v:
-                    raise ValueError(
-                        "carriage return/line feed character present in header value"
-                    )
-                if "\n" in k or "\r" in k:
-                    raise ValueError(
-                        "carriage return/line feed character present in header name"
-                    )
+                if unsafe:
+                    if "\n" in v or "\r" in v:
+                        raise ValueError(
+                            "carriage return/line feed character present in header value"
+                        )
+                    if "\n" in k or "\r" in k:
+                        raise ValueError(
+                            "carriage return/line feed character present in header name"
+                        )
 
                 kl = k.lower()
                 if kl == "content-length":
@@ -527,49 +571,76 @@ class WSGITask(Task):
                 if path.startswith(url_prefix_with_trailing_slash):
                     path = path[len(url_prefix) :]
 
-        environ = {
-            "REMOTE_ADDR": channel.addr[0],
+        environ = self.get_environ_template().copy()
+        environ["REQUEST_METHOD"] = request.command.upper()
+        environ["SERVER_PROTOCOL"] = "HTTP/%s" % self.version
+        environ["PATH_INFO"] = path
+        environ["REQUEST_URI"] = request.request_uri
+        environ["QUERY_STRING"] = request.query
+        environ["wsgi.url_scheme"] = request.url_scheme
+        # apps should use the logging module
+        environ["wsgi.errors"] = sys.stderr
+        environ["wsgi.input"] = request.get_body_stream()
+
+        # The environ keys of the headers all start with HTTP_ or CONTENT_, so
+        # they can't replace any of the keys above.
+        environ_keys = header_names.environ_keys
+        environ_key = header_names.environ_key
+
+        for key, value in request.headers.items():
+            environ[environ_keys.get(key) or environ_key(key)] = value
+
+        if request.continue_deferred:
+            environ["wsgi.input"].on_read = self.send_continue
+        elif isinstance(environ["wsgi.input"], MmapReader):
+            # Lets applications find out that they can use getbuffer()
+            environ["waitress.input_mmap"] = environ["wsgi.input"]
+
+        # cache the environ for this request
+        self.environ = environ
+        return environ
+
+    def get_environ_template(self):
+        """
+        Returns the part of the WSGI environment that is the same for every
+        request on the channel. It is built once for each server and channel.
+        """
+        channel = self.channel
+        template = channel.environ_template
+
+        if template is None:
+            server = channel.server
+            server_template = server.environ_template
+
+            if server_template is None:
+                server_template = server.environ_template = {
+                    "SERVER_PORT": str(server.effective_port),
+                    "SERVER_NAME": server.server_name,
+                    "SERVER_SOFTWARE": server.adj.ident,
+                    "SCRIPT_NAME": server.adj.url_prefix,
+                    # the following environment variables are required by the
+                    # WSGI spec
+                    "wsgi.version": (1, 0),
+                    "wsgi.multithread": True,
+                    "wsgi.multiprocess": False,
+                    "wsgi.run_once": False,
+                    "wsgi.file_wrapper": ReadOnlyFileBasedBuffer,
+                    "wsgi.input_terminated": True,  # wsgi.input is EOF terminated
+                }
+
+            template = server_template.copy()
+            template["REMOTE_ADDR"] = channel.addr[0]
             # Nah, we aren't actually going to look up the reverse DNS for
             # REMOTE_ADDR, but we will happily set this environment variable
             # for the WSGI application. Spec says we can just set this to
             # REMOTE_ADDR, so we do.
-            "REMOTE_HOST": channel.addr[0],
+            template["REMOTE_HOST"] = channel.addr[0]
             # try and set the REMOTE_PORT to something useful, but maybe None
-            "REMOTE_PORT": str(channel.addr[1]),
-            "REQUEST_METHOD": request.command.upper(),
-            "SERVER_PORT": str(server.effective_port),
-            "SERVER_NAME": server.server_name,
-            "SERVER_SOFTWARE": server.adj.ident,
-            "SERVER_PROTOCOL": "HTTP/%s" % self.version,
-            "SCRIPT_NAME": url_prefix,
-            "PATH_INFO": path,
-            "REQUEST_URI": request.request_uri,
-            "QUERY_STRING": request.query,
-            "wsgi.url_scheme": request.url_scheme,
-            # the following environment variables are required by the WSGI spec
-            "wsgi.version": (1, 0),
-            # apps should use the logging module
-            "wsgi.errors": sys.stderr,
-            "wsgi.multithread": True,
-            "wsgi.multiprocess": False,
-            "wsgi.run_once": False,
-            "wsgi.input": request.get_body_stream(),
-            "wsgi.file_wrapper": ReadOnlyFileBasedBuffer,
-            "wsgi.input_terminated": True,  # wsgi.input is EOF terminated
-        }
-
-        for key, value in dict(request.headers).items():
-            mykey = rename_headers.get(key, None)
-            if mykey is None:
-                mykey = "HTTP_" + key
-            if mykey not in environ:
-                environ[mykey] = value
-
-        # Insert a callable into the environment that allows the application to
-        # check if the client disconnected. Only works with
-        # channel_request_lookahead larger than 0.
-        environ["waitress.client_disconnected"] = self.channel.check_client_disconnected
-
-        # cache the environ for this request
-        self.environ = environ
-        return environ
+            template["REMOTE_PORT"] = str(channel.addr[1])
+            # Insert a callable into the environment that allows the
+            # application to check if the client disconnected. Only works with
+            # channel_request_lookahead larger than 0.
+            template["waitress.client_disconnected"] = channel.check_client_disconnected
+            channel.environ_template = template
+
+        return template
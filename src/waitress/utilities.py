@@ -16,6 +16,7 @@
 import calendar
 import errno
 import logging
+import math
 import os
 import re
 import stat
@@ -27,6 +28,30 @@ logger = logging.getLogger("waitress")
 queue_logger = logging.getLogger("waitress.queue")
 
 
+class Clock:
+    """
+    A coarse clock shared by the main loop and the task threads.
+
+    ``time`` is the wall clock time, for timestamps such as the ``Date``
+    header, and ``monotonic`` the monotonic time, for measuring timeouts.
+    Both are only read from the system when ``update`` is called, which the
+    main loop does every time select or poll returns, so reading them is as
+    cheap as reading any attribute, and everything done during one loop
+    iteration sees the same time. They may lag behind the system clock by as
+    much as the ``asyncore_loop_timeout`` when the main loop is idle.
+    """
+
+    def __init__(self):
+        self.update()
+
+    def update(self):
+        self.time = time.time()
+        self.monotonic = time.monotonic()
+
+
+clock = Clock()
+
+
 def find_double_newline(s):
     """Returns the position just after a double newline in the given string."""
     pos = s.find(b"\r\n\r\n")
@@ -186,10 +211,23 @@ monthname = [
 ]
 
 
+# The second and the HTTP date last built by build_http_date, as every
+# response sent during the same second has the same Date header.
+last_http_date = (None, "")
+
+
 def build_http_date(when):
-    year, month, day, hh, mm, ss, wd, y, z = time.gmtime(when)
+    global last_http_date
 
-    return "%s, %02d %3s %4d %02d:%02d:%02d GMT" % (
+    second = math.floor(when)
+    last_second, date = last_http_date
+
+    if second == last_second:
+        return date
+
+    year, month, day, hh, mm, ss, wd, y, z = time.gmtime(second)
+
+    date = "%s, %02d %3s %4d %02d:%02d:%02d GMT" % (
         weekdayname[wd],
         day,
         monthname[month],
@@ -198,6 +236,9 @@ def build_http_date(when):
         mm,
         ss,
     )
+    last_http_date = (second, date)
+
+    return date
 
 
 def parse_http_date(d):
@@ -280,6 +321,11 @@ class BadRequest(Error):
     reason = "Bad Request"
 
 
+class Unauthorized(BadRequest):
+    code = 401
+    reason = "Unauthorized"
+
+
 class RequestHeaderFieldsTooLarge(BadRequest):
     code = 431
     reason = "Request Header Fields Too Large"
@@ -290,6 +336,11 @@ class RequestEntityTooLarge(BadRequest):
     reason = "Request Entity Too Large"
 
 
+class TooManyRequests(BadRequest):
+    code = 429
+    reason = "Too Many Requests"
+
+
 class InternalServerError(Error):
     code = 500
     reason = "Internal Server Error"
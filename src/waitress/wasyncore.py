@@ -161,6 +161,7 @@ def poll(timeout=0.0, map=None):
                 e.append(fd)
         if [] == r == w == e:
             time.sleep(timeout)
+            utilities.clock.update()
             return
 
         try:
@@ -170,6 +171,8 @@ def poll(timeout=0.0, map=None):
                 raise
             else:
                 return
+        finally:
+            utilities.clock.update()
 
         for fd in r:
             obj = map.get(fd)
@@ -215,6 +218,8 @@ def poll2(timeout=0.0, map=None):
             if err.args[0] != EINTR:
                 raise
             r = []
+        finally:
+            utilities.clock.update()
 
         for fd, flags in r:
             obj = map.get(fd)
@@ -0,0 +1,85 @@
+"""
+Measure how fast ChunkedReceiver decodes chunked request bodies, in MB/s of
+decoded body data, for a range of chunk sizes.
+
+Run with ``python -m tests.benchmarks.bench_chunked [--size=MB]
+[--recv-bytes=N] [--buffer]``. The encoded body is fed to the receiver in
+``recv_bytes`` sized pieces, like the channel does. By default the decoded
+data is discarded, ``--buffer`` appends it to an OverflowableBuffer instead.
+"""
+
+import getopt
+import sys
+import time
+
+from waitress.adjustments import Adjustments
+from waitress.buffers import OverflowableBuffer
+from waitress.receiver import ChunkedReceiver
+
+CHUNK_SIZES = (1, 16, 64, 256, 1024, 4096, 65536)
+
+
+class NullBuffer:
+    def __init__(self):
+        self.size = 0
+
+    def append(self, s):
+        self.size += len(s)
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        pass
+
+
+def encode(size, chunk_size):
+    chunk = b"%x\r\n%s\r\n" % (chunk_size, b"x" * chunk_size)
+    count, rest = divmod(size, chunk_size)
+    body = chunk * count
+    if rest:
+        body += b"%x\r\n%s\r\n" % (rest, b"x" * rest)
+    return body + b"0\r\n\r\n"
+
+
+def decode(body, recv_bytes, make_buffer):
+    buf = make_buffer()
+    receiver = ChunkedReceiver(buf)
+    start = time.perf_counter()
+    for pos in range(0, len(body), recv_bytes):
+        receiver.received(body[pos : pos + recv_bytes])
+    elapsed = time.perf_counter() - start
+    assert receiver.completed and not receiver.error
+    size = len(buf)
+    buf.close()
+    return size, elapsed
+
+
+def main(argv=sys.argv):
+    opts, args = getopt.getopt(argv[1:], "", ["size=", "recv-bytes=", "buffer"])
+    size = 8
+    adj = Adjustments()
+    recv_bytes = adj.recv_bytes
+    make_buffer = NullBuffer
+    for opt, value in opts:
+        if opt == "--size":
+            size = int(value)
+        elif opt == "--recv-bytes":
+            recv_bytes = int(value)
+        elif opt == "--buffer":
+
+            def make_buffer():
+                return OverflowableBuffer(adj.inbuf_overflow)
+
+    size *= 1024 * 1024
+    print("%10s %12s %10s" % ("chunk size", "decoded MB", "MB/s"))
+    for chunk_size in CHUNK_SIZES:
+        # Keep the runs with tiny chunks reasonably short
+        body = encode(min(size, chunk_size * 131072), chunk_size)
+        decoded, elapsed = decode(body, recv_bytes, make_buffer)
+        mb = decoded / (1024 * 1024)
+        print("%10d %12.2f %10.2f" % (chunk_size, mb, mb / elapsed))
+
+
+if __name__ == "__main__":
+    main()
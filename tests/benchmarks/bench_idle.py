@@ -0,0 +1,65 @@
+"""
+Measure how much memory an idle keep-alive connection takes up, in bytes per
+HTTPChannel, after it has served one request, after the server's
+maintenance has compacted it and after it has been parked.
+
+Run with ``python -m tests.benchmarks.bench_idle [--count=N]``. ``count``
+channels are created on fake sockets, each serving one request, and the
+memory allocated for them is measured with tracemalloc.
+"""
+
+import gc
+import getopt
+import sys
+import tracemalloc
+
+from waitress.adjustments import Adjustments
+from waitress.channel import HTTPChannel
+
+from .bench_keepalive import REQUESTS, Server, Socket
+
+
+def allocated(snapshot, since):
+    return sum(stat.size_diff for stat in snapshot.compare_to(since, "filename"))
+
+
+def main(argv=sys.argv):
+    opts, args = getopt.getopt(argv[1:], "", ["count="])
+    count = 10000
+    for opt, value in opts:
+        if opt == "--count":
+            count = int(value)
+
+    adj = Adjustments()
+    server = Server(adj)
+    channels = []
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.take_snapshot()
+    for n in range(count):
+        sock = Socket()
+        channel = HTTPChannel(server, sock, ("127.0.0.1", n), adj, map={})
+        sock.data = REQUESTS["GET"]
+        channel.handle_read()
+        while server.tasks:
+            server.tasks.pop().service()
+        channel.handle_write()
+        channels.append(channel)
+    served = allocated(tracemalloc.take_snapshot(), start)
+    for channel in channels:
+        channel.compact()
+    gc.collect()
+    compacted = allocated(tracemalloc.take_snapshot(), start)
+    channels = [channel.park() for channel in channels]
+    gc.collect()
+    parked = allocated(tracemalloc.take_snapshot(), start)
+    tracemalloc.stop()
+
+    print("%10s %15s" % ("channel", "bytes/channel"))
+    print("%10s %15.0f" % ("served", served / count))
+    print("%10s %15.0f" % ("compacted", compacted / count))
+    print("%10s %15.0f" % ("parked", parked / count))
+
+
+if __name__ == "__main__":
+    main()
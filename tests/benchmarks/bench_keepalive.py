@@ -0,0 +1,118 @@
+"""
+Measure how long one HTTPChannel takes to receive, service and send the
+response of small requests on a keep-alive connection, in microseconds per
+request, and how often the garbage collector runs meanwhile.
+
+Run with ``python -m tests.benchmarks.bench_keepalive [--count=N]``. The
+requests are read from a fake socket and serviced on the calling thread, so
+only the work done by waitress and a trivial application is measured.
+"""
+
+import gc
+import getopt
+import sys
+import time
+
+from waitress.adjustments import Adjustments
+from waitress.channel import HTTPChannel
+
+REQUESTS = {
+    "GET": (
+        b"GET /ping HTTP/1.1\r\n"
+        b"Host: api.example.com\r\n"
+        b"User-Agent: bench\r\n"
+        b"Accept: */*\r\n"
+        b"\r\n"
+    ),
+    "POST": (
+        b"POST /api/v2/orders HTTP/1.1\r\n"
+        b"Host: api.example.com\r\n"
+        b"User-Agent: bench\r\n"
+        b"Content-Type: application/json\r\n"
+        b"Content-Length: 15\r\n"
+        b"\r\n"
+        b'{"order": 1234}'
+    ),
+}
+
+
+def app(environ, start_response):
+    environ["wsgi.input"].read()
+    start_response("200 OK", [("Content-Type", "text/plain"), ("Content-Length", "2")])
+    return [b"ok"]
+
+
+class Socket:
+    data = b""
+
+    def setblocking(self, flag):
+        pass
+
+    def fileno(self):
+        return 100
+
+    def getsockopt(self, level, option):
+        return 65536
+
+    def recv(self, buffer_size):
+        data, self.data = self.data, b""
+        return data
+
+    def send(self, data):
+        return len(data)
+
+
+class Server:
+    effective_port = 8080
+    server_name = "localhost"
+    environ_template = None
+    application = staticmethod(app)
+
+    def __init__(self, adj):
+        self.adj = adj
+        self.tasks = []
+        self.active_channels = {}
+
+    def add_task(self, task):
+        self.tasks.append(task)
+
+    def pull_trigger(self):
+        pass
+
+
+def serve(request, count, adj):
+    server = Server(adj)
+    sock = Socket()
+    channel = HTTPChannel(server, sock, ("127.0.0.1", 39830), adj, map={})
+    collections = gc.get_stats()[0]["collections"]
+    start = time.perf_counter()
+    for _ in range(count):
+        sock.data = request
+        channel.handle_read()
+        while server.tasks:
+            server.tasks.pop().service()
+        channel.handle_write()
+    elapsed = time.perf_counter() - start
+    assert channel.total_outbufs_len == 0
+    return elapsed, gc.get_stats()[0]["collections"] - collections
+
+
+def main(argv=sys.argv):
+    opts, args = getopt.getopt(argv[1:], "", ["count="])
+    count = 100000
+    for opt, value in opts:
+        if opt == "--count":
+            count = int(value)
+
+    adj = Adjustments()
+    print("%8s %12s %22s" % ("request", "us/request", "gc runs/10k requests"))
+    for name, request in REQUESTS.items():
+        elapsed, collections = serve(request, count, adj)
+        print(
+            "%8s %12.2f %22.2f"
+            % (name, elapsed / count * 1e6, collections / count * 10000)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Measure how long WSGITask takes to check the headers an application passes
+to start_response and to build the response header from them, in
+microseconds per response.
+
+Run with ``python -m tests.benchmarks.bench_response_headers [--count=N]``.
+Each response is produced ``count`` times by a new task for the same parsed
+request, the body written to the channel is discarded.
+"""
+
+import getopt
+import sys
+import time
+
+from waitress.adjustments import Adjustments
+from waitress.parser import HTTPRequestParser
+from waitress.task import WSGITask
+
+REQUEST = (
+    b"GET /static/css/site.css HTTP/1.1\r\n"
+    b"Host: www.example.com\r\n"
+    b"Accept: */*\r\n"
+    b"\r\n"
+)
+
+RESPONSES = {
+    "static file": [
+        ("Content-Type", "text/css; charset=utf-8"),
+        ("Content-Length", "5"),
+        ("Last-Modified", "Tue, 15 Oct 2024 08:12:31 GMT"),
+        ("ETag", '"5f3a-61e2c4a1b7d40"'),
+        ("Cache-Control", "public, max-age=3600"),
+        ("Accept-Ranges", "bytes"),
+    ],
+    "api": [
+        ("content-type", "application/json"),
+        ("content-length", "5"),
+        ("x-request-id", "0f8fad5b-d9cb-469f-a165-70867728950e"),
+    ],
+    "web page": [
+        ("Content-Type", "text/html; charset=UTF-8"),
+        ("Content-Length", "5"),
+        ("Cache-Control", "no-cache, no-store, must-revalidate"),
+        ("Content-Security-Policy", "default-src 'self'; img-src *"),
+        ("Strict-Transport-Security", "max-age=31536000; includeSubDomains"),
+        ("X-Content-Type-Options", "nosniff"),
+        ("X-Frame-Options", "DENY"),
+        ("Referrer-Policy", "strict-origin-when-cross-origin"),
+        ("Vary", "Accept-Encoding, Cookie"),
+        ("Set-Cookie", "session=8f14e45fceea167a5a36dedd4bea2543; HttpOnly"),
+        ("Set-Cookie", "csrftoken=0f8fad5bd9cb469fa16570867728950e; Secure"),
+        ("Set-Cookie", "theme=dark; Path=/"),
+    ],
+}
+
+
+class Server:
+    effective_port = 8080
+    server_name = "localhost"
+    environ_template = None
+
+    def __init__(self, adj, headers):
+        self.adj = adj
+        self.headers = headers
+
+    def application(self, environ, start_response):
+        start_response("200 OK", self.headers)
+        return [b"hello"]
+
+
+class Channel:
+    addr = ("127.0.0.1", 39830)
+    environ_template = None
+
+    def __init__(self, server):
+        self.server = server
+        self.adj = server.adj
+
+    def check_client_disconnected(self):
+        return False
+
+    def write_soon(self, data):
+        return len(data)
+
+
+def respond(request, channel, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        task = WSGITask(channel, request)
+        task.execute()
+    elapsed = time.perf_counter() - start
+    assert task.wrote_header
+    return elapsed
+
+
+def main(argv=sys.argv):
+    opts, args = getopt.getopt(argv[1:], "", ["count="])
+    count = 100000
+    for opt, value in opts:
+        if opt == "--count":
+            count = int(value)
+
+    adj = Adjustments()
+    request = HTTPRequestParser(adj)
+    request.received(REQUEST)
+    print("%15s %8s %13s" % ("response", "headers", "us/response"))
+    for name, headers in RESPONSES.items():
+        channel = Channel(Server(adj, headers))
+        elapsed = respond(request, channel, count)
+        print("%15s %8d %13.2f" % (name, len(headers), elapsed / count * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import os
 import socket
 import unittest
 import warnings
@@ -76,6 +77,28 @@ class Test_as_socket_list(unittest.TestCase):
             sock.close()
 
 
+class Test_ascallable(unittest.TestCase):
+    def _callFUT(self, value):
+        from waitress.adjustments import ascallable
+
+        return ascallable(value)
+
+    def test_none(self):
+        self.assertIsNone(self._callFUT(None))
+
+    def test_callable(self):
+        self.assertIs(self._callFUT(len), len)
+
+    def test_name(self):
+        from waitress.utilities import TooManyRequests
+
+        result = self._callFUT("waitress.utilities:TooManyRequests")
+        self.assertIs(result, TooManyRequests)
+
+    def test_bad_name(self):
+        self.assertRaises(AttributeError, self._callFUT, "waitress.utilities:nope")
+
+
 class TestAdjustments(unittest.TestCase):
     def _hasIPv6(self):  # pragma: nocover
         if not socket.has_ipv6:
@@ -106,6 +129,8 @@ class TestAdjustments(unittest.TestCase):
         return Adjustments(**kw)
 
     def test_goodvars(self):
+        from waitress.utilities import TooManyRequests
+
         inst = self._makeOne(
             host="localhost",
             port="8080",
@@ -120,12 +145,29 @@ class TestAdjustments(unittest.TestCase):
             send_bytes="300",
             outbuf_overflow="400",
             inbuf_overflow="500",
+            inbuf_spill_async="true",
+            inbuf_spill_high_watermark="550",
+            inbuf_mmap="true",
+            buffer_pool_size="3",
+            buffer_memory_limit="600",
             connection_limit="1000",
             cleanup_interval="1100",
             channel_timeout="1200",
+            park_idle_channels="true",
+            keepalive_timeout="15",
+            max_requests_per_connection="1000",
+            evict_idle_channels="true",
+            request_header_timeout="10",
+            min_request_body_rate="240",
+            min_response_rate="480",
+            min_rate_period="3",
+            response_buffer_size="104857600",
             log_socket_errors="true",
             max_request_header_size="1300",
             max_request_body_size="1400",
+            stream_request_body="true",
+            defer_continue="true",
+            admission_hook="waitress.utilities:TooManyRequests",
             expose_tracebacks="true",
             ident="abc",
             asyncore_loop_timeout="5",
@@ -149,12 +191,29 @@ class TestAdjustments(unittest.TestCase):
         self.assertEqual(inst.send_bytes, 300)
         self.assertEqual(inst.outbuf_overflow, 400)
         self.assertEqual(inst.inbuf_overflow, 500)
+        self.assertEqual(inst.inbuf_spill_async, True)
+        self.assertEqual(inst.inbuf_spill_high_watermark, 550)
+        self.assertEqual(inst.inbuf_mmap, True)
+        self.assertEqual(inst.buffer_pool_size, 3)
+        self.assertEqual(inst.buffer_memory_limit, 600)
         self.assertEqual(inst.connection_limit, 1000)
         self.assertEqual(inst.cleanup_interval, 1100)
         self.assertEqual(inst.channel_timeout, 1200)
+        self.assertEqual(inst.park_idle_channels, True)
+        self.assertEqual(inst.keepalive_timeout, 15)
+        self.assertEqual(inst.max_requests_per_connection, 1000)
+        self.assertEqual(inst.evict_idle_channels, True)
+        self.assertEqual(inst.request_header_timeout, 10)
+        self.assertEqual(inst.min_request_body_rate, 240)
+        self.assertEqual(inst.min_response_rate, 480)
+        self.assertEqual(inst.min_rate_period, 3)
+        self.assertEqual(inst.response_buffer_size, 104857600)
         self.assertTrue(inst.log_socket_errors)
         self.assertEqual(inst.max_request_header_size, 1300)
         self.assertEqual(inst.max_request_body_size, 1400)
+        self.assertEqual(inst.stream_request_body, True)
+        self.assertEqual(inst.defer_continue, True)
+        self.assertIs(inst.admission_hook, TooManyRequests)
         self.assertTrue(inst.expose_tracebacks)
         self.assertEqual(inst.asyncore_loop_timeout, 5)
         self.assertTrue(inst.asyncore_use_poll)
@@ -366,6 +425,23 @@ class TestAdjustments(unittest.TestCase):
     def test_badvar(self):
         self.assertRaises(ValueError, self._makeOne, nope=True)
 
+    def test_buffer_spill_directory(self):
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as d:
+            inst = self._makeOne(buffer_spill=d)
+            self.assertEqual(inst.buffer_spill, d)
+
+    def test_buffer_spill_missing_directory(self):
+        self.assertRaises(
+            ValueError, self._makeOne, buffer_spill="/this/does/not/exist"
+        )
+
+    @unittest.skipUnless(hasattr(os, "memfd_create"), "memfd_create not available")
+    def test_buffer_spill_memfd(self):
+        inst = self._makeOne(buffer_spill="memfd")
+        self.assertEqual(inst.buffer_spill, "memfd")
+
     def test_ipv4_disabled(self):
         self.assertRaises(
             ValueError, self._makeOne, ipv4=False, listen="127.0.0.1:8080"
@@ -1,4 +1,5 @@
 import io
+import os
 import unittest
 
 
@@ -97,6 +98,7 @@ class TestFileBasedBuffer(unittest.TestCase):
         inst.prune()
         self.assertIsNot(inst.file, f)
         self.assertEqual(nf.getvalue(), b"d")
+        self.assertEqual(inst.get(), b"d")
 
     def test_prune_remain_zero_tell_notzero(self):
         f = io.BytesIO(b"d")
@@ -144,6 +146,576 @@ class TestTempfileBasedBuffer(unittest.TestCase):
         self.assertTrue(hasattr(r, "fileno"))  # file
         r.close()
 
+    def test_ctor_from_buffer(self):
+        from waitress.buffers import BytesIOBasedBuffer
+
+        from_buffer = BytesIOBasedBuffer()
+        from_buffer.append(b"abcdef")
+        from_buffer.skip(2)
+        inst = self._makeOne(from_buffer)
+        from_buffer.close()
+        self.assertEqual(len(inst), 4)
+        self.assertEqual(inst.write_pos, 4)
+        self.assertEqual(inst.get(), b"cdef")
+
+    def test_append_and_get_do_not_seek(self):
+        inst = self._makeOne()
+        inst.append(b"abc")
+        inst.append(b"def")
+        self.assertEqual(inst.file.tell(), 0)
+        self.assertEqual(inst.get(2), b"ab")
+        self.assertEqual(inst.get(2, skip=True), b"ab")
+        self.assertEqual(inst.get(100), b"cdef")
+        self.assertEqual(inst.file.tell(), 0)
+        self.assertEqual(inst.read_pos, 2)
+        self.assertEqual(inst.write_pos, 6)
+        self.assertEqual(len(inst), 4)
+
+    def test_get_empty(self):
+        inst = self._makeOne()
+        self.assertEqual(inst.get(), b"")
+
+    def test_skip(self):
+        inst = self._makeOne()
+        inst.append(b"abc")
+        inst.skip(1)
+        self.assertEqual(inst.get(), b"bc")
+        self.assertRaises(ValueError, inst.skip, 3)
+
+    def test_skip_all_allow_prune_truncates(self):
+        inst = self._makeOne()
+        inst.append(b"abc")
+        inst.skip(3, True)
+        self.assertEqual(inst.read_pos, 0)
+        self.assertEqual(inst.write_pos, 0)
+        self.assertEqual(inst.file.seek(0, 2), 0)
+        inst.append(b"de")
+        self.assertEqual(inst.get(), b"de")
+
+    def test_prune_empty(self):
+        inst = self._makeOne()
+        inst.prune()
+        self.assertEqual(inst.write_pos, 0)
+
+    def test_prune_nothing_read(self):
+        inst = self._makeOne()
+        inst.append(b"abc")
+        f = inst.file
+        inst.prune()
+        self.assertIs(inst.file, f)
+        self.assertEqual(inst.get(), b"abc")
+
+    def test_prune_copies_unread_data(self):
+        inst = self._makeOne()
+        inst.append(b"abcdef")
+        inst.skip(2)
+        f = inst.file
+        inst.prune()
+        self.assertIsNot(inst.file, f)
+        self.assertTrue(f.closed)
+        self.assertEqual(inst.read_pos, 0)
+        self.assertEqual(inst.write_pos, 4)
+        self.assertEqual(inst.get(), b"cdef")
+
+    def test_getfile_positioned_at_read_pos(self):
+        inst = self._makeOne()
+        inst.append(b"x" * 10000)
+        inst.skip(9998)
+        f = inst.getfile()
+        self.assertEqual(f.read(), b"xx")
+        # rewrite the file underneath the file object's read buffer
+        inst.skip(2, True)
+        inst.append(b"abc")
+        self.assertEqual(inst.getfile().read(), b"abc")
+
+    def test_getmmap(self):
+        inst = self._makeOne()
+        inst.append(b"abcdef")
+        inst.skip(2)
+        reader = inst.getmmap()
+        self.assertIs(inst.getmmap(), reader)
+        self.assertEqual(reader.read(), b"cdef")
+        inst.close()
+        self.assertTrue(reader.closed)
+
+    def test_close_keeps_mapped_file_out_of_pool(self):
+        from waitress.buffers import BufferPool, TempfileBasedBuffer
+
+        pool = BufferPool(1)
+        self.addCleanup(pool.clear)
+        inst = TempfileBasedBuffer(pool=pool)
+        inst.append(b"abcdef")
+        view = inst.getmmap().getbuffer()[1:3]
+        inst.close()
+        self.assertEqual(pool.stats()["pooled"], 0)
+        self.assertEqual(view.tobytes(), b"bc")
+        view.release()
+
+    def test_pool(self):
+        from waitress.buffers import BufferPool, TempfileBasedBuffer
+
+        pool = BufferPool(1)
+        self.addCleanup(pool.clear)
+        inst = TempfileBasedBuffer(pool=pool)
+        inst.append(b"abcdef")
+        inst.skip(2)
+        inst.prune()  # the old file goes back to the pool
+        self.assertEqual(pool.stats()["pooled"], 1)
+        inst.close()  # the pool is full
+        self.assertTrue(inst.file.closed)
+        inst = TempfileBasedBuffer(pool=pool)
+        self.buffers_to_close.append(inst)
+        self.assertEqual(pool.stats()["hits"], 1)
+        self.assertEqual(inst.get(), b"")
+        inst.append(b"gh")
+        self.assertEqual(inst.get(), b"gh")
+
+
+class Test_spill_file(unittest.TestCase):
+    def _callFUT(self, spill=""):
+        from waitress.buffers import spill_file
+
+        f = spill_file(spill)
+        self.addCleanup(f.close)
+        return f
+
+    def test_default(self):
+        f = self._callFUT()
+        f.write(b"abc")
+        f.seek(0)
+        self.assertEqual(f.read(), b"abc")
+
+    def test_directory(self):
+        import tempfile
+
+        d = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, d)
+        f = self._callFUT(d)
+        self.assertTrue(hasattr(f, "fileno"))
+        self.assertEqual(os.listdir(d), [])
+
+    @unittest.skipUnless(hasattr(os, "memfd_create"), "memfd_create not available")
+    def test_memfd(self):
+        import mmap
+
+        f = self._callFUT("memfd")
+        f.write(b"abc")
+        f.flush()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            self.assertEqual(m[:], b"abc")
+
+
+class TestBufferPool(unittest.TestCase):
+    def _makeOne(self, size=2):
+        from waitress.buffers import BufferPool
+
+        pool = BufferPool(size)
+        self.addCleanup(pool.clear)
+        return pool
+
+    def test_acquire_miss(self):
+        inst = self._makeOne()
+        f = inst.acquire()
+        self.addCleanup(f.close)
+        self.assertTrue(hasattr(f, "fileno"))
+        self.assertEqual(
+            inst.stats(), {"hits": 0, "misses": 1, "hit_rate": 0.0, "pooled": 0}
+        )
+
+    def test_release_and_acquire_truncated(self):
+        inst = self._makeOne()
+        f = inst.acquire()
+        f.write(b"abc")
+        f.seek(1)
+        inst.release("", f)
+        self.assertTrue(f.closed)
+        self.assertEqual(inst.stats()["pooled"], 1)
+        f2 = inst.acquire()
+        self.addCleanup(f2.close)
+        self.assertEqual(f2.tell(), 0)
+        self.assertEqual(f2.read(), b"")
+        self.assertEqual(
+            inst.stats(), {"hits": 1, "misses": 1, "hit_rate": 0.5, "pooled": 0}
+        )
+
+    def test_acquire_other_spill_misses(self):
+        import tempfile
+
+        d = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, d)
+        inst = self._makeOne()
+        inst.release("", inst.acquire())
+        f = inst.acquire(d)
+        self.addCleanup(f.close)
+        self.assertEqual(inst.stats()["misses"], 2)
+        self.assertEqual(inst.stats()["pooled"], 1)
+
+    def test_release_full(self):
+        inst = self._makeOne(size=1)
+        f1 = inst.acquire()
+        f2 = inst.acquire()
+        inst.release("", f1)
+        inst.release("", f2)
+        self.assertTrue(f2.closed)
+        self.assertEqual(inst.stats()["pooled"], 1)
+
+    def test_release_disabled(self):
+        inst = self._makeOne(size=0)
+        f = inst.acquire()
+        inst.release("", f)
+        self.assertTrue(f.closed)
+        self.assertEqual(inst.stats()["pooled"], 0)
+
+    def test_release_closed(self):
+        inst = self._makeOne()
+        f = inst.acquire()
+        f.close()
+        inst.release("", f)
+        self.assertEqual(inst.stats()["pooled"], 0)
+
+    def test_release_without_fileno(self):
+        inst = self._makeOne()
+        f = DummyPooledFile()
+        inst.release("", f)
+        self.assertTrue(f.closed)
+        self.assertEqual(inst.stats()["pooled"], 0)
+
+    def test_release_not_truncatable(self):
+        inst = self._makeOne()
+        r, w = os.pipe()
+        os.close(w)
+        f = DummyPooledFile(open(r, "rb"))
+        inst.release("", f)
+        self.assertTrue(f.file.closed)
+        self.assertEqual(inst.stats()["pooled"], 0)
+
+    def test_release_pool_filled_meanwhile(self):
+        inst = self._makeOne(size=1)
+        f1 = inst.acquire()
+        f2 = inst.acquire()
+        f = DummyPooledFile(f2)
+        # another thread fills the pool while f is being closed
+        f.on_close = lambda: inst.release("", f1)
+        inst.release("", f)
+        self.assertTrue(f2.closed)
+        self.assertEqual(inst.stats()["pooled"], 1)
+
+    def test_resize(self):
+        inst = self._makeOne()
+        f1 = inst.acquire()
+        f2 = inst.acquire()
+        inst.release("", f1)
+        inst.release("", f2)
+        self.assertEqual(inst.stats()["pooled"], 2)
+        inst.resize(1)
+        self.assertEqual(inst.size, 1)
+        self.assertEqual(inst.stats()["pooled"], 1)
+        inst.clear()
+        self.assertEqual(inst.stats()["pooled"], 0)
+
+
+class TestMemoryBudget(unittest.TestCase):
+    def _makeOne(self, limit=0):
+        from waitress.buffers import MemoryBudget
+
+        return MemoryBudget(limit)
+
+    def test_add_no_limit(self):
+        inst = self._makeOne()
+        self.assertFalse(inst.add(100))
+        self.assertFalse(inst.exceeded)
+        self.assertFalse(inst.add(-40))
+        self.assertEqual(inst.stats(), {"used": 60, "peak": 100, "limit": 0})
+
+    def test_add_exceeded(self):
+        inst = self._makeOne(100)
+        self.assertFalse(inst.add(100))
+        self.assertFalse(inst.exceeded)
+        self.assertTrue(inst.add(1))
+        self.assertTrue(inst.exceeded)
+        self.assertFalse(inst.add(-1))
+
+
+class TestSpillWriter(unittest.TestCase):
+    def _makeOne(self):
+        from waitress.buffers import SpillWriter
+
+        return SpillWriter()
+
+    def test_submit_starts_thread_and_writes(self):
+        inst = self._makeOne()
+        buf = DummySpillBuffer()
+        inst.submit(buf, b"abc")
+        inst.submit(buf, b"def")
+        inst.wait(buf)
+        self.assertTrue(inst.thread.daemon)
+        self.assertEqual(buf.written, [b"abc", b"def"])
+        self.assertEqual(buf.pending_writes, 0)
+        self.assertEqual(inst.pending, 0)
+
+    def test_write_error_is_recorded(self):
+        inst = self._makeOne()
+        inst.logger = DummyLogger()
+        buf = DummySpillBuffer(toraise=OSError("disk full"))
+        inst.submit(buf, b"abc")
+        inst.wait(buf)
+        self.assertIsInstance(buf.write_error, OSError)
+        self.assertEqual(len(inst.logger.exceptions), 1)
+
+    def test_discard(self):
+        inst = self._makeOne()
+        inst.thread = True  # don't start the writer thread
+        buf = DummySpillBuffer()
+        other = DummySpillBuffer()
+        inst.submit(buf, b"abc")
+        inst.submit(other, b"de")
+        self.assertFalse(inst.discard(buf))
+        self.assertEqual(buf.pending_writes, 0)
+        self.assertEqual(other.pending_writes, 1)
+        self.assertEqual(inst.pending, 2)
+        self.assertEqual(list(inst.queue), [(other, b"de")])
+
+    def _waitForWriteInProgress(self, inst):
+        import time
+
+        deadline = time.monotonic() + 5
+        while not inst.writing and time.monotonic() < deadline:
+            time.sleep(0.001)  # until the writer thread has taken a write
+
+    def test_discard_write_in_progress(self):
+        import threading
+
+        inst = self._makeOne()
+        buf = DummySpillBuffer()
+        buf.block = threading.Event()
+        buf.closed = threading.Event()
+        inst.submit(buf, b"abc")
+        inst.submit(buf, b"de")
+        self._waitForWriteInProgress(inst)
+        # Doesn't wait for the disk, the writer thread closes the buffer
+        self.assertTrue(inst.discard(buf))
+        self.assertEqual(buf.pending_writes, 1)
+        self.assertFalse(buf.closed.is_set())
+        buf.block.set()
+        self.assertTrue(buf.closed.wait(5))
+        self.assertEqual(buf.written, [b"abc"])
+        self.assertEqual(buf.pending_writes, 0)
+        self.assertEqual(inst.closing, set())
+
+    def test_discard_write_in_progress_close_error(self):
+        import threading
+
+        inst = self._makeOne()
+        inst.logger = DummyLogger()
+        buf = DummySpillBuffer()
+        buf.block = threading.Event()
+        buf.closed = threading.Event()
+        buf.close_error = OSError("EIO")
+        drained = threading.Event()
+        inst.submit(buf, b"abc")
+        self._waitForWriteInProgress(inst)
+        self.assertTrue(inst.discard(buf))
+        inst.notify_when_drained(drained.set)
+        buf.block.set()
+        self.assertTrue(drained.wait(5))
+        self.assertTrue(buf.closed.is_set())
+        self.assertEqual(len(inst.logger.exceptions), 1)
+
+    def test_notify_when_drained_empty_queue(self):
+        inst = self._makeOne()
+        L = []
+        inst.notify_when_drained(lambda: L.append(True))
+        self.assertEqual(L, [True])
+        self.assertEqual(inst.waiters, set())
+
+    def test_notify_when_drained_after_writes(self):
+        import threading
+
+        inst = self._makeOne()
+        buf = DummySpillBuffer()
+        buf.block = threading.Event()
+        drained = threading.Event()
+        inst.submit(buf, b"abc")
+        inst.notify_when_drained(drained.set)
+        self.assertFalse(drained.is_set())
+        buf.block.set()
+        self.assertTrue(drained.wait(5))
+        self.assertEqual(inst.waiters, set())
+
+    def test_notify_when_drained_write_in_progress(self):
+        inst = self._makeOne()
+        drained = []
+        # The last write was taken off the queue, but isn't done yet
+        inst.writing = True
+        inst.notify_when_drained(lambda: drained.append(True))
+        self.assertEqual(drained, [])
+        self.assertEqual(len(inst.waiters), 1)
+
+
+class TestSpilledTempfileBasedBuffer(unittest.TestCase):
+    def _makeOne(self, from_buffer=None):
+        from waitress.buffers import SpilledTempfileBasedBuffer, SpillWriter
+
+        buf = SpilledTempfileBasedBuffer(SpillWriter(), from_buffer=from_buffer)
+        self.buffers_to_close.append(buf)
+        return buf
+
+    def setUp(self):
+        self.buffers_to_close = []
+
+    def tearDown(self):
+        for buf in self.buffers_to_close:
+            buf.close()
+
+    def test_ctor_from_buffer_None(self):
+        inst = self._makeOne()
+        self.assertEqual(len(inst), 0)
+        self.assertTrue(hasattr(inst.getfile(), "fileno"))
+
+    def test_getmmap_waits_for_writes(self):
+        inst = self._makeOne()
+        inst.append(b"abc")
+        inst.append(b"def")
+        self.assertEqual(inst.getmmap().read(), b"abcdef")
+
+    def test_ctor_from_buffer(self):
+        from waitress.buffers import BytesIOBasedBuffer
+
+        from_buffer = BytesIOBasedBuffer()
+        from_buffer.append(b"data")
+        inst = self._makeOne(from_buffer)
+        from_buffer.close()
+        self.assertEqual(len(inst), 4)
+        self.assertEqual(inst.get(), b"data")
+
+    def test_append_get_skip(self):
+        inst = self._makeOne()
+        inst.append(b"abc")
+        inst.append(b"def")
+        self.assertEqual(len(inst), 6)
+        self.assertEqual(inst.get(2, skip=True), b"ab")
+        inst.skip(1)
+        self.assertEqual(inst.get(), b"def")
+        inst.prune()
+        self.assertEqual(len(inst), 3)
+
+    def test_write_error_raised_on_append(self):
+        inst = self._makeOne()
+        inst.write_error = OSError("disk full")
+        self.assertRaises(OSError, inst.append, b"abc")
+
+    def test_write_error_raised_on_read(self):
+        inst = self._makeOne()
+        inst.getfile()
+        inst.write_error = OSError("disk full")
+        self.assertRaises(OSError, inst.get)
+
+    def test_close_discards_pending_writes(self):
+        inst = self._makeOne()
+        inst.append(b"abc")
+        inst.close()
+        self.assertEqual(inst.pending_writes, 0)
+        self.assertEqual(len(inst), 0)
+
+    def test_close_write_in_progress(self):
+        inst = self._makeOne()
+        inst.append(b"abc")
+        inst.getfile()  # the writes are done
+        file = inst.file
+        inst.writer.discard = lambda buf: True
+        inst.close()
+        self.assertEqual(len(inst), 0)
+        self.assertFalse(file.closed)
+        # The writer thread closes it once its write is done
+        del inst.writer.discard
+        inst.close()
+        self.assertTrue(file.closed)
+
+
+class TestMmapReader(unittest.TestCase):
+    def _makeOne(self, data=b"abc\ndef\nghi", start=0):
+        from waitress.buffers import TempfileBasedBuffer
+
+        buf = TempfileBasedBuffer()
+        self.addCleanup(buf.close)
+        buf.append(data)
+        buf.skip(start)
+        return buf.getmmap()
+
+    def test_read(self):
+        inst = self._makeOne()
+        self.assertEqual(len(inst), 11)
+        self.assertEqual(inst.read(2), b"ab")
+        self.assertEqual(inst.read(None), b"c\ndef\nghi")
+        self.assertEqual(inst.read(), b"")
+
+    def test_readable_seekable(self):
+        inst = self._makeOne()
+        self.assertTrue(inst.readable())
+        self.assertTrue(inst.seekable())
+
+    def test_read_after_start(self):
+        inst = self._makeOne(start=4)
+        self.assertEqual(len(inst), 7)
+        self.assertEqual(inst.tell(), 0)
+        self.assertEqual(inst.read(), b"def\nghi")
+
+    def test_readinto(self):
+        inst = self._makeOne()
+        b = bytearray(8)
+        self.assertEqual(inst.readinto(b), 8)
+        self.assertEqual(bytes(b), b"abc\ndef\n")
+        self.assertEqual(inst.readinto(b), 3)
+        self.assertEqual(bytes(b[:3]), b"ghi")
+        self.assertEqual(inst.readinto(b), 0)
+
+    def test_readline(self):
+        inst = self._makeOne()
+        self.assertEqual(inst.readline(), b"abc\n")
+        self.assertEqual(inst.readline(2), b"de")
+        self.assertEqual(inst.readline(), b"f\n")
+        self.assertEqual(inst.readline(), b"ghi")
+        self.assertEqual(inst.readline(), b"")
+
+    def test_readlines_and_iter(self):
+        inst = self._makeOne()
+        self.assertEqual(inst.readlines(1), [b"abc\n"])
+        self.assertEqual(list(inst), [b"def\n", b"ghi"])
+        inst.seek(0)
+        self.assertEqual(inst.readlines(), [b"abc\n", b"def\n", b"ghi"])
+
+    def test_seek_tell(self):
+        inst = self._makeOne(start=4)
+        self.assertEqual(inst.seek(2), 2)
+        self.assertEqual(inst.read(1), b"f")
+        self.assertEqual(inst.seek(1, os.SEEK_CUR), 4)
+        self.assertEqual(inst.read(), b"ghi")
+        self.assertEqual(inst.seek(-3, os.SEEK_END), 4)
+        self.assertEqual(inst.tell(), 4)
+        self.assertEqual(inst.seek(100), 7)
+        self.assertRaises(ValueError, inst.seek, -1)
+
+    def test_getbuffer(self):
+        inst = self._makeOne(start=4)
+        view = inst.getbuffer()
+        self.assertEqual(view.tobytes(), b"def\nghi")
+        self.assertEqual(bytes(view).index(b"\n"), 3)
+        self.assertTrue(inst.close())
+        self.assertRaises(ValueError, view.tobytes)
+
+    def test_close(self):
+        inst = self._makeOne()
+        self.assertTrue(inst.close())
+        self.assertTrue(inst.close())
+        self.assertRaises(ValueError, inst.read)
+
+    def test_close_with_views_left(self):
+        inst = self._makeOne()
+        part = inst.getbuffer()[4:7]
+        self.assertFalse(inst.close())
+        self.assertEqual(part.tobytes(), b"def")
+        part.release()
+
 
 class TestBytesIOBasedBuffer(unittest.TestCase):
     def _makeOne(self, from_buffer=None):
@@ -269,6 +841,286 @@ class TestReadOnlyFileBasedBuffer(unittest.TestCase):
         self.assertRaises(NotImplementedError, inst.append, "a")
 
 
+class Test_can_read_ahead(unittest.TestCase):
+    def _callFUT(self, filewrapper):
+        from waitress.buffers import can_read_ahead
+
+        return can_read_ahead(filewrapper)
+
+    def _makeWrapper(self, file):
+        from waitress.buffers import ReadOnlyFileBasedBuffer
+
+        return ReadOnlyFileBasedBuffer(file)
+
+    def test_real_file(self):
+        import tempfile
+
+        with tempfile.TemporaryFile() as f:
+            self.assertTrue(self._callFUT(self._makeWrapper(f)))
+
+    def test_no_fileno(self):
+        self.assertFalse(self._callFUT(self._makeWrapper(io.BytesIO(b"abc"))))
+
+    def test_not_seekable(self):
+        self.assertFalse(self._callFUT(self._makeWrapper(KindaFilelike(b"abc"))))
+
+
+class TestReadAheadWorker(unittest.TestCase):
+    def test_submit_fills_buffer(self):
+        import threading
+
+        from waitress.buffers import ReadAheadWorker
+
+        inst = ReadAheadWorker()
+        filled = threading.Event()
+
+        class DummyReadAhead:
+            def fill(self):
+                filled.set()
+
+        inst.submit(DummyReadAhead())
+        self.assertTrue(filled.wait(5))
+        self.assertTrue(inst.thread.daemon)
+
+
+class TestReadAheadFileBasedBuffer(unittest.TestCase):
+    def _makeOne(self, data=b"abcdefgh", block_size=3, start=0, size=None):
+        import tempfile
+
+        from waitress.buffers import ReadAheadFileBasedBuffer, ReadOnlyFileBasedBuffer
+
+        f = tempfile.TemporaryFile()
+        f.write(data)
+        f.seek(start)
+        self.addCleanup(f.close)
+        wrapper = ReadOnlyFileBasedBuffer(f)
+        wrapper.prepare(size)
+        self.worker = DummyReadAheadWorker()
+        self.wakeups = []
+        inst = ReadAheadFileBasedBuffer(
+            wrapper, lambda: self.wakeups.append(True), self.worker
+        )
+        inst.block_size = block_size
+        return inst
+
+    def test_ctor_schedules_read(self):
+        inst = self._makeOne()
+        self.assertEqual(len(inst), 8)
+        self.assertTrue(bool(inst))
+        self.assertEqual(self.worker.submitted, [inst])
+        self.assertTrue(inst.reading)
+        self.assertFalse(inst.ready)
+        self.assertEqual(inst.get(100), b"")
+
+    def test_fill_reads_ahead_depth_blocks(self):
+        inst = self._makeOne()
+        inst.fill()
+        self.assertFalse(inst.reading)
+        self.assertEqual([bytes(b) for b in inst.blocks], [b"abc", b"def"])
+        self.assertEqual(self.wakeups, [True])
+        self.assertTrue(inst.ready)
+
+    def test_get_and_skip(self):
+        inst = self._makeOne()
+        inst.fill()
+        self.assertEqual(bytes(inst.get(2)), b"ab")
+        inst.skip(2)
+        self.assertEqual(bytes(inst.get()), b"c")
+        self.assertEqual(bytes(inst.get(10, skip=True)), b"c")
+        self.assertEqual(len(inst), 5)
+        # consuming a block schedules the next read
+        self.assertEqual(self.worker.submitted, [inst, inst])
+        inst.fill()
+        self.assertEqual(bytes(inst.get(10, skip=True)), b"def")
+        inst.fill()
+        self.assertEqual(bytes(inst.get(10, skip=True)), b"gh")
+        self.assertEqual(len(inst), 0)
+        self.assertTrue(inst.ready)
+
+    def test_respects_start_and_size(self):
+        inst = self._makeOne(start=2, size=4, block_size=10)
+        inst.fill()
+        self.assertEqual(bytes(inst.get(10, skip=True)), b"cdef")
+        self.assertEqual(len(inst), 0)
+        self.assertEqual(inst.filewrapper.file.tell(), 2)
+
+    def test_skip_too_much(self):
+        inst = self._makeOne()
+        self.assertRaises(ValueError, inst.skip, 9)
+
+    def test_short_file(self):
+        inst = self._makeOne(block_size=10)
+        inst.unread = 100
+        inst.fill()
+        inst.fill()
+        self.assertRaises(ValueError, inst.get)
+        self.assertTrue(inst.ready)
+        self.assertEqual(len(self.wakeups), 2)
+
+    def test_close_not_reading(self):
+        inst = self._makeOne()
+        inst.fill()
+        inst.close()
+        self.assertTrue(inst.filewrapper.file.closed)
+        self.assertEqual(len(inst), 0)
+        self.assertFalse(inst.blocks)
+
+    def test_close_while_reading(self):
+        inst = self._makeOne()
+        inst.close()
+        self.assertFalse(inst.filewrapper.file.closed)
+        inst.fill()
+        self.assertTrue(inst.filewrapper.file.closed)
+
+
+class TestEmptyInput(unittest.TestCase):
+    def _makeOne(self):
+        from waitress.buffers import EmptyInput
+
+        return EmptyInput()
+
+    def test_read(self):
+        inst = self._makeOne()
+        self.assertEqual(len(inst), 0)
+        self.assertEqual(inst.read(), b"")
+        self.assertEqual(inst.read(10), b"")
+        self.assertEqual(inst.read1(10), b"")
+        self.assertEqual(inst.readline(), b"")
+        self.assertEqual(inst.readlines(), [])
+        self.assertEqual(list(inst), [])
+        self.assertEqual(inst.readinto(bytearray(10)), 0)
+        self.assertEqual(inst.getvalue(), b"")
+
+    def test_seek(self):
+        inst = self._makeOne()
+        self.assertTrue(inst.readable())
+        self.assertTrue(inst.seekable())
+        self.assertEqual(inst.seek(10), 0)
+        self.assertEqual(inst.tell(), 0)
+
+    def test_close_does_nothing(self):
+        inst = self._makeOne()
+        inst.close()
+        self.assertFalse(inst.closed)
+        self.assertEqual(inst.read(), b"")
+
+
+class TestStreamingBodyBuffer(unittest.TestCase):
+    def _makeOne(self, high_watermark=10):
+        from waitress.buffers import StreamingBodyBuffer
+
+        return StreamingBodyBuffer(high_watermark)
+
+    def test_getfile(self):
+        inst = self._makeOne()
+        self.assertIs(inst.getfile(), inst)
+
+    def test_read_all(self):
+        inst = self._makeOne()
+        inst.append(b"abc")
+        inst.append(memoryview(b"def"))
+        inst.finish()
+        self.assertEqual(len(inst), 6)
+        self.assertEqual(inst.read(), b"abcdef")
+        self.assertEqual(inst.read(), b"")
+
+    def test_read_size(self):
+        inst = self._makeOne()
+        inst.append(b"abc")
+        inst.append(b"def")
+        inst.finish()
+        self.assertEqual(inst.read(2), b"ab")
+        self.assertEqual(inst.read(3), b"cde")
+        self.assertEqual(inst.read(None), b"f")
+        self.assertEqual(inst.read(3), b"")
+
+    def test_read_waits_for_data(self):
+        import threading
+
+        inst = self._makeOne()
+        inst.append(b"abc")
+
+        def feed():
+            inst.append(b"def")
+            inst.finish()
+
+        thread = threading.Timer(0.01, feed)
+        thread.start()
+        self.assertEqual(inst.read(), b"abcdef")
+        thread.join()
+
+    def test_on_read(self):
+        calls = []
+        inst = self._makeOne()
+        inst.on_read = lambda: calls.append(1)
+        inst.append(b"abc")
+        inst.finish()
+        self.assertEqual(inst.read(1), b"a")
+        self.assertEqual(inst.readline(), b"bc")
+        self.assertEqual(calls, [1])
+        self.assertIsNone(inst.on_read)
+
+    def test_readline(self):
+        inst = self._makeOne()
+        inst.append(b"ab\ncd")
+        inst.append(b"ef\ngh")
+        inst.finish()
+        self.assertEqual(inst.readline(), b"ab\n")
+        self.assertEqual(inst.readline(None), b"cdef\n")
+        self.assertEqual(inst.readline(), b"gh")
+        self.assertEqual(inst.readline(), b"")
+
+    def test_readline_size(self):
+        inst = self._makeOne()
+        inst.append(b"ab")
+        inst.append(b"cd\n")
+        inst.finish()
+        self.assertEqual(inst.readline(3), b"abc")
+        self.assertEqual(inst.readline(3), b"d\n")
+
+    def test_readlines_and_iter(self):
+        inst = self._makeOne()
+        inst.append(b"a\nb\nc\n")
+        inst.finish()
+        self.assertEqual(inst.readlines(3), [b"a\n", b"b\n"])
+        self.assertEqual(list(inst), [b"c\n"])
+
+    def test_fail(self):
+        inst = self._makeOne()
+        inst.append(b"abc")
+        inst.fail(ValueError("bad body"))
+        self.assertEqual(inst.read(2), b"ab")
+        self.assertEqual(inst.read(1), b"c")
+        self.assertRaises(ValueError, inst.read)
+
+    def test_backlogged(self):
+        wakeups = []
+        inst = self._makeOne(4)
+        inst.append(b"abc")
+        self.assertFalse(inst.backlogged(lambda: wakeups.append(1)))
+        inst.append(b"def")
+        self.assertTrue(inst.backlogged(lambda: wakeups.append(1)))
+        self.assertEqual(inst.read(1), b"a")
+        self.assertEqual(wakeups, [])
+        self.assertEqual(inst.read(2), b"bc")
+        self.assertEqual(wakeups, [1])
+        self.assertEqual(inst.read(1), b"d")
+        self.assertEqual(wakeups, [1])
+
+    def test_close(self):
+        wakeups = []
+        inst = self._makeOne(1)
+        inst.append(b"abc")
+        self.assertTrue(inst.backlogged(lambda: wakeups.append(1)))
+        inst.close()
+        self.assertEqual(wakeups, [1])
+        self.assertFalse(inst.backlogged(lambda: wakeups.append(2)))
+        inst.append(b"def")
+        self.assertEqual(len(inst), 6)
+        self.assertEqual(inst.size, 0)
+        self.assertRaises(ValueError, inst.read)
+
+
 class TestOverflowableBuffer(unittest.TestCase):
     def _makeOne(self, overflow=10):
         from waitress.buffers import OverflowableBuffer
@@ -355,6 +1207,22 @@ class TestOverflowableBuffer(unittest.TestCase):
         inst.append(b"hello")
         self.assertEqual(inst.strbuf, b"xxxxxhello")
 
+    def test_append_buf_None_keeps_chunks(self):
+        inst = self._makeOne()
+        inst.append(b"ab")
+        inst.append(b"cd")
+        self.assertEqual(inst.chunks, [b"ab", b"cd"])
+        self.assertEqual(len(inst), 4)
+        self.assertEqual(inst.get(), b"abcd")
+        self.assertEqual(inst.chunks, [b"abcd"])
+
+    def test_append_buf_None_copies_mutable(self):
+        inst = self._makeOne()
+        data = bytearray(b"ab")
+        inst.append(data)
+        data[0:1] = b"x"
+        self.assertEqual(inst.get(), b"ab")
+
     def test_append_buf_None_longer_than_strbuf_limit(self):
         inst = self._makeOne(10000)
         inst.strbuf = b"x" * 8192
@@ -409,6 +1277,107 @@ class TestOverflowableBuffer(unittest.TestCase):
         self.assertEqual(inst.strbuf, b"")
         self.assertIsNone(inst.buf)
 
+    def test_append_overflow_spill(self):
+        import tempfile
+
+        d = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, d)
+        inst = self._makeOne(overflow=10)
+        inst.spill = d
+        inst.append(b"x" * 9000)
+        self.assertTrue(inst.overflowed)
+        self.assertEqual(inst.buf.spill, d)
+
+    def test_append_overflow_with_spill_writer(self):
+        from waitress.buffers import SpilledTempfileBasedBuffer, SpillWriter
+
+        inst = self._makeOne(overflow=10)
+        inst.spill_writer = SpillWriter()
+        self.assertFalse(inst.spilling)
+        inst.append(b"x" * 9000)
+        self.assertTrue(inst.overflowed)
+        self.assertIsInstance(inst.buf, SpilledTempfileBasedBuffer)
+        self.assertTrue(inst.spilling)
+        inst.append(b"y")
+        self.assertEqual(len(inst), 9001)
+        self.assertEqual(inst.get(), b"x" * 9000 + b"y")
+
+    def test_append_overflow_with_pool(self):
+        from waitress.buffers import BufferPool
+
+        pool = BufferPool(1)
+        self.addCleanup(pool.clear)
+        inst = self._makeOne(overflow=10)
+        inst.pool = pool
+        inst.append(b"x" * 9000)
+        self.assertIs(inst.buf.pool, pool)
+        inst.close()
+        self.assertEqual(pool.stats()["pooled"], 1)
+
+    def test_budget_accounting(self):
+        from waitress.buffers import MemoryBudget
+
+        budget = MemoryBudget()
+        inst = self._makeOne(overflow=20000)
+        inst.budget = budget
+        inst.append(b"x" * 10)
+        self.assertEqual(budget.used, 10)
+        inst.append(b"x" * 9000)
+        self.assertIsNotNone(inst.buf)
+        self.assertEqual(budget.used, 9010)
+        inst.skip(10)
+        # the data that was read is still in memory until pruned
+        self.assertEqual(budget.used, 9010)
+        inst.prune()
+        self.assertEqual(budget.used, 9000)
+        inst.append(b"x" * 11000)
+        self.assertTrue(inst.overflowed)
+        self.assertEqual(budget.used, 0)
+        inst.skip(19000)
+        inst.prune()
+        self.assertFalse(inst.overflowed)
+        self.assertEqual(budget.used, 1000)
+        inst.close()
+        self.assertEqual(budget.used, 0)
+        self.assertEqual(budget.peak, 9010)
+
+    def test_budget_accounting_strbuf(self):
+        from waitress.buffers import MemoryBudget
+
+        budget = MemoryBudget()
+        inst = self._makeOne()
+        inst.budget = budget
+        inst.append(b"abc")
+        inst.skip(3, True)
+        self.assertEqual(budget.used, 0)
+        inst.append(b"abc")
+        inst.prune()
+        self.assertEqual(budget.used, 0)
+
+    def test_budget_exceeded_overflows_early(self):
+        from waitress.buffers import MemoryBudget
+
+        budget = MemoryBudget(10000)
+        budget.add(5000)  # held by other buffers
+        inst = self._makeOne(overflow=20000)
+        inst.budget = budget
+        inst.append(b"x" * 4000)
+        self.assertEqual(budget.used, 9000)
+        inst.append(b"x" * 5000)
+        self.assertTrue(inst.overflowed)
+        self.assertEqual(budget.used, 5000)
+        # and stays overflowed while the budget is exceeded
+        budget.add(6000)
+        inst.skip(8000)
+        inst.prune()
+        self.assertTrue(inst.overflowed)
+        budget.add(-6000)
+        inst.prune()
+        self.assertFalse(inst.overflowed)
+        self.assertEqual(budget.used, 6000)
+        inst.close()
+        self.assertEqual(budget.used, 5000)
+
     def test_prune_buf_None(self):
         inst = self._makeOne()
         inst.prune()
@@ -466,6 +1435,21 @@ class TestOverflowableBuffer(unittest.TestCase):
         f = inst.getfile()
         self.assertTrue(hasattr(f, "read"))
 
+    def test_getmmap_in_memory(self):
+        inst = self._makeOne()
+        self.assertIsNone(inst.getmmap())
+        inst.append(b"abc")
+        self.assertIsNone(inst.getmmap())
+
+    def test_getmmap_overflowed(self):
+        inst = self._makeOne(overflow=10)
+        self.addCleanup(inst.close)
+        inst.append(b"x" * 9000)
+        inst.append(b"y")
+        self.assertTrue(inst.overflowed)
+        reader = inst.getmmap()
+        self.assertEqual(reader.read(), b"x" * 9000 + b"y")
+
     def test_getfile_buf_not_None(self):
         inst = self._makeOne()
         buf = io.BytesIO()
@@ -525,3 +1509,65 @@ class DummyBuffer:
 
     def close(self):
         pass
+
+
+class DummySpillBuffer:
+    pending_writes = 0
+    write_error = None
+    block = None
+
+    closed = None
+    close_error = None
+
+    def __init__(self, toraise=None):
+        self.toraise = toraise
+        self.written = []
+
+    def write(self, data):
+        if self.block is not None:
+            self.block.wait(5)
+        if self.toraise:
+            raise self.toraise
+        self.written.append(data)
+
+    def close(self):
+        self.closed.set()
+        if self.close_error is not None:
+            raise self.close_error
+
+
+class DummyLogger:
+    def __init__(self):
+        self.exceptions = []
+
+    def exception(self, msg):
+        self.exceptions.append(msg)
+
+
+class DummyReadAheadWorker:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, buf):
+        self.submitted.append(buf)
+
+
+class DummyPooledFile:
+    closed = False
+
+    def __init__(self, file=None):
+        self.file = file
+
+    def on_close(self):
+        pass
+
+    def fileno(self):
+        if self.file is None:
+            raise OSError
+        return self.file.fileno()
+
+    def close(self):
+        self.on_close()
+        if self.file is not None:
+            self.file.close()
+        self.closed = True
@@ -24,6 +24,101 @@ class TestHTTPChannel(unittest.TestCase):
         self.assertEqual(inst.sendbuf_len, 2048)
         self.assertEqual(map[100], inst)
 
+    def test_outbuf_lock_created_once(self):
+        import threading
+
+        inst, _, map = self._makeOneWithMap()
+        inst.outbuf_lock = None
+        lock = inst.outbuf_lock
+        self.assertIsInstance(lock, threading.Condition)
+        self.assertIs(inst.outbuf_lock, lock)
+
+    def test_compact_idle(self):
+        inst, _, map = self._makeOneWithMap()
+        inst.environ_template = {}
+        inst.compact()
+        self.assertIsNone(inst._outbuf_lock)
+        self.assertIsNone(inst.environ_template)
+        self.assertIsNotNone(inst.outbuf_lock)
+
+    def test_compact_request_in_flight(self):
+        inst, _, map = self._makeOneWithMap()
+        lock = inst.outbuf_lock
+        inst.requests = [DummyRequest()]
+        inst.compact()
+        self.assertIs(inst.outbuf_lock, lock)
+        inst.requests = []
+        inst.request = DummyRequest()
+        inst.compact()
+        self.assertIs(inst.outbuf_lock, lock)
+        inst.request = None
+        inst.total_outbufs_len = 1
+        inst.compact()
+        self.assertIs(inst.outbuf_lock, lock)
+
+    def test_idle(self):
+        inst, _, map = self._makeOneWithMap()
+        self.assertTrue(inst.idle)
+        inst.request = DummyRequest()
+        self.assertFalse(inst.idle)
+        inst.request = None
+        inst.total_outbufs_len = 1
+        self.assertFalse(inst.idle)
+        inst.total_outbufs_len = 0
+        inst.close_when_flushed = True
+        self.assertFalse(inst.idle)
+
+    def test_check_deadlines_request_header(self):
+        adj = DummyAdjustments()
+        adj.request_header_timeout = 10
+        inst, _, map = self._makeOneWithMap(adj)
+        inst.request = DummyParser()
+        inst.request.completed = False
+        self.assertIsNone(inst.check_deadlines(100))
+        self.assertIsNone(inst.check_deadlines(109))
+        self.assertEqual(inst.check_deadlines(110), "request_header")
+        # The deadline starts over for the next request
+        inst.request = DummyParser()
+        inst.request.completed = False
+        self.assertIsNone(inst.check_deadlines(111))
+        self.assertIsNone(inst.check_deadlines(120))
+        inst.will_close = True
+        self.assertIsNone(inst.check_deadlines(121))
+
+    def test_check_deadlines_request_body(self):
+        adj = DummyAdjustments()
+        adj.min_request_body_rate = 100
+        inst, _, map = self._makeOneWithMap(adj)
+        inst.request = DummyParser()
+        inst.request.completed = False
+        inst.request.headers_finished = True
+        self.assertIsNone(inst.check_deadlines(100))
+        inst.bytes_received += 1000
+        self.assertIsNone(inst.check_deadlines(104))
+        self.assertIsNone(inst.check_deadlines(105))
+        # Every period is measured on its own
+        inst.bytes_received += 400
+        self.assertEqual(inst.check_deadlines(110), "request_body")
+        # Not reading from the client, which doesn't count
+        inst.total_outbufs_len = 1
+        self.assertIsNone(inst.check_deadlines(112))
+        self.assertIsNone(inst.read_mark)
+
+    def test_check_deadlines_response(self):
+        adj = DummyAdjustments()
+        adj.min_response_rate = 100
+        inst, _, map = self._makeOneWithMap(adj)
+        inst.total_outbufs_len = 1
+        self.assertIsNone(inst.check_deadlines(100))
+        inst.bytes_sent += 500
+        self.assertIsNone(inst.check_deadlines(102))
+        self.assertIsNone(inst.check_deadlines(105))
+        inst.bytes_sent += 200
+        self.assertEqual(inst.check_deadlines(110), "response")
+        inst.total_outbufs_len = 0
+        self.assertIsNone(inst.check_deadlines(106))
+        self.assertIsNone(inst.send_mark)
+
     def test_total_outbufs_len_an_outbuf_size_gt_sys_maxint(self):
         from waitress.compat import MAXINT
 
@@ -55,6 +150,13 @@ class TestHTTPChannel(unittest.TestCase):
         inst, sock, map = self._makeOneWithMap()
         self.assertFalse(inst.writable())
 
+    def test_writable_outbuf_not_ready(self):
+        inst, sock, map = self._makeOneWithMap()
+        inst.outbufs = [DummyBuffer(b"abc")]
+        inst.outbufs[0].ready = False
+        inst.total_outbufs_len = 3
+        self.assertFalse(inst.writable())
+
     def test_writable_nothing_in_outbuf_will_close(self):
         inst, sock, map = self._makeOneWithMap()
         inst.will_close = True
@@ -176,6 +278,66 @@ class TestHTTPChannel(unittest.TestCase):
         inst.requests = [True]
         self.assertFalse(inst.readable())
 
+    def test_readable_spill_writer_backlogged(self):
+        from waitress.buffers import spill_writer
+
+        inst, sock, map = self._makeOneWithMap()
+        inst.adj.inbuf_spill_async = True
+        inst.request = DummyParser()
+        inst.request.spilling = True
+        self.addCleanup(spill_writer.waiters.clear)
+        spill_writer.pending = inst.adj.inbuf_spill_high_watermark + 1
+        spill_writer.queue.append(None)
+        try:
+            self.assertFalse(inst.readable())
+        finally:
+            spill_writer.pending = 0
+            spill_writer.queue.clear()
+        self.assertIn(inst.server.pull_trigger, spill_writer.waiters)
+
+    def test_readable_spill_writer_not_backlogged(self):
+        inst, sock, map = self._makeOneWithMap()
+        inst.adj.inbuf_spill_async = True
+        self.assertTrue(inst.readable())
+
+    def test_readable_spill_writer_backlogged_not_spilling(self):
+        from waitress.buffers import spill_writer
+
+        inst, sock, map = self._makeOneWithMap()
+        inst.adj.inbuf_spill_async = True
+        spill_writer.pending = inst.adj.inbuf_spill_high_watermark + 1
+        try:
+            # Neither an idle channel nor one receiving a body in memory
+            # waits for other channels' bodies to be written
+            self.assertTrue(inst.readable())
+            inst.request = DummyParser()
+            self.assertTrue(inst.readable())
+        finally:
+            spill_writer.pending = 0
+
+    def test_readable_dispatched_request(self):
+        from waitress.buffers import StreamingBodyBuffer
+
+        inst, sock, map = self._makeOneWithMap()
+        inst.server = DummyServer()
+        inst.request = DummyParser()
+        inst.request.completed = False
+        inst.request.dispatched = True
+        inst.request.body_stream = StreamingBodyBuffer(2)
+        inst.requests = [inst.request]
+        self.assertTrue(inst.readable())
+        inst.request.body_stream.append(b"abc")
+        self.assertFalse(inst.readable())
+        inst.request.body_stream.read(2)
+        self.assertTrue(inst.server.trigger_pulled)
+        self.assertTrue(inst.readable())
+
+    def test_readable_dispatched_request_completed(self):
+        inst, sock, map = self._makeOneWithMap()
+        inst.request = DummyParser()
+        inst.request.dispatched = True
+        self.assertFalse(inst.readable())
+
     def test_handle_read_no_error(self):
         inst, sock, map = self._makeOneWithMap()
         inst.will_close = False
@@ -186,6 +348,7 @@ class TestHTTPChannel(unittest.TestCase):
         result = inst.handle_read()
         self.assertIsNone(result)
         self.assertNotEqual(inst.last_activity, 0)
+        self.assertEqual(inst.bytes_received, 3)
         self.assertListEqual(L, [b"abc"])
 
     def test_handle_read_error(self):
@@ -243,6 +406,56 @@ class TestHTTPChannel(unittest.TestCase):
         self.assertEqual(outbufs[0], wrapper)
         self.assertEqual(outbufs[1].__class__.__name__, "OverflowableBuffer")
 
+    def test_write_soon_filewrapper_read_ahead(self):
+        import tempfile
+
+        from waitress.buffers import ReadAheadFileBasedBuffer, ReadOnlyFileBasedBuffer
+
+        f = tempfile.TemporaryFile()
+        f.write(b"abc")
+        f.seek(0)
+        wrapper = ReadOnlyFileBasedBuffer(f, 8192)
+        wrapper.prepare()
+        inst, sock, map = self._makeOneWithMap()
+        inst.adj.file_wrapper_read_ahead = True
+
+        def send(_):
+            return 0
+
+        sock.remote.send = send
+
+        outbufs = inst.outbufs
+        wrote = inst.write_soon(wrapper)
+        self.assertEqual(wrote, 3)
+        self.assertEqual(len(outbufs), 2)
+        self.assertIsInstance(outbufs[0], ReadAheadFileBasedBuffer)
+        self.assertIs(outbufs[0].filewrapper, wrapper)
+        outbufs[0].close()
+
+    def test_write_soon_filewrapper_read_ahead_no_fileno(self):
+        from waitress.buffers import ReadOnlyFileBasedBuffer
+
+        f = io.BytesIO(b"abc")
+        wrapper = ReadOnlyFileBasedBuffer(f, 8192)
+        wrapper.prepare()
+        inst, sock, map = self._makeOneWithMap()
+        inst.adj.file_wrapper_read_ahead = True
+
+        def send(_):
+            return 0
+
+        sock.remote.send = send
+
+        inst.write_soon(wrapper)
+        self.assertEqual(inst.outbufs[0], wrapper)
+
+    def test_new_outbuf(self):
+        inst, sock, map = self._makeOneWithMap()
+        inst.adj.buffer_spill = "/spill"
+        outbuf = inst.new_outbuf()
+        self.assertEqual(outbuf.overflow, inst.adj.outbuf_overflow)
+        self.assertEqual(outbuf.spill, "/spill")
+
     def test_write_soon_disconnected(self):
         from waitress.channel import ClientDisconnected
 
@@ -302,6 +515,37 @@ class TestHTTPChannel(unittest.TestCase):
         self.assertEqual(inst.outbufs[0].get(), b"xyz")
         self.assertTrue(inst.outbuf_lock.waited)
 
+    def test_write_soon_response_buffer_size(self):
+        inst, sock, map = self._makeOneWithMap()
+
+        # _flush_some will no longer flush
+        def send(_):
+            return 0
+
+        sock.remote.send = send
+
+        inst.adj.outbuf_high_watermark = 3
+        inst.adj.response_buffer_size = 10
+        inst.outbufs[0].append(b"abcd")
+        inst.total_outbufs_len = 4
+        inst.current_outbuf_count = 4
+        wrote = inst.write_soon(b"xyz")
+        self.assertEqual(wrote, 3)
+        self.assertFalse(getattr(inst.outbuf_lock, "waited", False))
+        # Outbufs still rotate at the high watermark
+        self.assertEqual(len(inst.outbufs), 2)
+        self.assertEqual(inst.total_outbufs_len, 7)
+
+        class Lock(DummyLock):
+            def wait(self):
+                inst.total_outbufs_len = 0
+                super().wait()
+
+        inst.total_outbufs_len = 11
+        inst.outbuf_lock = Lock()
+        inst.write_soon(b"xyz")
+        self.assertTrue(inst.outbuf_lock.waited)
+
     def test_write_soon_attempts_flush_high_water_and_exception(self):
         from waitress.channel import ClientDisconnected
 
@@ -395,6 +639,7 @@ class TestHTTPChannel(unittest.TestCase):
         inst.total_outbufs_len = sum(len(x) for x in inst.outbufs)
         result = inst._flush_some()
         self.assertTrue(result)
+        self.assertEqual(inst.bytes_sent, 3)
 
     def test__flush_some_full_outbuf_socket_returns_zero(self):
         inst, sock, map = self._makeOneWithMap()
@@ -463,6 +708,28 @@ class TestHTTPChannel(unittest.TestCase):
         self.assertFalse(inst.connected)
         self.assertTrue(sock.closed)
 
+    def test_handle_close_incomplete_request(self):
+        inst, sock, map = self._makeOneWithMap()
+        request = DummyRequest()
+        inst.request = request
+        inst.handle_close()
+        self.assertIsNone(inst.request)
+        self.assertTrue(request.closed)
+
+    def test_handle_close_dispatched_request(self):
+        from waitress.buffers import StreamingBodyBuffer
+        from waitress.channel import ClientDisconnected
+
+        inst, sock, map = self._makeOneWithMap()
+        request = DummyRequest()
+        request.dispatched = True
+        request.body_stream = StreamingBodyBuffer(10)
+        inst.request = request
+        inst.handle_close()
+        self.assertIsNone(inst.request)
+        self.assertTrue(request.closed)
+        self.assertRaises(ClientDisconnected, request.body_stream.read)
+
     def test_handle_close_outbuf_raises_on_close(self):
         inst, sock, map = self._makeOneWithMap()
 
@@ -513,6 +780,131 @@ class TestHTTPChannel(unittest.TestCase):
         self.assertListEqual(inst.requests, [])
         self.assertListEqual(inst.server.tasks, [])
 
+    def test_received_preq_streaming_headers_finished(self):
+        inst, sock, map = self._makeOneWithMap()
+        inst.server = DummyServer()
+        preq = DummyParser()
+        inst.request = preq
+        preq.completed = False
+        preq.streaming = True
+        preq.headers_finished = True
+        inst.received(b"GET / HTTP/1.1\r\n\r\n")
+        self.assertTrue(preq.dispatched)
+        self.assertIs(inst.request, preq)
+        self.assertEqual(inst.requests, [preq])
+        self.assertEqual(inst.server.tasks, [inst])
+
+        # once the body is complete the request is not queued again
+        preq.completed = True
+        inst.received(b"abc")
+        self.assertIsNone(inst.request)
+        self.assertEqual(inst.requests, [preq])
+        self.assertEqual(inst.server.tasks, [inst])
+
+    def test_received_preq_dispatched_error(self):
+        inst, sock, map = self._makeOneWithMap()
+        inst.server = DummyServer()
+        preq = DummyParser()
+        inst.request = preq
+        inst.requests = [preq]
+        preq.dispatched = True
+        preq.error = True
+        preq.retval = 1
+        inst.received(b"abc")
+        self.assertEqual(preq.data, b"abc")
+        self.assertIs(inst.request, preq)
+        self.assertFalse(inst.close_when_flushed)
+        self.assertEqual(inst.server.tasks, [])
+
+    def test_received_preq_dispatched_error_after_service(self):
+        inst, sock, map = self._makeOneWithMap()
+        inst.server = DummyServer()
+        preq = DummyParser()
+        inst.request = preq
+        preq.dispatched = True
+        preq.error = True
+        preq.retval = 1
+        # The application returned before the invalid part of the body
+        # arrived, nothing else is going to close the connection
+        inst.received(b"abc")
+        self.assertIsNone(inst.request)
+        self.assertTrue(inst.close_when_flushed)
+        self.assertTrue(inst.writable())
+        self.assertEqual(inst.server.tasks, [])
+
+    def test_received_admission_hook_admits(self):
+        calls = []
+        inst, sock, map = self._makeOneWithMap()
+        inst.server = DummyServer()
+        inst.adj.admission_hook = lambda *args: calls.append(args)
+        preq = DummyParser()
+        preq.headers = {"CONTENT_LENGTH": "3"}
+        preq.completed = False
+        preq.headers_finished = True
+        preq.expect_continue = True
+        preq.retval = 1
+        inst.request = preq
+        inst.received(b"a")
+        self.assertEqual(calls, [])
+
+        preq.headers_finished = False
+        preq.received = lambda data: setattr(preq, "headers_finished", True) or 1
+        inst.received(b"a")
+        self.assertEqual(calls, [("POST", "/", {"CONTENT_LENGTH": "3"})])
+        self.assertIsNone(preq.error)
+        self.assertTrue(inst.sent_continue)
+
+    def test_received_admission_hook_rejects(self):
+        from waitress.utilities import TooManyRequests
+
+        inst, sock, map = self._makeOneWithMap()
+        inst.server = DummyServer()
+        error = TooManyRequests("slow down")
+        inst.adj.admission_hook = lambda *args: error
+        preq = DummyParser()
+        preq.headers = {}
+        preq.expect_continue = True
+        preq.completed = False
+        preq.received = lambda data: setattr(preq, "headers_finished", True) or 5
+        inst.request = preq
+        inst.received(b"head|body")
+        self.assertIs(preq.error, error)
+        self.assertTrue(preq.completed)
+        self.assertFalse(inst.sent_continue)
+        self.assertIsNone(inst.request)
+        self.assertEqual(inst.requests, [preq])
+        self.assertEqual(inst.server.tasks, [inst])
+
+    def test_received_admission_hook_raises(self):
+        from waitress.utilities import InternalServerError
+
+        def hook(*args):
+            raise ValueError
+
+        inst, sock, map = self._makeOneWithMap()
+        inst.server = DummyServer()
+        inst.logger = DummyLogger()
+        inst.adj.admission_hook = hook
+        preq = DummyParser()
+        preq.headers = {}
+        preq.completed = False
+        preq.received = lambda data: setattr(preq, "headers_finished", True) or 1
+        inst.request = preq
+        inst.received(b"a")
+        self.assertIsInstance(preq.error, InternalServerError)
+        self.assertEqual(len(inst.logger.exceptions), 1)
+        self.assertEqual(inst.requests, [preq])
+
+    def test_admit_skips_failed_request(self):
+        inst, sock, map = self._makeOneWithMap()
+        inst.adj.admission_hook = None  # never called
+        preq = DummyParser()
+        preq.error = True
+        self.assertFalse(inst.admit(preq))
+        preq.error = None
+        preq.empty = True
+        self.assertFalse(inst.admit(preq))
+
     def test_received_preq_completed_empty(self):
         inst, sock, map = self._makeOneWithMap()
         inst.server = DummyServer()
@@ -548,6 +940,21 @@ class TestHTTPChannel(unittest.TestCase):
         self.assertIsNone(inst.request)
         self.assertListEqual(inst.server.tasks, [])
 
+    def test_received_max_requests_per_connection(self):
+        adj = DummyAdjustments()
+        adj.max_requests_per_connection = 2
+        inst, sock, map = self._makeOneWithMap(adj)
+        inst.received(b"GET /1 HTTP/1.1\r\n\r\n")
+        self.assertEqual(inst.request_count, 1)
+        self.assertFalse(inst.requests[0].connection_close)
+        inst.requests = []
+        inst.received(b"GET /2 HTTP/1.1\r\n\r\nGET /3 HTTP/1.1\r\n\r\n")
+        self.assertEqual(inst.request_count, 2)
+        self.assertEqual(len(inst.requests), 1)
+        self.assertEqual(inst.requests[0].path, "/2")
+        self.assertTrue(inst.requests[0].connection_close)
+        self.assertIsNone(inst.request)
+
     def test_received_headers_finished_expect_continue_false(self):
         inst, sock, map = self._makeOneWithMap()
         inst.server = DummyServer()
@@ -579,6 +986,22 @@ class TestHTTPChannel(unittest.TestCase):
         self.assertTrue(inst.sent_continue)
         self.assertFalse(preq.completed)
 
+    def test_received_headers_finished_expect_continue_deferred(self):
+        inst, sock, map = self._makeOneWithMap()
+        inst.server = DummyServer()
+        preq = DummyParser()
+        inst.request = preq
+        preq.expect_continue = True
+        preq.continue_deferred = True
+        preq.streaming = True
+        preq.headers_finished = True
+        preq.completed = False
+        inst.received(b"GET / HTTP/1.1\r\n\r\n")
+        self.assertEqual(inst.requests, [preq])
+        self.assertEqual(inst.server.tasks, [inst])
+        self.assertEqual(sock.sent, b"")
+        self.assertFalse(inst.sent_continue)
+
     def test_received_headers_finished_expect_continue_true_sent_true(self):
         inst, sock, map = self._makeOneWithMap()
         inst.server = DummyServer()
@@ -606,6 +1029,24 @@ class TestHTTPChannel(unittest.TestCase):
         self.assertTrue(request.serviced)
         self.assertTrue(request.closed)
 
+    def test_service_keeps_outbuf_of_bytes(self):
+        inst, sock, map = self._makeOneWithMap()
+        inst.task_class = DummyTaskClass()
+        inst.requests = [DummyRequest()]
+        inst.outbufs[-1].append(b"response")
+        inst.current_outbuf_count = 8
+        inst.service()
+        self.assertEqual(inst.current_outbuf_count, 8)
+
+    def test_service_rotates_outbuf_of_file(self):
+        inst, sock, map = self._makeOneWithMap()
+        inst.task_class = DummyTaskClass()
+        inst.requests = [DummyRequest()]
+        inst.outbufs[-1].append(b"x" * 10000)
+        inst.current_outbuf_count = 10000
+        inst.service()
+        self.assertEqual(inst.current_outbuf_count, inst.adj.outbuf_high_watermark)
+
     def test_service_with_one_error_request(self):
         inst, sock, map = self._makeOneWithMap()
         request = DummyRequest()
@@ -729,6 +1170,69 @@ class TestHTTPChannel(unittest.TestCase):
         self.assertFalse(inst.error_task_class.serviced)
         self.assertTrue(request.closed)
 
+    def test_service_with_request_raises_body_error(self):
+        from waitress.parser import RequestBodyError
+
+        inst, sock, map = self._makeOneWithMap()
+        inst.server = DummyServer()
+        request = DummyRequest()
+        inst.requests = [request]
+        inst.task_class = DummyTaskClass(RequestBodyError)
+        inst.task_class.wrote_header = False
+        inst.error_task_class = DummyTaskClass()
+        inst.logger = DummyLogger()
+        inst.service()
+        self.assertTrue(inst.error_task_class.serviced)
+        self.assertIs(inst.error_task_class.request, request)
+        self.assertListEqual(inst.requests, [])
+        self.assertTrue(inst.close_when_flushed)
+        self.assertEqual(len(inst.logger.exceptions), 0)
+        self.assertTrue(request.closed)
+
+    def test_service_with_request_raises_body_error_client_disconnected(self):
+        from waitress.channel import ClientDisconnected
+        from waitress.parser import RequestBodyError
+
+        inst, sock, map = self._makeOneWithMap()
+        inst.server = DummyServer()
+        request = DummyRequest()
+        inst.requests = [request]
+        inst.task_class = DummyTaskClass(RequestBodyError)
+        inst.task_class.wrote_header = False
+        inst.error_task_class = DummyTaskClass(ClientDisconnected)
+        inst.service()
+        self.assertTrue(inst.error_task_class.serviced)
+        self.assertListEqual(inst.requests, [])
+        self.assertTrue(inst.close_when_flushed)
+        self.assertTrue(request.closed)
+
+    def test_service_with_request_raises_body_error_wrote_header(self):
+        from waitress.parser import RequestBodyError
+
+        inst, sock, map = self._makeOneWithMap()
+        inst.server = DummyServer()
+        request = DummyRequest()
+        inst.requests = [request]
+        inst.task_class = DummyTaskClass(RequestBodyError)
+        inst.error_task_class = DummyTaskClass()
+        inst.service()
+        self.assertFalse(inst.error_task_class.serviced)
+        self.assertTrue(inst.close_when_flushed)
+        self.assertTrue(request.closed)
+
+    def test_service_streamed_request_failed_later(self):
+        inst, sock, map = self._makeOneWithMap()
+        inst.server = DummyServer()
+        request = DummyParser()
+        request.close = lambda: None
+        inst.request = request
+        inst.requests = [request]
+        inst.task_class = DummyTaskClass()
+        inst.service()
+        self.assertIsNone(inst.request)
+        self.assertListEqual(inst.requests, [])
+        self.assertTrue(inst.close_when_flushed)
+
     def test_service_with_request_error_raises_disconnect(self):
         from waitress.channel import ClientDisconnected
 
@@ -769,6 +1273,126 @@ class TestHTTPChannel(unittest.TestCase):
         self.assertListEqual(inst.requests, [])
 
 
+class TestParkedChannel(unittest.TestCase):
+    def _makeChannel(self):
+        from waitress.channel import HTTPChannel
+
+        server = DummyServer()
+        server.channel_class = HTTPChannel
+        sock = DummySock()
+        map = {}
+        channel = HTTPChannel(server, sock, ("127.0.0.1", 1), DummyAdjustments(), map)
+        channel.outbuf_lock = DummyLock()
+        return channel, sock, map
+
+    def test_park_idle(self):
+        from waitress.channel import ParkedChannel
+
+        channel, sock, map = self._makeChannel()
+        outbuf = channel.outbufs[0]
+        outbuf.append(b"x")
+        outbuf.skip(1, True)
+        channel.last_activity = 5
+        parked = channel.park()
+        self.assertIsInstance(parked, ParkedChannel)
+        self.assertIs(map[100], parked)
+        self.assertIs(channel.server.active_channels[100], parked)
+        self.assertEqual(channel.outbufs, [])
+        self.assertIs(parked.socket, sock)
+        self.assertEqual(parked.addr, ("127.0.0.1", 1))
+        self.assertEqual(parked.last_activity, 5)
+        self.assertEqual(parked.requests, ())
+        self.assertTrue(parked.idle)
+        self.assertTrue(parked.readable())
+        self.assertFalse(parked.writable())
+        self.assertIsNone(parked.park())
+        self.assertIsNone(parked.check_deadlines(0))
+        parked.compact()
+
+    def test_park_busy(self):
+        channel, sock, map = self._makeChannel()
+        channel.requests = [DummyRequest()]
+        self.assertIsNone(channel.park())
+        channel.requests = []
+        channel.request = DummyRequest()
+        self.assertIsNone(channel.park())
+        channel.request = None
+        channel.total_outbufs_len = 1
+        self.assertIsNone(channel.park())
+        channel.total_outbufs_len = 0
+        channel.will_close = True
+        self.assertIsNone(channel.park())
+        self.assertIs(map[100], channel)
+
+    def test_unpark_on_read(self):
+        from waitress.channel import HTTPChannel
+
+        channel, sock, map = self._makeChannel()
+        channel.request_count = 3
+        parked = channel.park()
+        sock.local_sent = b"GET / HTTP/1.1\r\n\r\n"
+        parked.handle_read_event()
+        new = map[100]
+        self.assertIsInstance(new, HTTPChannel)
+        self.assertIsNot(new, channel)
+        self.assertIs(parked.channel, new)
+        self.assertIs(channel.server.active_channels[100], new)
+        self.assertIs(new.socket, sock)
+        self.assertEqual(new.addr, ("127.0.0.1", 1))
+        self.assertEqual(len(channel.server.tasks), 1)
+        self.assertEqual(new.request_count, 4)
+        self.assertIs(parked.unpark(), new)
+
+    def test_unpark_on_expt(self):
+        channel, sock, map = self._makeChannel()
+        parked = channel.park()
+        # DummySock reports a socket error
+        parked.handle_expt_event()
+        self.assertIsNotNone(parked.channel)
+        self.assertFalse(parked.channel.connected)
+        self.assertTrue(sock.closed)
+        self.assertEqual(map, {})
+
+    def test_handle_close(self):
+        channel, sock, map = self._makeChannel()
+        parked = channel.park()
+        parked.will_close = True
+        self.assertTrue(parked.connected)
+        self.assertFalse(parked.idle)
+        self.assertTrue(parked.writable())
+        parked.handle_write_event()
+        self.assertFalse(parked.connected)
+        self.assertTrue(sock.closed)
+        self.assertEqual(map, {})
+        self.assertEqual(channel.server.active_channels, {})
+
+    def test_handle_close_unparked(self):
+        channel, sock, map = self._makeChannel()
+        parked = channel.park()
+        new = parked.unpark()
+        self.assertTrue(parked.connected)
+        parked.close()
+        self.assertFalse(parked.connected)
+        self.assertTrue(sock.closed)
+        self.assertFalse(new.connected)
+        self.assertEqual(map, {})
+
+    def test_handle_error(self):
+        from waitress import channel as module
+
+        channel, sock, map = self._makeChannel()
+        parked = channel.park()
+        logger = DummyLogger()
+        orig, module.logger = module.logger, logger
+        try:
+            parked.handle_error()
+        finally:
+            module.logger = orig
+        self.assertEqual(len(logger.exceptions), 1)
+        self.assertTrue(sock.closed)
+        self.assertEqual(map, {})
+
+
 class TestHTTPChannelLookahead(TestHTTPChannel):
     def app_check_disconnect(self, environ, start_response):
         """
@@ -900,6 +1524,41 @@ class TestHTTPChannelLookahead(TestHTTPChannel):
         self.assertEqual(data.split("\r\n")[-1], "finished")
         self.assertEqual(self.request_body, b"x")
 
+    def test_lookahead_streaming_continue(self):
+        """
+        Like test_lookahead_continue, but the second request is queued as soon
+        as its headers are in because its body is streamed.
+        """
+        self._make_app_with_lookahead()
+        self.channel.adj.stream_request_body = True
+        self._send(
+            "POST / HTTP/1.1",
+            "Host: localhost:8080",
+            "Content-Length: 1",
+            "",
+            "x",
+            "POST / HTTP/1.1",
+            "Host: localhost:8080",
+            "Content-Length: 1",
+            "Expect: 100-continue",
+            "",
+        )
+        self.channel.handle_read()
+        self.assertEqual(len(self.channel.requests), 2)
+        self.channel.server.tasks[0].service()
+        data = self.sock.recv(256).decode("ascii")
+        self.assertTrue(data.endswith("HTTP/1.1 100 Continue\r\n\r\n"))
+        self.assertEqual(len(self.channel.server.tasks), 2)
+
+        self.sock.send(b"x")
+        self.channel.handle_read()
+        self.assertIsNone(self.channel.request)
+        self.channel.server.tasks[1].service()
+        self.channel._flush_some()
+        data = self.sock.recv(256).decode("ascii")
+        self.assertEqual(data.split("\r\n")[-1], "finished")
+        self.assertEqual(self.request_body, b"x")
+
     def test_lookahead_bad_request_drop_extra_data(self):
         """
         Send two requests, the first one being bad, split on the recv_bytes
@@ -1070,7 +1729,13 @@ class DummyBuffer:
 class DummyAdjustments:
     outbuf_overflow = 1048576
     outbuf_high_watermark = 1048576
+    response_buffer_size = 0
     inbuf_overflow = 512000
+    inbuf_spill_async = False
+    inbuf_spill_high_watermark = 4194304
+    inbuf_mmap = False
+    buffer_spill = ""
+    file_wrapper_read_ahead = False
     cleanup_interval = 900
     url_scheme = "http"
     channel_timeout = 300
@@ -1083,6 +1748,14 @@ class DummyAdjustments:
     url_prefix = ""
     channel_request_lookahead = 0
     max_request_body_size = 1048576
+    stream_request_body = False
+    defer_continue = False
+    admission_hook = None
+    max_requests_per_connection = 0
+    request_header_timeout = 0
+    min_request_body_rate = 0
+    min_response_rate = 0
+    min_rate_period = 5
 
 
 class DummyServer:
@@ -1090,6 +1763,7 @@ class DummyServer:
     adj = DummyAdjustments()
     effective_port = 8080
     server_name = ""
+    environ_template = None
 
     def __init__(self):
         self.tasks = []
@@ -1112,6 +1786,13 @@ class DummyParser:
     retval = None
     error = None
     connection_close = False
+    streaming = False
+    spilling = False
+    dispatched = False
+    continue_deferred = False
+    body_stream = None
+    command = "POST"
+    path = "/"
 
     def received(self, data):
         self.data = data
@@ -1119,16 +1800,24 @@ class DummyParser:
             return self.retval
         return len(data)
 
+    def get_body_stream(self):
+        return self.body_stream
+
 
 class DummyRequest:
     error = None
     path = "/"
     version = "1.0"
     closed = False
+    dispatched = False
+    body_stream = None
 
     def __init__(self):
         self.headers = {}
 
+    def get_body_stream(self):
+        return self.body_stream
+
     def close(self):
         self.closed = True
 
@@ -604,6 +604,22 @@ class ExpectContinueTests:
             self.assertEqual(length, len(response_body))
             self.assertEqual(response_body, data)
 
+    def test_expect_continue_bad_transfer_encoding(self):
+        # the request is rejected without asking for the body first
+        to_send = (
+            b"POST / HTTP/1.1\r\n"
+            b"Transfer-Encoding: gzip\r\n"
+            b"Expect: 100-continue\r\n"
+            b"\r\n"
+        )
+        self.connect()
+        self.sock.send(to_send)
+        with self.sock.makefile("rb", 0) as fp:
+            line = fp.readline()  # no continue status line
+            version, status, reason = (x.strip() for x in line.split(None, 2))
+            self.assertEqual(int(status), 501)
+            self.assertEqual(reason, b"Not Implemented")
+
 
 class BadContentLengthTests:
     def setUp(self):
@@ -21,6 +21,7 @@ from waitress.parser import (
     ParsingError,
     TransferEncodingNotImplemented,
     crack_first_line,
+    get_header_fields,
     get_header_lines,
     split_uri,
     unquote_bytes_to_wsgi,
@@ -43,6 +44,11 @@ class TestHTTPRequestParser(unittest.TestCase):
         result = self.parser.get_body_stream()
         self.assertEqual(result.getvalue(), b"")
 
+    def test_get_body_stream_None_shared(self):
+        from waitress.buffers import empty_input
+
+        self.assertIs(self.parser.get_body_stream(), empty_input)
+
     def test_get_body_stream_nonNone(self):
         body_rcv = DummyBodyStream()
         self.parser.body_rcv = body_rcv
@@ -103,6 +109,18 @@ class TestHTTPRequestParser(unittest.TestCase):
         self.assertTrue(self.parser.completed)
         self.assertIsInstance(self.parser.error, ServerNotImplemented)
 
+    def test_received_bad_transfer_encoding_expect_continue(self):
+        data = (
+            b"POST /foobar HTTP/1.1\r\n"
+            b"Transfer-Encoding: gzip\r\n"
+            b"Expect: 100-continue\r\n"
+            b"\r\n"
+        )
+        self.parser.received(data)
+        self.assertTrue(self.parser.completed)
+        self.assertIsInstance(self.parser.error, ServerNotImplemented)
+        self.assertFalse(self.parser.expect_continue)
+
     def test_received_nonsense_nothing(self):
         data = b"\r\n\r\n"
         result = self.parser.received(data)
@@ -141,6 +159,26 @@ class TestHTTPRequestParser(unittest.TestCase):
         self.assertTrue(self.parser.completed)
         self.assertFalse(self.parser.error)
 
+    def test_received_headers_terminator_split(self):
+        data = b"GET /foobar HTTP/1.1\r\nX-Foo: 1\r\n\r\nbody"
+        for split in range(len(data) - 7, len(data) - 4):
+            parser = HTTPRequestParser(Adjustments())
+            self.assertEqual(parser.received(data[:split]), split)
+            self.assertFalse(parser.headers_finished)
+            self.assertEqual(parser.header_plus, data[:split])
+            self.assertEqual(parser.received(data[split:]), len(data) - 4 - split)
+            self.assertTrue(parser.completed)
+            self.assertEqual(parser.headers, {"X_FOO": "1"})
+            self.assertEqual(parser.header_bytes_received, len(data) - 4)
+
+    def test_received_headers_byte_by_byte(self):
+        data = b"GET /foobar HTTP/1.1\r\nX-Foo: 1\r\nX-Bar: 2\r\n\r\n"
+        for i in range(len(data)):
+            self.assertEqual(self.parser.received(data[i : i + 1]), 1)
+        self.assertTrue(self.parser.completed)
+        self.assertEqual(self.parser.headers, {"X_FOO": "1", "X_BAR": "2"})
+        self.assertEqual(self.parser.header_plus, b"")
+
     def test_received_headers_too_large(self):
         self.parser.adj.max_request_header_size = 2
         data = b"GET /foobar HTTP/8.4\r\nX-Foo: 1\r\n\r\n"
@@ -201,6 +239,112 @@ class TestHTTPRequestParser(unittest.TestCase):
         self.assertIsNone(self.parser.error)
         self.assertEqual(self.parser.headers["CONTENT_LENGTH"], "29")
 
+    def test_received_streaming_content_length(self):
+        from waitress.buffers import StreamingBodyBuffer
+
+        self.parser.adj.stream_request_body = True
+        data = b"POST /foobar HTTP/1.1\r\nContent-Length: 6\r\n\r\nabc"
+        result = self.parser.received(data)
+        self.assertEqual(result, len(data) - 3)
+        self.assertTrue(self.parser.headers_finished)
+        self.assertTrue(self.parser.streaming)
+        self.assertFalse(self.parser.completed)
+        body = self.parser.get_body_stream()
+        self.assertIsInstance(body, StreamingBodyBuffer)
+        self.parser.received(b"abc")
+        self.parser.received(b"def")
+        self.assertTrue(self.parser.completed)
+        self.assertEqual(self.parser.headers["CONTENT_LENGTH"], "6")
+        self.assertEqual(body.read(), b"abcdef")
+
+    def test_received_streaming_chunked(self):
+        self.parser.adj.stream_request_body = True
+        data = (
+            b"POST /foobar HTTP/1.1\r\n"
+            b"Transfer-Encoding: chunked\r\n"
+            b"\r\n"
+            b"1d\r\n"
+            b"This string has 29 characters\r\n"
+            b"0\r\n\r\n"
+        )
+        result = self.parser.received(data)
+        self.parser.received(data[result:])
+        self.assertTrue(self.parser.completed)
+        self.assertIsNone(self.parser.error)
+        self.assertNotIn("CONTENT_LENGTH", self.parser.headers)
+        body = self.parser.get_body_stream()
+        self.assertEqual(body.read(), b"This string has 29 characters")
+
+    def test_received_streaming_body_too_large(self):
+        from waitress.parser import RequestBodyError
+
+        self.parser.adj.stream_request_body = True
+        self.parser.adj.max_request_body_size = 2
+        data = (
+            b"POST /foobar HTTP/1.1\r\n"
+            b"Transfer-Encoding: chunked\r\n"
+            b"\r\n"
+            b"1d\r\n"
+            b"This string has 29 characters\r\n"
+            b"0\r\n\r\n"
+        )
+        result = self.parser.received(data)
+        self.parser.received(data[result:])
+        self.assertTrue(self.parser.completed)
+        self.assertIsInstance(self.parser.error, RequestEntityTooLarge)
+        body = self.parser.get_body_stream()
+        self.assertEqual(body.read(29), b"This string has 29 characters")
+        self.assertRaises(RequestBodyError, body.read)
+
+    def test_received_defer_continue(self):
+        from waitress.buffers import StreamingBodyBuffer
+
+        self.parser.adj.defer_continue = True
+        data = (
+            b"POST /foobar HTTP/1.1\r\n"
+            b"Transfer-Encoding: chunked\r\n"
+            b"Expect: 100-continue\r\n"
+            b"\r\n"
+        )
+        self.parser.received(data)
+        self.assertTrue(self.parser.expect_continue)
+        self.assertTrue(self.parser.continue_deferred)
+        self.assertTrue(self.parser.streaming)
+        body = self.parser.get_body_stream()
+        self.assertIsInstance(body, StreamingBodyBuffer)
+
+    def test_received_defer_continue_not_expected(self):
+        self.parser.adj.defer_continue = True
+        data = b"POST /foobar HTTP/1.1\r\nContent-Length: 3\r\n\r\n"
+        self.parser.received(data)
+        self.assertFalse(self.parser.continue_deferred)
+        self.assertFalse(self.parser.streaming)
+
+    def test_get_body_stream_mmap(self):
+        from waitress.buffers import MmapReader
+
+        self.parser.adj.inbuf_mmap = True
+        self.parser.adj.inbuf_overflow = 10
+        data = b"POST /foobar HTTP/1.1\r\nContent-Length: 10000\r\n\r\n"
+        self.parser.received(data)
+        self.parser.received(b"x" * 10000)
+        self.addCleanup(self.parser.close)
+        self.assertTrue(self.parser.completed)
+        body = self.parser.get_body_stream()
+        self.assertIsInstance(body, MmapReader)
+        self.assertEqual(body.read(), b"x" * 10000)
+
+    def test_get_body_stream_mmap_in_memory(self):
+        from waitress.buffers import MmapReader
+
+        self.parser.adj.inbuf_mmap = True
+        data = b"POST /foobar HTTP/1.1\r\nContent-Length: 3\r\n\r\nabc"
+        result = self.parser.received(data)
+        self.parser.received(data[result:])
+        body = self.parser.get_body_stream()
+        self.assertNotIsInstance(body, MmapReader)
+        self.assertEqual(body.read(), b"abc")
+
     def test_parse_header_gardenpath(self):
         data = b"GET /foobar HTTP/8.4\r\nfoo: bar\r\n"
         self.parser.parse_header(data)
@@ -270,6 +414,23 @@ class TestHTTPRequestParser(unittest.TestCase):
         self.assertEqual(self.parser.body_rcv.__class__.__name__, "ChunkedReceiver")
         self.assertEqual(self.parser.connection_close, True)
 
+    def test_parse_header_body_buffer_spill_async(self):
+        from waitress.buffers import spill_writer
+
+        self.parser.adj.inbuf_spill_async = True
+        data = b"GET /foobar HTTP/1.1\r\ncontent-length: 10\r\n"
+        self.parser.parse_header(data)
+        self.assertIs(self.parser.body_rcv.getbuf().spill_writer, spill_writer)
+        self.assertFalse(self.parser.spilling)
+        self.parser.body_rcv.getbuf()._set_large_buffer()
+        self.assertTrue(self.parser.spilling)
+        self.parser.close()
+
+    def test_parse_header_body_buffer_spill_sync(self):
+        data = b"GET /foobar HTTP/1.1\r\ncontent-length: 10\r\n"
+        self.parser.parse_header(data)
+        self.assertIsNone(self.parser.body_rcv.getbuf().spill_writer)
+
     def test_parse_header_transfer_encoding_invalid(self):
         data = b"GET /foobar HTTP/1.1\r\ntransfer-encoding: gzip\r\n"
 
@@ -586,6 +747,10 @@ class Test_get_header_lines(unittest.TestCase):
         result = self._callFUT(b"slim\r\n slam")
         self.assertListEqual(result, [b"slim slam"])
 
+    def test_get_header_lines_empty_line(self):
+        result = self._callFUT(b"slam\r\n\r\nslim\r\n")
+        self.assertListEqual(result, [b"slam", b"slim"])
+
     def test_get_header_lines_tabbed(self):
         result = self._callFUT(b"slam\r\n\tslim")
         self.assertListEqual(result, [b"slam\tslim"])
@@ -595,6 +760,173 @@ class Test_get_header_lines(unittest.TestCase):
         self.assertRaises(ParsingError, self._callFUT, b" Host: localhost\r\n\r\n")
 
 
+class Test_get_header_fields(unittest.TestCase):
+    def _callFUT(self, data):
+        return get_header_fields(data)
+
+    def test_get_header_fields(self):
+        result = self._callFUT(b"Host: localhost\r\nX-Foo:bar \r\nX-Empty:\r\n")
+        self.assertListEqual(
+            result,
+            [(b"Host", b" localhost"), (b"X-Foo", b"bar "), (b"X-Empty", b"")],
+        )
+
+    def test_get_header_fields_folded(self):
+        result = self._callFUT(b"X-Foo: a\r\n b\r\n\tc\r\nX-Bar: d")
+        self.assertListEqual(result, [(b"X-Foo", b" a b\tc"), (b"X-Bar", b" d")])
+
+    def test_get_header_fields_malformed(self):
+        self.assertRaises(ParsingError, self._callFUT, b" Host: localhost\r\n\r\n")
+
+    def test_get_header_fields_bare_cr_or_lf(self):
+        for data in (b"Host: a\rb\r\n", b"Host: a\nb\r\n", b"Host: a\r\r\n"):
+            with self.assertRaises(ParsingError) as cm:
+                self._callFUT(data)
+            self.assertIn("Bare CR or LF", cm.exception.args[0])
+
+    def test_get_header_fields_invalid(self):
+        for data in (
+            b"Host",
+            b": localhost",
+            b"Host : localhost",
+            b"Ho(st: localhost",
+            b"Host: local\x00host",
+            b"Host: local\x7fhost",
+            b"Host: a\r\n b\x01",
+        ):
+            with self.assertRaises(ParsingError) as cm:
+                self._callFUT(data)
+            self.assertEqual(cm.exception.args[0], "Invalid header")
+
+    def test_get_header_fields_obs_text(self):
+        result = self._callFUT(b"X-Foo: caf\xe9\tau lait")
+        self.assertListEqual(result, [(b"X-Foo", b" caf\xe9\tau lait")])
+
+
+class TestHeaderNames(unittest.TestCase):
+    def _makeOne(self, size=512):
+        from waitress.parser import HeaderNames
+
+        return HeaderNames(size)
+
+    def test_key(self):
+        inst = self._makeOne()
+        key = inst.key(b"X-Forwarded-For")
+        self.assertEqual(key, "X_FORWARDED_FOR")
+        self.assertIs(inst.key(b"X-Forwarded-For"), key)
+        self.assertEqual(inst.keys, {b"X-Forwarded-For": "X_FORWARDED_FOR"})
+
+    def test_key_table_full(self):
+        inst = self._makeOne(size=2)
+        inst.key(b"A")
+        inst.key(b"B")
+        inst.key(b"C")
+        self.assertEqual(inst.keys, {b"C": "C"})
+
+    def test_environ_key(self):
+        inst = self._makeOne()
+        self.assertEqual(inst.environ_key("CONTENT_LENGTH"), "CONTENT_LENGTH")
+        self.assertEqual(inst.environ_key("CONTENT_TYPE"), "CONTENT_TYPE")
+        key = inst.environ_key("USER_AGENT")
+        self.assertEqual(key, "HTTP_USER_AGENT")
+        self.assertIs(inst.environ_key("USER_AGENT"), key)
+
+    def test_value_interned(self):
+        inst = self._makeOne()
+        value = inst.value("CONNECTION", b"keep-alive")
+        self.assertEqual(value, "keep-alive")
+        self.assertIs(inst.value("CONNECTION", b"keep-alive"), value)
+        self.assertEqual(inst.values, {b"keep-alive": "keep-alive"})
+
+    def test_value_not_interned(self):
+        inst = self._makeOne()
+        self.assertEqual(inst.value("AUTHORIZATION", b"secret"), "secret")
+        self.assertEqual(inst.values, {})
+
+    def test_clear(self):
+        inst = self._makeOne()
+        inst.key(b"Accept")
+        inst.environ_key("ACCEPT")
+        inst.value("ACCEPT", b"*/*")
+        inst.clear()
+        self.assertEqual(inst.keys, {})
+        self.assertEqual(inst.environ_keys, {})
+        self.assertEqual(inst.values, {})
+
+    def test_parser_uses_table(self):
+        from waitress.parser import header_names
+
+        parser = HTTPRequestParser(Adjustments())
+        parser.received(
+            b"GET / HTTP/1.1\r\nX-Intern-Test: x-intern-1\r\nAccept: text/x-intern\r\n\r\n"
+        )
+        self.assertEqual(header_names.keys[b"X-Intern-Test"], "X_INTERN_TEST")
+        self.assertEqual(header_names.values[b"text/x-intern"], "text/x-intern")
+        self.assertNotIn(b"x-intern-1", header_names.values)
+        self.assertEqual(parser.headers["ACCEPT"], "text/x-intern")
+
+
+class TestRequestLines(unittest.TestCase):
+    def _makeOne(self, size=1024, max_length=1024):
+        from waitress.parser import RequestLines
+
+        return RequestLines(size, max_length)
+
+    def test_parse(self):
+        inst = self._makeOne()
+        parsed = inst.parse(b"GET http://example.com/a%20b?c=d#e HTTP/1.1")
+        self.assertEqual(
+            parsed,
+            (
+                "GET",
+                "http://example.com/a%20b?c=d#e",
+                "1.1",
+                "http",
+                "example.com",
+                "/a b",
+                "c=d",
+                "e",
+            ),
+        )
+        self.assertEqual(inst.misses, 1)
+        self.assertEqual(inst.hits, 0)
+        self.assertIs(
+            inst.parse(b"GET http://example.com/a%20b?c=d#e HTTP/1.1"), parsed
+        )
+        self.assertEqual(inst.misses, 1)
+        self.assertEqual(inst.hits, 1)
+
+    def test_parse_least_recently_used_evicted(self):
+        inst = self._makeOne(size=2)
+        inst.parse(b"GET /a HTTP/1.1")
+        inst.parse(b"GET /b HTTP/1.1")
+        inst.parse(b"GET /a HTTP/1.1")
+        inst.parse(b"GET /c HTTP/1.1")
+        self.assertEqual(list(inst.lines), [b"GET /a HTTP/1.1", b"GET /c HTTP/1.1"])
+
+    def test_parse_error_not_cached(self):
+        inst = self._makeOne()
+        for _ in range(2):
+            self.assertRaises(ParsingError, inst.parse, b"get / HTTP/1.1")
+            self.assertRaises(ParsingError, inst.parse, b"GET")
+        self.assertEqual(inst.lines, {})
+        self.assertEqual(inst.misses, 4)
+
+    def test_parse_too_long_not_cached(self):
+        inst = self._makeOne(max_length=10)
+        self.assertEqual(inst.parse(b"GET /abcdef HTTP/1.1")[5], "/abcdef")
+        self.assertEqual(inst.lines, {})
+
+    def test_clear(self):
+        inst = self._makeOne()
+        inst.parse(b"GET / HTTP/1.1")
+        inst.parse(b"GET / HTTP/1.1")
+        inst.clear()
+        self.assertEqual(inst.lines, {})
+        self.assertEqual(inst.hits, 0)
+        self.assertEqual(inst.misses, 0)
+
+
 class Test_crack_first_line(unittest.TestCase):
     def _callFUT(self, line):
         return crack_first_line(line)
@@ -132,6 +132,98 @@ class TestChunkedReceiver(unittest.TestCase):
         self.assertEqual(result, 1)
         self.assertFalse(inst.completed)
 
+    def test_received_all_chunk_data(self):
+        buf = DummyBuffer()
+        inst = self._makeOne(buf)
+        inst.chunk_remainder = 3
+        data = b"abc"
+        self.assertEqual(inst.received(data), 3)
+        self.assertIs(buf.data[0], data)
+        self.assertEqual(inst.chunk_remainder, 0)
+        self.assertTrue(inst.validate_chunk_end)
+
+    def test_received_many_chunks_appended_at_once(self):
+        buf = DummyBuffer()
+        inst = self._makeOne(buf)
+        data = b"1\r\na\r\n2\r\nbc\r\n3;x=y\r\ndef\r\n0\r\n\r\n"
+        self.assertEqual(inst.received(data), len(data))
+        self.assertTrue(inst.completed)
+        self.assertEqual(buf.data, [b"abcdef"])
+
+    def test_received_size_missing(self):
+        from waitress.utilities import BadRequest
+
+        buf = DummyBuffer()
+        inst = self._makeOne(buf)
+        inst.received(b";x=y\r\n")
+        self.assertIsInstance(inst.error, BadRequest)
+        self.assertEqual(inst.error.body, "Invalid chunk size")
+
+    def test_received_control_line_split(self):
+        buf = DummyBuffer()
+        inst = self._makeOne(buf)
+        self.assertEqual(inst.received(b"1"), 1)
+        self.assertEqual(inst.received(b"0;a=b"), 5)
+        self.assertEqual(inst.control_line, b"10;a=b")
+        self.assertEqual(inst.received(b"\r"), 1)
+        self.assertEqual(inst.chunk_remainder, 0)
+        self.assertEqual(inst.received(b"\n"), 1)
+        self.assertEqual(inst.control_line, b"")
+        self.assertEqual(inst.chunk_remainder, 16)
+        self.assertEqual(inst.pending, [])
+
+    def test_received_chunk_end_split(self):
+        buf = DummyBuffer()
+        inst = self._makeOne(buf)
+        inst.received(b"1\r\na\r")
+        self.assertEqual(inst.chunk_end, b"\r")
+        inst.received(b"\n0\r\n\r\n")
+        self.assertTrue(inst.completed)
+        self.assertIsNone(inst.error)
+
+    def test_received_chunk_end_split_not_properly_terminated(self):
+        from waitress.utilities import BadRequest
+
+        buf = DummyBuffer()
+        inst = self._makeOne(buf)
+        inst.received(b"1\r\na\r")
+        result = inst.received(b"x\r\n")
+        self.assertEqual(result, 3)
+        self.assertIsInstance(inst.error, BadRequest)
+        self.assertEqual(inst.error.body, "Chunk not properly terminated")
+        # What follows is parsed as the start of the trailer
+        self.assertEqual(b"".join(inst.pending), b"\rx\r\n")
+
+    def test_received_chunk_data_split(self):
+        buf = DummyBuffer()
+        inst = self._makeOne(buf)
+        result = inst.received(b"5\r\nab")
+        self.assertEqual(result, 5)
+        self.assertEqual(inst.chunk_remainder, 3)
+        inst.received(b"cde\r\n0\r\n\r\n")
+        self.assertTrue(inst.completed)
+        self.assertEqual(b"".join(buf.data), b"abcde")
+
+    def test_received_trailer_startswith_crlf_split(self):
+        buf = DummyBuffer()
+        inst = self._makeOne(buf)
+        inst.all_chunks_received = True
+        self.assertEqual(inst.received(b"\r"), 1)
+        self.assertFalse(inst.completed)
+        self.assertEqual(inst.received(b"\nGET"), 1)
+        self.assertTrue(inst.completed)
+        self.assertEqual(inst.trailer, b"")
+
+    def test_received_trailer_split(self):
+        buf = DummyBuffer()
+        inst = self._makeOne(buf)
+        inst.all_chunks_received = True
+        self.assertEqual(inst.received(b"abc\r\n"), 5)
+        self.assertEqual(inst.received(b"\r"), 1)
+        self.assertEqual(inst.received(b"\nGET"), 1)
+        self.assertTrue(inst.completed)
+        self.assertEqual(inst.trailer, b"abc\r\n\r\n")
+
     def test_received_trailer_finished(self):
         buf = DummyBuffer()
         inst = self._makeOne(buf)
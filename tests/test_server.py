@@ -113,6 +113,36 @@ class TestWSGIServer(unittest.TestCase):
         inst = self._makeOneWithMap(_start=False)
         self.assertFalse(inst.accepting)
 
+    def test_ctor_sizes_buffer_pool(self):
+        from waitress.buffers import buffer_pool
+        from waitress.server import create_server
+
+        self.addCleanup(buffer_pool.resize, 0)
+        self.inst = create_server(
+            dummy_app,
+            map={},
+            _start=False,
+            _sock=DummySock(),
+            _dispatcher=DummyTaskDispatcher(),
+            buffer_pool_size=5,
+        )
+        self.assertEqual(buffer_pool.size, 5)
+
+    def test_ctor_sets_memory_budget(self):
+        from waitress.buffers import memory_budget
+        from waitress.server import create_server
+
+        self.addCleanup(setattr, memory_budget, "limit", 0)
+        self.inst = create_server(
+            dummy_app,
+            map={},
+            _start=False,
+            _sock=DummySock(),
+            _dispatcher=DummyTaskDispatcher(),
+            buffer_memory_limit=1000,
+        )
+        self.assertEqual(memory_budget.limit, 1000)
+
     def test_get_server_multi(self):
         inst = self._makeOneWithMulti()
         self.assertEqual(inst.__class__.__name__, "MultiSocketServer")
@@ -178,6 +208,77 @@ class TestWSGIServer(unittest.TestCase):
         self.assertTrue(inst.readable())
         self.assertFalse(inst.in_connection_overflow)
 
+    def test_readable_evict_idle_channels(self):
+        inst = self._makeOneWithMap()
+        inst.accepting = True
+        inst.adj = DummyAdj()
+        inst.adj.evict_idle_channels = True
+        inst._map = {"a": 1, "b": 2}
+        self.assertTrue(inst.readable())
+        self.assertFalse(inst.in_connection_overflow)
+        inst.next_eviction_scan = float("inf")
+        self.assertFalse(inst.readable())
+        self.assertTrue(inst.in_connection_overflow)
+
+    def test_evict_idle_channel(self):
+        inst = self._makeOneWithMap()
+        inst.trigger.close()
+        inst.trigger = DummyTrigger()
+
+        class DummyChannel:
+            will_close = False
+            connected = True
+            request_count = 1
+
+            def __init__(self, last_activity, idle=True):
+                self.last_activity = last_activity
+                self.idle = idle
+
+            def handle_close(self):
+                self.connected = False
+
+        oldest = DummyChannel(5)
+        newer = DummyChannel(10)
+        busy = DummyChannel(1, idle=False)
+        closing = DummyChannel(0, idle=False)
+        closing.will_close = True
+        # Just connected, it hasn't sent its first request yet
+        fresh = DummyChannel(0)
+        fresh.request_count = 0
+        inst.active_channels.update(
+            {100: busy, 101: newer, 102: oldest, 103: closing, 104: fresh}
+        )
+        self.assertTrue(inst.evict_idle_channel())
+        self.assertTrue(oldest.will_close)
+        self.assertFalse(newer.will_close)
+        self.assertFalse(busy.will_close)
+        self.assertFalse(fresh.will_close)
+        # The channel is closed once the main loop runs the trigger, until
+        # then no other channel is evicted
+        self.assertTrue(oldest.connected)
+        oldest.idle = False
+        thunk, inst.trigger.thunk = inst.trigger.thunk, None
+        self.assertTrue(inst.evict_idle_channel())
+        self.assertFalse(newer.will_close)
+        self.assertIsNone(inst.trigger.thunk)
+        thunk()
+        self.assertFalse(oldest.connected)
+        del inst.active_channels[102]
+        self.assertTrue(inst.evict_idle_channel())
+        self.assertTrue(newer.will_close)
+        self.assertTrue(closing.connected)
+
+    def test_evict_idle_channel_all_busy(self):
+        inst = self._makeOneWithMap()
+
+        class DummyChannel:
+            idle = False
+            will_close = False
+            last_activity = 0
+
+        inst.active_channels[100] = DummyChannel()
+        self.assertFalse(inst.evict_idle_channel())
+
     def test_readable_maintenance_false(self):
         import time
 
@@ -245,6 +346,90 @@ class TestWSGIServer(unittest.TestCase):
         self.assertListEqual(innersock.opts, [("level", "optname", "value")])
         self.assertListEqual(L, [(inst, innersock, None, inst.adj)])
 
+    def test_handle_accept_evicts_idle_channel(self):
+        inst = self._makeOneWithMap()
+        innersock = DummySock()
+        inst.socket = DummySock(acceptresult=(innersock, None))
+        inst.adj = DummyAdj()
+        inst.adj.evict_idle_channels = True
+        inst._map = {"a": 1, "b": 2}
+        inst.evict_idle_channel = lambda: True
+        L = []
+        inst.channel_class = lambda *arg, **kw: L.append(arg)
+        inst.handle_accept()
+        # The new connection waits for the evicted channel to be closed
+        self.assertFalse(inst.socket.accepted)
+        self.assertEqual(inst.next_eviction_scan, 0)
+        inst._map = {}
+        inst.handle_accept()
+        self.assertTrue(inst.socket.accepted)
+        self.assertEqual(len(L), 1)
+
+    def test_handle_accept_evict_keeps_new_connections(self):
+        inst = self._makeOneWithMap()
+        inst.trigger.close()
+        inst.trigger = DummyTrigger()
+        inst.adj = DummyAdj()
+        inst.adj.evict_idle_channels = True
+        inst.adj.connection_limit = 3
+
+        class DummyChannel:
+            idle = True
+            will_close = False
+            connected = True
+            request_count = 0
+            last_activity = 0
+
+            def __init__(self, server, sock, addr, adj, map=None):
+                map[sock] = self
+                server.active_channels[sock] = self
+
+        inst.channel_class = DummyChannel
+        inst._map = {}
+        # A burst of clients connects at once, none of them has sent a
+        # request by the time the limit is reached
+        for i in range(5):
+            inst.socket = DummySock(acceptresult=(DummySock(), None))
+            inst.handle_accept()
+        channels = list(inst.active_channels.values())
+        self.assertEqual(len(channels), 3)
+        self.assertFalse(any(channel.will_close for channel in channels))
+        self.assertIsNone(inst.trigger.thunk)
+        self.assertNotEqual(inst.next_eviction_scan, 0)
+
+    def test_handle_accept_evict_will_close_channel(self):
+        inst = self._makeOneWithMap()
+        inst.socket = DummySock(acceptresult=(DummySock(), None))
+        inst.trigger.close()
+        inst.trigger = DummyTrigger()
+        inst.adj = DummyAdj()
+        inst.adj.evict_idle_channels = True
+
+        class DummyChannel:
+            idle = False
+            will_close = True
+            connected = True
+            last_activity = 0
+
+        # A channel on its way out doesn't make room before it is closed
+        inst._map = {"a": 1, "b": 2}
+        inst.active_channels[100] = DummyChannel()
+        inst.handle_accept()
+        self.assertFalse(inst.socket.accepted)
+        self.assertIsNone(inst.trigger.thunk)
+        self.assertNotEqual(inst.next_eviction_scan, 0)
+
+    def test_handle_accept_evict_all_busy(self):
+        inst = self._makeOneWithMap()
+        inst.socket = DummySock(acceptresult=(DummySock(), None))
+        inst.adj = DummyAdj()
+        inst.adj.evict_idle_channels = True
+        inst._map = {"a": 1, "b": 2}
+        inst.evict_idle_channel = lambda: False
+        inst.handle_accept()
+        self.assertFalse(inst.socket.accepted)
+        self.assertNotEqual(inst.next_eviction_scan, 0)
+
     def test_maintenance(self):
         inst = self._makeOneWithMap()
 
@@ -258,6 +443,147 @@ class TestWSGIServer(unittest.TestCase):
         inst.maintenance(10000)
         self.assertTrue(zombie.will_close)
 
+    def test_maintenance_compacts_idle(self):
+        inst = self._makeOneWithMap()
+
+        class DummyChannel:
+            requests = []
+            compacted = False
+
+            def compact(self):
+                self.compacted = True
+
+        idle = DummyChannel()
+        idle.last_activity = 10000
+        busy = DummyChannel()
+        busy.last_activity = 10000
+        busy.requests = [object()]
+        inst.active_channels[100] = idle
+        inst.active_channels[101] = busy
+        inst.maintenance(10000)
+        self.assertTrue(idle.compacted)
+        self.assertFalse(busy.compacted)
+
+    def test_maintenance_parks_idle(self):
+        inst = self._makeOneWithMap()
+        inst.adj.park_idle_channels = True
+        inst.adj.cleanup_interval = 30
+        inst.adj.channel_timeout = 120
+
+        class DummyChannel:
+            requests = []
+            compacted = False
+            parked = False
+
+            def __init__(self, parks=True):
+                self.parks = parks
+
+            def park(self):
+                self.parked = True
+                return object() if self.parks else None
+
+            def compact(self):
+                self.compacted = True
+
+        idle = DummyChannel()
+        idle.last_activity = 9900
+        recent = DummyChannel()
+        recent.last_activity = 9990
+        unparkable = DummyChannel(parks=False)
+        unparkable.last_activity = 9900
+        inst.active_channels[100] = idle
+        inst.active_channels[101] = recent
+        inst.active_channels[102] = unparkable
+        inst.maintenance(10000)
+        self.assertTrue(idle.parked)
+        self.assertFalse(idle.compacted)
+        self.assertFalse(recent.parked)
+        self.assertTrue(recent.compacted)
+        self.assertTrue(unparkable.parked)
+        self.assertTrue(unparkable.compacted)
+
+    def test_readable_check_deadlines(self):
+        inst = self._makeOneWithMap()
+        L = []
+        inst.check_deadlines = lambda now: L.append(now)
+        inst.readable()
+        self.assertEqual(len(L), 1)
+        self.assertEqual(inst.next_deadline_check, L[0] + 1)
+        inst.readable()
+        self.assertEqual(len(L), 1)
+
+    def test_check_deadlines(self):
+        inst = self._makeOneWithMap()
+        inst.adj.min_response_rate = 100
+        inst.trigger.close()
+        inst.trigger = DummyTrigger()
+
+        class DummyChannel:
+            will_close = False
+            connected = True
+
+            def __init__(self, reason):
+                self.reason = reason
+
+            def check_deadlines(self, now):
+                return self.reason
+
+            def handle_close(self):
+                self.connected = False
+
+        slow = DummyChannel("response")
+        closed = DummyChannel("request_body")
+        fine = DummyChannel(None)
+        inst.active_channels.update({100: slow, 101: closed, 102: fine})
+        inst.check_deadlines(10000)
+        self.assertTrue(slow.will_close)
+        self.assertFalse(fine.will_close)
+        self.assertEqual(
+            inst.timeouts, {"request_header": 0, "request_body": 1, "response": 1}
+        )
+        # The channels are closed once the main loop runs the trigger
+        self.assertTrue(slow.connected)
+        closed.connected = False
+        closed.handle_close = None
+        inst.trigger.thunk()
+        self.assertFalse(slow.connected)
+        self.assertTrue(fine.connected)
+
+    def test_check_deadlines_disabled(self):
+        inst = self._makeOneWithMap()
+
+        class DummyChannel:
+            def check_deadlines(self, now):  # pragma: no cover
+                raise AssertionError
+
+        inst.active_channels[100] = DummyChannel()
+        inst.check_deadlines(10000)
+
+    def test_maintenance_keepalive_timeout(self):
+        inst = self._makeOneWithMap()
+        inst.adj.keepalive_timeout = 5
+        inst.adj.channel_timeout = 120
+
+        class DummyChannel:
+            requests = []
+            will_close = False
+
+            def __init__(self, last_activity, idle=True):
+                self.last_activity = last_activity
+                self.idle = idle
+
+            def compact(self):
+                pass
+
+        idle = DummyChannel(9990)
+        recent = DummyChannel(9998)
+        busy = DummyChannel(9990, idle=False)
+        inst.active_channels.update({100: idle, 101: recent, 102: busy})
+        inst.maintenance(10000)
+        self.assertTrue(idle.will_close)
+        self.assertFalse(recent.will_close)
+        self.assertFalse(busy.will_close)
+
     def test_backward_compatibility(self):
         from waitress.adjustments import Adjustments
         from waitress.server import TcpWSGIServer, WSGIServer
@@ -494,6 +820,11 @@ class DummyAdj:
     socket_options = [("level", "optname", "value")]
     cleanup_interval = 900
     channel_timeout = 300
+    keepalive_timeout = 0
+    evict_idle_channels = False
+    request_header_timeout = 0
+    min_request_body_rate = 0
+    min_response_rate = 0
 
 
 class DummyAsyncore:
@@ -502,8 +833,11 @@ class DummyAsyncore:
 
 
 class DummyTrigger:
-    def pull_trigger(self):
+    thunk = None
+
+    def pull_trigger(self, thunk=None):
         self.pulled = True
+        self.thunk = thunk
 
     def close(self):
         pass
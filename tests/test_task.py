@@ -101,6 +101,37 @@ class TestThreadedTaskDispatcher(unittest.TestCase):
         self.assertFalse(inst.shutdown(cancel_pending=False, timeout=0.01))
 
 
+class Test_capitalize_header_name(unittest.TestCase):
+    def _callFUT(self, name):
+        from waitress.task import capitalize_header_name
+
+        return capitalize_header_name(name)
+
+    def test_it(self):
+        self.assertEqual(self._callFUT("content-TYPE"), "Content-Type")
+        self.assertEqual(self._callFUT("x-request-id"), "X-Request-Id")
+        self.assertEqual(self._callFUT("ETag"), "Etag")
+
+    def test_cached(self):
+        from waitress.task import header_names_capitalized
+
+        name = self._callFUT("x-cached-name")
+        self.assertIs(header_names_capitalized["x-cached-name"], name)
+        self.assertIs(self._callFUT("x-cached-name"), name)
+
+    def test_cache_full(self):
+        from waitress import task
+
+        orig = task.HEADER_NAMES_SIZE
+        task.HEADER_NAMES_SIZE = 1
+        try:
+            self._callFUT("x-one")
+            self._callFUT("x-two")
+            self.assertEqual(task.header_names_capitalized, {"x-two": "X-Two"})
+        finally:
+            task.HEADER_NAMES_SIZE = orig
+
+
 class TestTask(unittest.TestCase):
     def _makeOne(self, channel=None, request=None):
         if channel is None:
@@ -187,6 +218,52 @@ class TestTask(unittest.TestCase):
         self.assertIn(("Connection", "close"), inst.response_headers)
         self.assertTrue(inst.close_on_finish)
 
+    def test_build_response_header_v11_continue_deferred(self):
+        inst = self._makeOne()
+        inst.request = DummyParser()
+        inst.request.continue_deferred = True
+        inst.request.completed = False
+        inst.version = "1.1"
+        inst.response_headers = [("Content-Length", "0")]
+        inst.build_response_header()
+        self.assertIn(("Connection", "close"), inst.response_headers)
+        self.assertTrue(inst.close_on_finish)
+
+    def test_build_response_header_v11_continue_deferred_body_received(self):
+        inst = self._makeOne()
+        inst.request = DummyParser()
+        inst.request.continue_deferred = True
+        inst.request.completed = True
+        inst.version = "1.1"
+        inst.response_headers = [("Content-Length", "0")]
+        inst.build_response_header()
+        self.assertFalse(inst.close_on_finish)
+
+    def test_build_response_header_v11_connection_close(self):
+        inst = self._makeOne()
+        inst.request = DummyParser()
+        inst.request.connection_close = True
+        inst.version = "1.1"
+        inst.response_headers = [("Content-Length", "0")]
+        inst.build_response_header()
+        self.assertIn(("Connection", "close"), inst.response_headers)
+        self.assertTrue(inst.close_on_finish)
+
+    def test_send_continue(self):
+        inst = self._makeOne()
+        inst.request.continue_deferred = True
+        inst.send_continue()
+        self.assertEqual(inst.channel.written, b"HTTP/1.1 100 Continue\r\n\r\n")
+        self.assertFalse(inst.request.continue_deferred)
+
+    def test_send_continue_wrote_header(self):
+        inst = self._makeOne()
+        inst.request.continue_deferred = True
+        inst.wrote_header = True
+        inst.send_continue()
+        self.assertEqual(inst.channel.written, b"")
+        self.assertFalse(inst.request.continue_deferred)
+
     def test_build_response_header_v11_200_no_content_length(self):
         inst = self._makeOne()
         inst.request = DummyParser()
@@ -768,6 +845,35 @@ class TestWSGITask(unittest.TestCase):
         self.assertEqual(environ["PATH_INFO"], "")
         self.assertEqual(environ["SCRIPT_NAME"], "/foo")
 
+    def test_get_environment_continue_deferred(self):
+        from waitress.buffers import StreamingBodyBuffer
+
+        inst = self._makeOne()
+        body = StreamingBodyBuffer(10)
+        request = DummyParser()
+        request.continue_deferred = True
+        request.get_body_stream = lambda: body
+        inst.request = request
+        environ = inst.get_environment()
+        self.assertIs(environ["wsgi.input"], body)
+        body.finish()
+        self.assertEqual(body.read(), b"")
+        self.assertEqual(inst.channel.written, b"HTTP/1.1 100 Continue\r\n\r\n")
+
+    def test_get_environment_mmap_input(self):
+        from waitress.buffers import TempfileBasedBuffer
+
+        buf = TempfileBasedBuffer()
+        self.addCleanup(buf.close)
+        buf.append(b"abc")
+        inst = self._makeOne()
+        request = DummyParser()
+        request.get_body_stream = buf.getmmap
+        inst.request = request
+        environ = inst.get_environment()
+        self.assertIs(environ["waitress.input_mmap"], environ["wsgi.input"])
+        self.assertEqual(environ["wsgi.input"].getbuffer().tobytes(), b"abc")
+
     def test_get_environment_values(self):
         import sys
 
@@ -842,6 +948,40 @@ class TestWSGITask(unittest.TestCase):
         self.assertTrue(environ["wsgi.input_terminated"])
         self.assertEqual(inst.environ, environ)
 
+    def test_get_environment_template_reused(self):
+        inst = self._makeOne()
+        inst.request = DummyParser()
+        inst.request.headers = {"X_FOO": "1"}
+        environ = inst.get_environment()
+        template = inst.channel.environ_template
+        self.assertEqual(template["REMOTE_ADDR"], "127.0.0.1")
+        self.assertNotIn("HTTP_X_FOO", template)
+        self.assertNotIn("wsgi.input", template)
+
+        other = self._makeOne(channel=inst.channel)
+        other.request = DummyParser()
+        other_environ = other.get_environment()
+        self.assertIs(inst.channel.environ_template, template)
+        self.assertIsNot(other_environ, environ)
+        self.assertNotIn("HTTP_X_FOO", other_environ)
+
+    def test_get_environment_server_template_shared(self):
+        from waitress.task import WSGITask
+
+        server = DummyServer()
+        channel1 = DummyChannel(server)
+        channel2 = DummyChannel(server)
+        channel2.addr = ("127.0.0.2", 1)
+        environ1 = WSGITask(channel1, DummyParser()).get_environment()
+        server_template = server.environ_template
+        environ2 = WSGITask(channel2, DummyParser()).get_environment()
+        self.assertIs(server.environ_template, server_template)
+        self.assertEqual(server_template["SERVER_PORT"], "80")
+        self.assertNotIn("REMOTE_ADDR", server_template)
+        self.assertEqual(environ1["REMOTE_ADDR"], "127.0.0.1")
+        self.assertEqual(environ2["REMOTE_ADDR"], "127.0.0.2")
+        self.assertEqual(environ2["REMOTE_PORT"], "1")
+
 
 class TestErrorTask(unittest.TestCase):
     def _makeOne(self, channel=None, request=None):
@@ -950,6 +1090,7 @@ class DummyAdj:
 class DummyServer:
     server_name = "localhost"
     effective_port = 80
+    environ_template = None
 
     def __init__(self):
         self.adj = DummyAdj()
@@ -960,6 +1101,7 @@ class DummyChannel:
     adj = DummyAdj()
     creation_time = 0
     addr = ("127.0.0.1", 39830)
+    environ_template = None
 
     def check_client_disconnected(self):
         # For now, until we have tests handling this feature
@@ -989,6 +1131,8 @@ class DummyParser:
     url_scheme = "http"
     expect_continue = False
     headers_finished = False
+    continue_deferred = False
+    connection_close = False
 
     def __init__(self):
         self.headers = {}
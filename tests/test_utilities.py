@@ -37,6 +37,22 @@ class Test_parse_http_date(unittest.TestCase):
         self.assertEqual(result, 0)
 
 
+class TestClock(unittest.TestCase):
+    def test_update(self):
+        import time
+
+        from waitress.utilities import Clock
+
+        before = time.time(), time.monotonic()
+        inst = Clock()
+        self.assertGreaterEqual(inst.time, before[0])
+        self.assertGreaterEqual(inst.monotonic, before[1])
+        inst.time = inst.monotonic = 0
+        inst.update()
+        self.assertGreaterEqual(inst.time, before[0])
+        self.assertGreaterEqual(inst.monotonic, before[1])
+
+
 class Test_build_http_date(unittest.TestCase):
     def test_rountdrip(self):
         from time import time
@@ -46,6 +62,15 @@ class Test_build_http_date(unittest.TestCase):
         t = int(time())
         self.assertEqual(t, parse_http_date(build_http_date(t)))
 
+    def test_same_second_cached(self):
+        from waitress.utilities import build_http_date
+
+        date = build_http_date(784111777.25)
+        self.assertEqual(date, "Sun, 06 Nov 1994 08:49:37 GMT")
+        self.assertIs(build_http_date(784111777.75), date)
+        self.assertEqual(build_http_date(784111778), "Sun, 06 Nov 1994 08:49:38 GMT")
+        self.assertEqual(build_http_date(784111777), date)
+
 
 class Test_unpack_rfc850(unittest.TestCase):
     def _callFUT(self, val):
@@ -1369,6 +1369,24 @@ class Test_poll(unittest.TestCase):
             wasyncore.select = old_select
         self.assertListEqual(dummy_select.selected, [([0], [], [0], 0.0)])
 
+    def test_updates_clock(self):
+        from waitress.utilities import clock
+
+        disp = DummyDispatcher()
+        disp.readable = lambda: True
+        map = {0: disp}
+        clock.time = clock.monotonic = 0
+        try:
+            from waitress import wasyncore
+
+            old_select = wasyncore.select
+            wasyncore.select = DummySelect(select.error(errno.EINTR))
+            self._callFUT(map=map)
+        finally:
+            wasyncore.select = old_select
+        self.assertNotEqual(clock.time, 0)
+        self.assertNotEqual(clock.monotonic, 0)
+
 
 class Test_poll2(unittest.TestCase):
     def _callFUT(self, timeout=0.0, map=None):
@@ -1408,6 +1426,23 @@ class Test_poll2(unittest.TestCase):
             wasyncore.select = old_select
         self.assertListEqual(pollster.polled, [0.0])
 
+    def test_updates_clock(self):
+        from waitress.utilities import clock
+
+        pollster = DummyPollster(exc=select.error(errno.EINTR))
+        map = {0: DummyDispatcher()}
+        clock.time = clock.monotonic = 0
+        try:
+            from waitress import wasyncore
+
+            old_select = wasyncore.select
+            wasyncore.select = DummySelect(pollster=pollster)
+            self._callFUT(map=map)
+        finally:
+            wasyncore.select = old_select
+        self.assertNotEqual(clock.time, 0)
+        self.assertNotEqual(clock.monotonic, 0)
+
 
 class Test_dispatcher(unittest.TestCase):
     def _makeOne(self, sock=None, map=None):